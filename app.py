@@ -4,25 +4,59 @@ Author: Jingyuan Chen 9629
 Course: CSE 6332 Cloud Computing
 """
 
-from flask import Flask, render_template, request, jsonify, flash, redirect, url_for
+from flask import Flask, render_template, request, jsonify, flash, redirect, url_for, Response, stream_with_context
 import pandas as pd
 import os
 import time
 from datetime import datetime
 import json
-from database import DatabaseManager
+from storage import create_database_manager
 from redis_cache import RedisCache
+from ingest import CsvIngestStream
+from snapshot import SnapshotStore
+from histogram import DEFAULT_BINS, HISTOGRAM_COLUMNS, UNITS, parse_bins
+from pagination import DEFAULT_PAGE_SIZE, Page, parse_page_args
+from columnar import MEDIA_TYPE as COLUMNAR_MEDIA_TYPE, columns_from_rows, encode_columns
+from memory_cache import MemoryCache
+from tiered_cache import TieredCache, MEMORY, REDIS, ORIGIN
+from dataset_version import DatasetVersion
+from range_cache import MAGNITUDE_RANGES, RADIUS_RANGES, TIME_RANGES
+from concurrency import CACHE, DB, UPLOAD, get_stats as get_concurrency_stats
+from cache_warmup import CacheWarmer
 from werkzeug.utils import secure_filename
 import random
 import math
+from concurrent.futures import ThreadPoolExecutor
 
 app = Flask(__name__)
 app.secret_key = 'earth2025'
-app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024  # 16MB max file size
+# Uploads are streamed in chunks, so large catalogs no longer need to fit in memory
+app.config['MAX_CONTENT_LENGTH'] = int(os.getenv('MAX_UPLOAD_MB', 4096)) * 1024 * 1024
+
+# Initialize components. Nothing here connects or starts threads, that is
+# left to start_services(), so processes that merely import this module
+# (timezone workers spawned during an upload re-import it under
+# `python app.py`) stay idle.
+db_manager = create_database_manager()
+redis_cache = RedisCache(connect=False)
+# Bumped by every upload; cache keys and snapshots follow it across workers
+dataset_version = DatasetVersion(db_manager, redis_cache)
+# Per-process L1 in front of Redis; endpoints cache through the loaders below,
+# whose queries run on the bounded database pool and Redis calls on the cache pool
+tiered_cache = TieredCache(MemoryCache(), redis_cache, version=dataset_version.current, run=DB.call,
+                           remote=CACHE.call)
+# Optional in-memory copy of the table serving read endpoints
+snapshot_store = SnapshotStore(db_manager, version=dataset_version.current)
+
+def _on_dataset_change(old_version, new_version):
+    # Old L1 entries are unreachable under the new key namespace; free them
+    tiered_cache.clear_memory()
+    # Sampled ids and search counts read before the change are stale
+    db_manager.clear_dataset_caches()
+    snapshot_store.rebuild_async()
+    cache_warmer.start(f"dataset version {new_version}")
 
-# Initialize components
-db_manager = DatabaseManager()
-redis_cache = RedisCache()
+dataset_version.on_change(_on_dataset_change)
 
 @app.route('/')
 def index():
@@ -47,43 +81,44 @@ def upload_file():
     
     if file and file.filename.lower().endswith('.csv'):
         try:
-            # Read and clean CSV data
-            print("📖 Reading CSV file...")
-            df = pd.read_csv(file)
-            
-            print("🧹 Cleaning data...")
-            # Clean data - remove rows with null values in critical columns
-            critical_columns = ['time', 'latitude', 'longitude', 'depth', 'mag', 'place']
-            initial_count = len(df)
-            df_cleaned = df.dropna(subset=critical_columns)
-            
-            # Select only required columns
-            required_columns = ['id', 'time', 'latitude', 'longitude', 'depth', 'mag', 'place']
-            df_final = df_cleaned[required_columns].copy()
-            
-            cleaned_count = len(df_final)
-            print(f"📊 Data cleaned: {initial_count} -> {cleaned_count} records")
+            # Stream, clean and upload CSV data chunk by chunk
+            print("📖 Streaming CSV file...")
+            cleaned_filename = f"cleaned_earthquake_data_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv"
+            partial_filename = cleaned_filename + '.partial'
+            stream = CsvIngestStream(file.stream, cleaned_path=partial_filename)
             
             # Process data and upload to database
-            print("🔄 Starting database upload with timezone calculations...")
+            upload_mode = request.form.get('mode', 'replace')
             start_time = time.time()
-            success, message = db_manager.create_table_and_upload_data(df_final)
+            if upload_mode == 'upsert':
+                print("🔄 Merging new and updated records into database...")
+                success, message = UPLOAD.call(db_manager.upsert_data, stream)
+            else:
+                print("🔄 Starting database upload with timezone calculations...")
+                success, message = UPLOAD.call(db_manager.create_table_and_upload_data, stream)
             end_time = time.time()
             
             processing_time = round(end_time - start_time, 2)
+            cleaned_count = stream.cleaned_count
+            print(f"📊 Data cleaned: {stream.initial_count} -> {cleaned_count} records")
             
             if success:
-                # Save cleaned data to blob storage
+                # Keep the cleaned data written alongside the upload
                 print("💾 Saving cleaned data...")
-                cleaned_filename = f"cleaned_earthquake_data_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv"
-                df_final.to_csv(cleaned_filename, index=False)
+                if os.path.exists(partial_filename):
+                    os.replace(partial_filename, cleaned_filename)
+                version = DB.call(db_manager.get_dataset_version)
+                if version is not None:
+                    dataset_version.publish(version)
                 
-                flash(f'Successfully uploaded {cleaned_count} records to database in {processing_time} seconds')
+                flash(f'Successfully uploaded {cleaned_count} records to database in {processing_time} seconds ({message})')
                 return render_template('upload.html', 
                                      success=True, 
                                      records_count=cleaned_count,
                                      processing_time=processing_time)
             else:
+                if os.path.exists(partial_filename):
+                    os.remove(partial_filename)
                 flash(f'Error uploading data: {message}')
                 return render_template('upload.html', error=message)
                 
@@ -100,34 +135,150 @@ def query_page():
     """Query interface page"""
     return render_template('query.html')
 
+def _wants_ndjson():
+    """True when the client asked for newline-delimited JSON over plain JSON"""
+    return request.accept_mimetypes.best_match(['application/json', 'application/x-ndjson']) == 'application/x-ndjson'
+
+def _default_limit():
+    """Page size of a request without a limit; streamed responses stay unbounded"""
+    return None if _wants_ndjson() else DEFAULT_PAGE_SIZE
+
+def _ndjson_response(rows):
+    """Stream rows as newline-delimited JSON while they are still being read.
+
+    The status line is long gone when a read fails midway, so the stream
+    then ends with an {"error": ...} line instead of looking complete.
+    """
+    def generate():
+        try:
+            for row in DB.stream(rows):
+                yield json.dumps(row) + '\n'
+        except Exception as e:
+            print(f"❌ Streamed response failed: {e}")
+            yield json.dumps({'error': str(e)}) + '\n'
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+
+def _page_info(results):
+    """Pagination fields of a search result for the JSON response"""
+    return {
+        'next_after': getattr(results, 'next_after', None),
+        'total': getattr(results, 'total', None),
+    }
+
+def _use_cache(source):
+    """The use_redis flag of a JSON body or query string; it switches both cache tiers"""
+    return str(source.get('use_redis', 'false')).lower() == 'true'
+
+def _cached_payload(loader, *args, use_cache=False, field='data'):
+    """Run a cached loader and wrap its value in the usual response fields"""
+    start_time = time.time()
+    value, served_by = loader.load(*args, use_cache=use_cache)
+    payload = {field: value}
+    if isinstance(value, Page):
+        payload.update(_page_info(value))
+    payload.update({
+        'execution_time': round(time.time() - start_time, 3),
+        'cache_hit': served_by != ORIGIN,
+        'served_by': served_by,
+    })
+    return payload
+
+def _search_response(loader, *args, use_cache=False):
+    payload = _cached_payload(loader, *args, use_cache=use_cache, field='results')
+    payload['hit_rate'] = 100.0 if payload['cache_hit'] else 0.0
+    return jsonify(payload)
+
+# Cached loaders, one per cacheable query; the name prefixes the cache key
+@tiered_cache.loader('place_search', ttl=600)
+def load_place_search(place_substring, limit=None, after=None, include_total=False):
+    return snapshot_store.reader().search_by_place(place_substring, limit, after, include_total)
+
+@tiered_cache.loader('location_search', ttl=600, ranges=RADIUS_RANGES)
+def load_location_search(lat, lon, radius_km):
+    return snapshot_store.reader().search_by_location(lat, lon, radius_km)
+
+@tiered_cache.loader('nearest_search', ttl=600)
+def load_nearest_search(lat, lon, k):
+    return snapshot_store.reader().search_nearest(lat, lon, k)
+
+@tiered_cache.loader('time_range', ttl=600, ranges=TIME_RANGES)
+def load_time_range(start_date, end_date, limit=None, after=None, include_total=False):
+    return snapshot_store.reader().search_by_time_range(start_date, end_date, limit, after, include_total)
+
+@tiered_cache.loader('magnitude', ttl=600, ranges=MAGNITUDE_RANGES)
+def load_magnitude(min_mag, max_mag, limit=None, after=None, include_total=False):
+    return snapshot_store.reader().search_by_magnitude(min_mag, max_mag, limit, after, include_total)
+
+@tiered_cache.loader('histogram', ttl=1800)
+def load_histogram(column, edges):
+    # Magnitude and depth bins that line up with summary cube cells are summed
+    # from the cube; the readers scan only for bins that split a cell
+    reader = snapshot_store.reader()
+    if column == 'mag':
+        return reader.get_magnitude_distribution(edges)
+    if column == 'depth':
+        return reader.get_depth_distribution(edges)
+    return reader.get_histogram(column, edges, UNITS[column])
+
+@tiered_cache.loader('magnitude_depth_scatter', ttl=900)
+def load_magnitude_depth_scatter(limit=100):
+    return snapshot_store.reader().get_recent_magnitude_depth(limit)
+
+@tiered_cache.loader('hourly_distribution', ttl=1800)
+def load_hourly_distribution():
+    return snapshot_store.reader().get_hourly_distribution()
+
+@tiered_cache.loader('hourly_distribution_filtered', ttl=1800)
+def load_hourly_distribution_filtered(min_magnitude=4):
+    return snapshot_store.reader().get_hourly_distribution_filtered(min_magnitude)
+
+@tiered_cache.loader('top_locations', ttl=1800)
+def load_top_locations(limit=10):
+    return snapshot_store.reader().get_top_locations(limit)
+
+@tiered_cache.loader('earthquakes_map', ttl=1800)
+def load_earthquakes_map(min_magnitude=None, limit=None, after=None, include_total=False):
+    return snapshot_store.reader().get_earthquakes_past_30_days(min_magnitude, limit, after, include_total)
+
 @app.route('/api/random_queries', methods=['POST'])
 def random_queries():
     """Execute random queries"""
     data = request.get_json()
     num_queries = min(int(data.get('num_queries', 10)), 1000)
-    use_redis = data.get('use_redis', False)
+    use_redis = _use_cache(data)
+    # A seed makes the sample, and the cache keys probed, reproducible for load tests
+    seed = data.get('seed')
+    seed = int(seed) if seed is not None else None
+    rng = random.Random(seed)
     
     start_time = time.time()
-    results = []
+    results = [None] * num_queries
     cache_hits = 0
+    served_by = {MEMORY: 0, REDIS: 0, ORIGIN: 0}
+    misses = list(range(num_queries))
     
-    for i in range(num_queries):
-        if use_redis:
-            cache_key = f"random_query_{random.randint(1, 10000)}"
-            cached_result = redis_cache.get(cache_key)
-            
-            if cached_result:
-                results.append(cached_result)
+    if use_redis:
+        cache_keys = [tiered_cache.key('random_query', [rng.randint(1, 10000)]) for _ in range(num_queries)]
+        misses = []
+        # One MGET for every key L1 doesn't hold
+        for i, cached in enumerate(tiered_cache.get_many(cache_keys)):
+            if cached.served_by:
+                results[i] = cached.value
                 cache_hits += 1
+                served_by[cached.served_by] += 1
             else:
-                result = db_manager.get_random_earthquake()
-                if result:
-                    redis_cache.set(cache_key, result, expire_time=300)  # 5 minutes
-                    results.append(result)
-        else:
-            result = db_manager.get_random_earthquake()
-            if result:
-                results.append(result)
+                misses.append(i)
+    
+    # One batched sample for every query the cache didn't answer
+    sampled = DB.call(snapshot_store.reader().get_random_earthquakes, len(misses),
+                      seed=rng.getrandbits(32)) if misses else []
+    for i, result in zip(misses, sampled):
+        results[i] = result
+        served_by[ORIGIN] += 1
+    if use_redis and sampled:
+        # Written back with one pipelined round trip
+        tiered_cache.set_many([(cache_keys[i], result) for i, result in zip(misses, sampled)], 300)  # 5 minutes
+    results = [result for result in results if result]
     
     end_time = time.time()
     execution_time = round(end_time - start_time, 3)
@@ -137,6 +288,7 @@ def random_queries():
         'results': results,
         'execution_time': execution_time,
         'cache_hits': cache_hits,
+        'served_by': served_by,
         'hit_rate': hit_rate,
         'total_queries': num_queries
     })
@@ -146,34 +298,18 @@ def place_search():
     """Search earthquakes by place substring"""
     data = request.get_json()
     place_substring = data.get('place_substring', '')
-    use_redis = data.get('use_redis', False)
-    
-    cache_key = f"place_search_{place_substring.lower()}"
-    start_time = time.time()
-    
-    if use_redis:
-        cached_result = redis_cache.get(cache_key)
-        if cached_result:
-            end_time = time.time()
-            return jsonify({
-                'results': cached_result,
-                'execution_time': round(end_time - start_time, 3),
-                'cache_hit': True,
-                'hit_rate': 100.0
-            })
-    
-    results = db_manager.search_by_place(place_substring)
-    end_time = time.time()
-    
-    if use_redis and results:
-        redis_cache.set(cache_key, results, expire_time=600)  # 10 minutes
-    
-    return jsonify({
-        'results': results,
-        'execution_time': round(end_time - start_time, 3),
-        'cache_hit': False,
-        'hit_rate': 0.0
-    })
+    try:
+        limit, after, include_total = parse_page_args(data, _default_limit())
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    if _wants_ndjson():
+        return _ndjson_response(DB.call(snapshot_store.reader().search_by_place,
+                                        place_substring, limit, after, stream=True))
+    
+    # Place matching ignores case, so the cache key can too
+    return _search_response(load_place_search, place_substring.lower(), limit, after, include_total,
+                            use_cache=_use_cache(data))
 
 @app.route('/api/location_search', methods=['POST'])
 def location_search():
@@ -182,34 +318,16 @@ def location_search():
     lat = float(data.get('latitude', 0))
     lon = float(data.get('longitude', 0))
     radius_km = min(float(data.get('radius_km', 50)), 100)
-    use_redis = data.get('use_redis', False)
-    
-    cache_key = f"location_search_{lat}_{lon}_{radius_km}"
-    start_time = time.time()
-    
-    if use_redis:
-        cached_result = redis_cache.get(cache_key)
-        if cached_result:
-            end_time = time.time()
-            return jsonify({
-                'results': cached_result,
-                'execution_time': round(end_time - start_time, 3),
-                'cache_hit': True,
-                'hit_rate': 100.0
-            })
-    
-    results = db_manager.search_by_location(lat, lon, radius_km)
-    end_time = time.time()
-    
-    if use_redis and results:
-        redis_cache.set(cache_key, results, expire_time=600)
-    
-    return jsonify({
-        'results': results,
-        'execution_time': round(end_time - start_time, 3),
-        'cache_hit': False,
-        'hit_rate': 0.0
-    })
+    return _search_response(load_location_search, lat, lon, radius_km, use_cache=_use_cache(data))
+
+@app.route('/api/nearest_search', methods=['POST'])
+def nearest_search():
+    """Find the k earthquakes closest to a location"""
+    data = request.get_json()
+    lat = float(data.get('latitude', 0))
+    lon = float(data.get('longitude', 0))
+    k = max(1, min(int(data.get('k', 10)), 100))
+    return _search_response(load_nearest_search, lat, lon, k, use_cache=_use_cache(data))
 
 @app.route('/api/time_range_search', methods=['POST'])
 def time_range_search():
@@ -217,34 +335,17 @@ def time_range_search():
     data = request.get_json()
     start_date = data.get('start_date')
     end_date = data.get('end_date')
-    use_redis = data.get('use_redis', False)
-    
-    cache_key = f"time_range_{start_date}_{end_date}"
-    start_time = time.time()
-    
-    if use_redis:
-        cached_result = redis_cache.get(cache_key)
-        if cached_result:
-            end_time = time.time()
-            return jsonify({
-                'results': cached_result,
-                'execution_time': round(end_time - start_time, 3),
-                'cache_hit': True,
-                'hit_rate': 100.0
-            })
-    
-    results = db_manager.search_by_time_range(start_date, end_date)
-    end_time = time.time()
+    try:
+        limit, after, include_total = parse_page_args(data, _default_limit())
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     
-    if use_redis and results:
-        redis_cache.set(cache_key, results, expire_time=600)
+    if _wants_ndjson():
+        return _ndjson_response(DB.call(snapshot_store.reader().search_by_time_range,
+                                        start_date, end_date, limit, after, stream=True))
     
-    return jsonify({
-        'results': results,
-        'execution_time': round(end_time - start_time, 3),
-        'cache_hit': False,
-        'hit_rate': 0.0
-    })
+    return _search_response(load_time_range, start_date, end_date, limit, after, include_total,
+                            use_cache=_use_cache(data))
 
 @app.route('/api/magnitude_search', methods=['POST'])
 def magnitude_search():
@@ -252,53 +353,29 @@ def magnitude_search():
     data = request.get_json()
     min_mag = float(data.get('min_magnitude', 0))
     max_mag = float(data.get('max_magnitude', 10))
-    use_redis = data.get('use_redis', False)
-    
-    cache_key = f"magnitude_{min_mag}_{max_mag}"
-    start_time = time.time()
-    
-    if use_redis:
-        cached_result = redis_cache.get(cache_key)
-        if cached_result:
-            end_time = time.time()
-            return jsonify({
-                'results': cached_result,
-                'execution_time': round(end_time - start_time, 3),
-                'cache_hit': True,
-                'hit_rate': 100.0
-            })
+    try:
+        limit, after, include_total = parse_page_args(data, _default_limit())
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     
-    results = db_manager.search_by_magnitude(min_mag, max_mag)
-    end_time = time.time()
-    
-    if use_redis and results:
-        redis_cache.set(cache_key, results, expire_time=600)
+    if _wants_ndjson():
+        return _ndjson_response(DB.call(snapshot_store.reader().search_by_magnitude,
+                                        min_mag, max_mag, limit, after, stream=True))
     
-    return jsonify({
-        'results': results,
-        'execution_time': round(end_time - start_time, 3),
-        'cache_hit': False,
-        'hit_rate': 0.0
-    })
+    return _search_response(load_magnitude, min_mag, max_mag, limit, after, include_total,
+                            use_cache=_use_cache(data))
 
-# At the top of app.py, replace redis import
-from memory_cache import MemoryCache
-
-# Replace redis_cache initialization
-memory_cache = MemoryCache()
-
-# Add a test endpoint
 @app.route('/api/cache_test')
 def cache_test():
     """Test cache functionality"""
     # Test set
     test_data = {"test": "data", "timestamp": time.time()}
-    memory_cache.set("test_key", test_data, 60)
+    tiered_cache.memory.set("test_key", test_data, 60)
     
     # Test get
-    retrieved = memory_cache.get("test_key")
+    retrieved = tiered_cache.memory.get("test_key")
     
-    stats = memory_cache.get_stats()
+    stats = tiered_cache.memory.get_stats()
     
     return jsonify({
         'set_data': test_data,
@@ -307,222 +384,265 @@ def cache_test():
         'cache_stats': stats
     })
 
+@app.route('/api/cache_stats')
+def cache_stats():
+    """Requests served by each cache tier, per loader"""
+    return jsonify(tiered_cache.get_stats())
+
+@app.route('/api/snapshot_stats')
+def snapshot_stats():
+    """In-memory snapshot status"""
+    return jsonify(snapshot_store.get_stats())
+
+@app.route('/api/db_pool_stats')
+def db_pool_stats():
+    """Database connection pool statistics"""
+    return jsonify(db_manager.get_pool_stats())
+
+@app.route('/api/concurrency_stats')
+def concurrency_stats():
+    """Active and queued calls on each backend's thread pool"""
+    return jsonify(get_concurrency_stats())
+
 # visualize
 @app.route('/visualize')
 def visualize_page():
     """Data visualization page"""
     return render_template('visualize.html')
 
+# Loader arguments from a query string or a dashboard widget's params;
+# ValueError for values the endpoint should answer 400 to
+def _histogram_args(source, column):
+    """column and bin edges from bins, e.g. bins=0,1,2,3,4,5,inf"""
+    if column not in HISTOGRAM_COLUMNS:
+        raise ValueError(f"column must be one of {', '.join(sorted(HISTOGRAM_COLUMNS))}")
+    bins = source.get('bins')
+    return column, parse_bins(bins) if bins else DEFAULT_BINS[column]
+
+def _scatter_args(source):
+    return (min(int(source.get('limit', 100)), 500),)
+
+def _hourly_filtered_args(source):
+    return (float(source.get('min_magnitude', 4)),)
+
+def _top_locations_args(source):
+    return (min(int(source.get('limit', 10)), 20),)
+
+def _map_args(source, default_limit=DEFAULT_PAGE_SIZE):
+    min_magnitude = source.get('min_magnitude')
+    try:
+        min_magnitude = float(min_magnitude) if min_magnitude not in (None, '') else None
+    except ValueError:
+        min_magnitude = None
+    return (min_magnitude, *parse_page_args(source, default_limit))
+
+def _histogram_response(column):
+    try:
+        args = _histogram_args(request.args, column)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    return jsonify(_cached_payload(load_histogram, *args, use_cache=_use_cache(request.args)))
+
+@app.route('/api/histogram')
+def api_histogram():
+    """API endpoint for a histogram of mag, depth or hour_of_day"""
+    return _histogram_response(request.args.get('column', 'mag'))
+
 @app.route('/api/magnitude_distribution')
 def api_magnitude_distribution():
     """API endpoint for magnitude distribution data"""
-    use_redis = request.args.get('use_redis', 'false').lower() == 'true'
-    cache_key = "magnitude_distribution"
-    
-    start_time = time.time()
-    
-    if use_redis:
-        cached_result = redis_cache.get(cache_key)
-        if cached_result:
-            end_time = time.time()
-            return jsonify({
-                'data': cached_result,
-                'execution_time': round(end_time - start_time, 3),
-                'cache_hit': True
-            })
-    
-    data = db_manager.get_magnitude_distribution()
-    end_time = time.time()
-    
-    if use_redis and data:
-        redis_cache.set(cache_key, data, expire_time=1800)  # 30 minutes
-    
-    return jsonify({
-        'data': data,
-        'execution_time': round(end_time - start_time, 3),
-        'cache_hit': False
-    })
+    return _histogram_response('mag')
 
 @app.route('/api/magnitude_depth_scatter')
 def api_magnitude_depth_scatter():
     """API endpoint for magnitude vs depth scatter plot data"""
-    limit = min(int(request.args.get('limit', 100)), 500)
-    use_redis = request.args.get('use_redis', 'false').lower() == 'true'
-    cache_key = f"magnitude_depth_scatter_{limit}"
-    
-    start_time = time.time()
-    
-    if use_redis:
-        cached_result = redis_cache.get(cache_key)
-        if cached_result:
-            end_time = time.time()
-            return jsonify({
-                'data': cached_result,
-                'execution_time': round(end_time - start_time, 3),
-                'cache_hit': True
-            })
-    
-    data = db_manager.get_recent_magnitude_depth(limit)
-    end_time = time.time()
-    
-    if use_redis and data:
-        redis_cache.set(cache_key, data, expire_time=900)  # 15 minutes
-    
-    return jsonify({
-        'data': data,
-        'execution_time': round(end_time - start_time, 3),
-        'cache_hit': False
-    })
+    return jsonify(_cached_payload(load_magnitude_depth_scatter, *_scatter_args(request.args),
+                                   use_cache=_use_cache(request.args)))
 
 @app.route('/api/hourly_distribution')
 def api_hourly_distribution():
     """API endpoint for hourly distribution data"""
-    use_redis = request.args.get('use_redis', 'false').lower() == 'true'
-    cache_key = "hourly_distribution"
-    
-    start_time = time.time()
-    
-    if use_redis:
-        cached_result = redis_cache.get(cache_key)
-        if cached_result:
-            end_time = time.time()
-            return jsonify({
-                'data': cached_result,
-                'execution_time': round(end_time - start_time, 3),
-                'cache_hit': True
-            })
-    
-    data = db_manager.get_hourly_distribution()
-    end_time = time.time()
-    
-    if use_redis and data:
-        redis_cache.set(cache_key, data, expire_time=1800)
-    
-    return jsonify({
-        'data': data,
-        'execution_time': round(end_time - start_time, 3),
-        'cache_hit': False
-    })
+    return jsonify(_cached_payload(load_hourly_distribution, use_cache=_use_cache(request.args)))
 
 @app.route('/api/hourly_distribution_filtered')
 def api_hourly_distribution_filtered():
-    min_magnitude = float(request.args.get('min_magnitude', 4))
-    use_redis = request.args.get('use_redis', 'false').lower() == 'true'
-    cache_key = f"hourly_distribution_filtered_{min_magnitude}"
-    start_time = time.time()
-    if use_redis:
-        cached_result = redis_cache.get(cache_key)
-        if cached_result:
-            end_time = time.time()
-            return jsonify({
-                'data': cached_result,
-                'execution_time': round(end_time - start_time, 3),
-                'cache_hit': True
-            })
-    data = db_manager.get_hourly_distribution_filtered(min_magnitude)
-    end_time = time.time()
-    if use_redis and data:
-        redis_cache.set(cache_key, data, expire_time=1800)
-    return jsonify({
-        'data': data,
-        'execution_time': round(end_time - start_time, 3),
-        'cache_hit': False
-    })
+    return jsonify(_cached_payload(load_hourly_distribution_filtered,
+                                   *_hourly_filtered_args(request.args), use_cache=_use_cache(request.args)))
 
 @app.route('/api/depth_distribution')
 def api_depth_distribution():
     """API endpoint for depth distribution data"""
-    use_redis = request.args.get('use_redis', 'false').lower() == 'true'
-    cache_key = "depth_distribution"
-    
-    start_time = time.time()
-    
-    if use_redis:
-        cached_result = redis_cache.get(cache_key)
-        if cached_result:
-            end_time = time.time()
-            return jsonify({
-                'data': cached_result,
-                'execution_time': round(end_time - start_time, 3),
-                'cache_hit': True
-            })
-    
-    data = db_manager.get_depth_distribution()
-    end_time = time.time()
-    
-    if use_redis and data:
-        redis_cache.set(cache_key, data, expire_time=1800)
-    
-    return jsonify({
-        'data': data,
-        'execution_time': round(end_time - start_time, 3),
-        'cache_hit': False
-    })
+    return _histogram_response('depth')
 
 @app.route('/api/top_locations')
 def api_top_locations():
     """API endpoint for top earthquake locations"""
-    limit = min(int(request.args.get('limit', 10)), 20)
-    use_redis = request.args.get('use_redis', 'false').lower() == 'true'
-    cache_key = f"top_locations_{limit}"
-    
+    return jsonify(_cached_payload(load_top_locations, *_top_locations_args(request.args),
+                                   use_cache=_use_cache(request.args)))
+
+@app.route('/api/earthquakes_map')
+def api_earthquakes_map():
+    """API endpoint for earthquake map data"""
+    use_redis = _use_cache(request.args)
+    try:
+        min_magnitude, limit, after, include_total = _map_args(request.args, _default_limit())
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    if _wants_ndjson():
+        return _ndjson_response(DB.call(snapshot_store.reader().get_earthquakes_past_30_days,
+                                        min_magnitude, limit, after, stream=True))
+    
+    payload = _cached_payload(load_earthquakes_map, min_magnitude, limit, after, include_total,
+                              use_cache=use_redis)
+    
+    # Packed typed arrays instead of JSON objects, decoded by visualize.html.
+    # Encoded after the lookup, so both formats share the cached rows.
+    if request.args.get('format') == 'columnar' or request.accept_mimetypes.best == COLUMNAR_MEDIA_TYPE:
+        body = encode_columns(columns_from_rows(payload.pop('data')), payload)
+        return Response(body, mimetype=COLUMNAR_MEDIA_TYPE)
+    
+    payload['count'] = len(payload['data'])
+    return jsonify(payload)
+
+# Widgets /api/dashboard can combine: the loader behind the endpoint of the
+# same name and how to read that endpoint's parameters
+DASHBOARD_WIDGETS = {
+    'histogram': (load_histogram, lambda source: _histogram_args(source, source.get('column', 'mag'))),
+    'magnitude_distribution': (load_histogram, lambda source: _histogram_args(source, 'mag')),
+    'depth_distribution': (load_histogram, lambda source: _histogram_args(source, 'depth')),
+    'magnitude_depth_scatter': (load_magnitude_depth_scatter, _scatter_args),
+    'hourly_distribution': (load_hourly_distribution, lambda source: ()),
+    'hourly_distribution_filtered': (load_hourly_distribution_filtered, _hourly_filtered_args),
+    'top_locations': (load_top_locations, _top_locations_args),
+    'earthquakes_map': (load_earthquakes_map, _map_args),
+}
+MAX_DASHBOARD_WIDGETS = 20
+
+def _widget_call(widget):
+    """(loader, args) for a widget name or {"widget", "params"}; ValueError if invalid"""
+    if isinstance(widget, str):
+        widget = {'widget': widget}
+    name = widget.get('widget')
+    if not isinstance(name, str) or name not in DASHBOARD_WIDGETS:
+        raise ValueError(f"Unknown widget: {name}")
+    loader, parse_args = DASHBOARD_WIDGETS[name]
+    params = widget.get('params') or {}
+    if not isinstance(params, dict):
+        raise ValueError(f"params of widget {name} must be an object")
+    try:
+        return loader, parse_args(params)
+    except TypeError as e:
+        raise ValueError(f"Invalid params for widget {name}: {e}")
+
+# Precomputes the hot widgets in the background at startup and after every upload
+cache_warmer = CacheWarmer(_widget_call, lock=redis_cache, version=dataset_version.current)
+
+def start_services():
+    """Connect to Redis and the database and start loading the snapshot and warming the cache.
+
+    Runs once in each serving process: from gunicorn's post_worker_init hook
+    (gunicorn.conf.py) or from the __main__ block below.
+    """
+    redis_cache.connect()
+    db_manager.pool.fill()
+    snapshot_store.rebuild_async()
+    cache_warmer.start('startup')
+
+@app.route('/api/dashboard', methods=['POST'])
+def api_dashboard():
+    """Several widgets in one response, their queries run in parallel.
+
+    The body lists widgets as {"widget": name, "params": {...}}, where params
+    are the query parameters of the endpoint of that name; two uses of one
+    widget need distinct "id"s. Each widget's payload is what its endpoint
+    returns, timings and cache status included, or an error.
+    """
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict):
+        return jsonify({'error': 'Expected a JSON object body, e.g. {"widgets": ["hourly_distribution"]}'}), 400
+    widgets = data.get('widgets') or []
+    if not isinstance(widgets, list) or len(widgets) > MAX_DASHBOARD_WIDGETS:
+        return jsonify({'error': f"widgets must be a list of at most {MAX_DASHBOARD_WIDGETS} widgets"}), 400
+    
+    calls = {}
+    try:
+        for widget in widgets:
+            if not isinstance(widget, (str, dict)):
+                raise ValueError(f"Each widget must be a name or an object, not {widget!r}")
+            widget_id = str(widget if isinstance(widget, str) else widget.get('id', widget.get('widget')))
+            if widget_id in calls:
+                raise ValueError(f"Duplicate widget id {widget_id}; give repeated widgets distinct ids")
+            calls[widget_id] = _widget_call(widget)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    use_cache = _use_cache(data)
     start_time = time.time()
-    
-    if use_redis:
-        cached_result = redis_cache.get(cache_key)
-        if cached_result:
-            end_time = time.time()
-            return jsonify({
-                'data': cached_result,
-                'execution_time': round(end_time - start_time, 3),
-                'cache_hit': True
-            })
-    
-    data = db_manager.get_top_locations(limit)
-    end_time = time.time()
-    
-    if use_redis and data:
-        redis_cache.set(cache_key, data, expire_time=1800)
+    # One thread per widget; the lookups inside take their turns on the CACHE
+    # and DB pools like any request's would, and L1 hits need neither
+    payloads = []
+    with ThreadPoolExecutor(max(len(calls), 1), thread_name_prefix='dashboard-') as executor:
+        futures = [executor.submit(_cached_payload, loader, *args, use_cache=use_cache)
+                   for loader, args in calls.values()]
+        for future in futures:
+            try:
+                payloads.append(future.result())
+            except Exception as e:
+                payloads.append(e)
+    
+    results = {}
+    for (widget_id, (loader, _)), payload in zip(calls.items(), payloads):
+        if isinstance(payload, Exception):
+            print(f"❌ Dashboard widget {widget_id} failed: {payload}")
+            payload = {'error': str(payload)}
+        elif loader is load_earthquakes_map:
+            # Same payload as /api/earthquakes_map
+            payload['count'] = len(payload['data'])
+        results[widget_id] = payload
     
     return jsonify({
-        'data': data,
-        'execution_time': round(end_time - start_time, 3),
-        'cache_hit': False
+        'widgets': results,
+        'execution_time': round(time.time() - start_time, 3),
+        'cache_hits': sum(1 for payload in results.values() if payload.get('cache_hit')),
     })
 
-@app.route('/api/earthquakes_map')
-def api_earthquakes_map():
-    """API endpoint for earthquake map data"""
+@app.route('/api/cache_warmup', methods=['GET', 'POST'])
+def api_cache_warmup():
+    """Progress of the latest cache warm-up; POST starts a new one"""
+    if request.method == 'POST':
+        if not cache_warmer.start('manual', exclusive=False):
+            return jsonify({'error': 'Cache warm-up is disabled'}), 409
+    return jsonify(cache_warmer.get_progress())
+
+@app.route('/api/tiles/<int:z>/<int:x>/<int:y>')
+def api_tiles(z, x, y):
+    """Precomputed clusters in one map tile, or its events at high zoom"""
     min_magnitude = request.args.get('min_magnitude', type=float)
-    use_redis = request.args.get('use_redis', 'false').lower() == 'true'
-    
-    cache_key = f"earthquakes_map_{min_magnitude if min_magnitude else 'all'}"
-    
     start_time = time.time()
     
-    if use_redis:
-        cached_result = redis_cache.get(cache_key)
-        if cached_result:
-            end_time = time.time()
-            return jsonify({
-                'data': cached_result,
-                'execution_time': round(end_time - start_time, 3),
-                'cache_hit': True,
-                'count': len(cached_result)
-            })
-    
-    data = db_manager.get_earthquakes_past_30_days(min_magnitude)
+    # Loaded in the background; until then there is nothing to cut tiles from
+    source = snapshot_store.tile_source()
+    if source is None:
+        return jsonify({'error': 'Map tiles are not available yet'}), 503
+    try:
+        # Tiles zoomed past the clusters read their events from the database
+        tile = DB.call(source.get_tile, z, x, y, min_magnitude)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     end_time = time.time()
     
-    if use_redis and data:
-        redis_cache.set(cache_key, data, expire_time=1800)  # 30 minutes
-    
     return jsonify({
-        'data': data,
+        'zoom': z,
+        'x': x,
+        'y': y,
+        **tile,
+        # Clients key their tile cache by the dataset version the tile was cut from
+        'version': source.version,
         'execution_time': round(end_time - start_time, 3),
-        'cache_hit': False,
-        'count': len(data)
+        'cache_hit': False
     })
 
 if __name__ == '__main__':
+    start_services()
     app.run(debug=True, port=5678)
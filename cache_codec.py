@@ -0,0 +1,135 @@
+import json
+import os
+import threading
+import time
+import zlib
+
+# Optional faster formats; JSON and zlib are always available
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+try:
+    import lz4.frame as lz4_frame
+except ImportError:
+    lz4_frame = None
+
+# Starts every encoded value. Values written before the codec existed are
+# plain JSON text, which can't start with a NUL byte.
+MAGIC = b'\x00RC1'
+
+# 'auto' picks msgpack if installed, else json
+REDIS_CODEC = os.getenv('REDIS_CODEC', 'auto')
+# 'auto' picks zstd, then lz4, then zlib, whichever is installed first
+REDIS_COMPRESSION = os.getenv('REDIS_COMPRESSION', 'auto')
+# Values smaller than this once serialized are stored uncompressed
+COMPRESS_MIN_BYTES = int(os.getenv('REDIS_COMPRESS_MIN_BYTES', 1024))
+
+
+def _json_dumps(value):
+    return json.dumps(value, separators=(',', ':')).encode()
+
+
+SERIALIZERS = {'json': (b'j', _json_dumps, json.loads)}
+if msgpack is not None:
+    SERIALIZERS['msgpack'] = (b'm', lambda value: msgpack.packb(value, use_bin_type=True),
+                              lambda data: msgpack.unpackb(data, raw=False, strict_map_key=False))
+
+COMPRESSORS = {
+    'none': (b'n', bytes, bytes),
+    'zlib': (b'z', lambda data: zlib.compress(data, 1), zlib.decompress),
+}
+if zstandard is not None:
+    COMPRESSORS['zstd'] = (b's', zstandard.ZstdCompressor(level=3).compress,
+                           lambda data: zstandard.ZstdDecompressor().decompress(data))
+if lz4_frame is not None:
+    COMPRESSORS['lz4'] = (b'l', lz4_frame.compress, lz4_frame.decompress)
+
+_SERIALIZERS_BY_ID = {tag: loads for tag, _, loads in SERIALIZERS.values()}
+_COMPRESSORS_BY_ID = {tag: decompress for tag, _, decompress in COMPRESSORS.values()}
+
+
+def _pick(requested, available, preference, kind):
+    if requested == 'auto':
+        return next(name for name in preference if name in available)
+    if requested not in available:
+        raise ValueError(f"{kind} {requested!r} is not available; choose from {', '.join(sorted(available))}")
+    return requested
+
+
+class CacheCodec:
+    """Converts cached values to and from the bytes stored in Redis.
+
+    Layout: MAGIC, one byte naming the serializer, one naming the
+    compression, then the payload. Any installed format can be decoded
+    whatever this process writes, so workers with different settings share
+    entries, and headerless values are read as the JSON written before.
+    """
+
+    def __init__(self, serializer=None, compression=None, min_bytes=None):
+        self.serializer = _pick(serializer or REDIS_CODEC, SERIALIZERS, ('msgpack', 'json'), 'Serializer')
+        self.compression = _pick(compression or REDIS_COMPRESSION, COMPRESSORS,
+                                 ('zstd', 'lz4', 'zlib'), 'Compression')
+        self.min_bytes = COMPRESS_MIN_BYTES if min_bytes is None else min_bytes
+        self._lock = threading.Lock()
+        self._metrics = {
+            'encoded': 0, 'decoded': 0, 'compressed': 0, 'legacy_decoded': 0,
+            'raw_bytes': 0, 'stored_bytes': 0, 'encode_seconds': 0.0, 'decode_seconds': 0.0,
+        }
+
+    def encode(self, value):
+        start = time.perf_counter()
+        serializer_id, dumps, _ = SERIALIZERS[self.serializer]
+        payload = dumps(value)
+        raw_size = len(payload)
+        compression_id = b'n'
+        if raw_size >= self.min_bytes and self.compression != 'none':
+            tag, compress, _ = COMPRESSORS[self.compression]
+            compressed = compress(payload)
+            # Keep it only if it actually saves space
+            if len(compressed) < raw_size:
+                payload, compression_id = compressed, tag
+        data = MAGIC + serializer_id + compression_id + payload
+        self._record(encoded=1, compressed=compression_id != b'n', raw_bytes=raw_size,
+                     stored_bytes=len(data), encode_seconds=time.perf_counter() - start)
+        return data
+
+    def decode(self, data):
+        start = time.perf_counter()
+        if isinstance(data, str) or not data.startswith(MAGIC):
+            value = json.loads(data)
+            self._record(decoded=1, legacy_decoded=1, decode_seconds=time.perf_counter() - start)
+            return value
+        serializer_id = data[len(MAGIC):len(MAGIC) + 1]
+        compression_id = data[len(MAGIC) + 1:len(MAGIC) + 2]
+        if serializer_id not in _SERIALIZERS_BY_ID or compression_id not in _COMPRESSORS_BY_ID:
+            raise ValueError(f"Cached value uses an unavailable format: {serializer_id!r}/{compression_id!r}")
+        payload = _COMPRESSORS_BY_ID[compression_id](data[len(MAGIC) + 2:])
+        value = _SERIALIZERS_BY_ID[serializer_id](payload)
+        self._record(decoded=1, decode_seconds=time.perf_counter() - start)
+        return value
+
+    def _record(self, **amounts):
+        with self._lock:
+            for name, amount in amounts.items():
+                self._metrics[name] += amount
+
+    def get_stats(self):
+        with self._lock:
+            metrics = dict(self._metrics)
+        return {
+            'serializer': self.serializer,
+            'compression': self.compression,
+            'compress_min_bytes': self.min_bytes,
+            **metrics,
+            'compression_ratio': round(metrics['raw_bytes'] / metrics['stored_bytes'], 3)
+            if metrics['stored_bytes'] else None,
+            'avg_encode_ms': round(metrics['encode_seconds'] * 1000 / metrics['encoded'], 3)
+            if metrics['encoded'] else None,
+            'avg_decode_ms': round(metrics['decode_seconds'] * 1000 / metrics['decoded'], 3)
+            if metrics['decoded'] else None,
+        }
@@ -0,0 +1,154 @@
+import json
+import os
+import threading
+import time
+from tiered_cache import ORIGIN
+
+CACHE_WARMUP_ENABLED = os.getenv('CACHE_WARMUP_ENABLED', 'true').lower() == 'true'
+# Seconds one warm-up may spend; queries it doesn't reach stay cold
+CACHE_WARMUP_BUDGET = float(os.getenv('CACHE_WARMUP_BUDGET', 120))
+
+# Redis lock taken by the one process that warms a dataset version
+LOCK_PREFIX = 'cache_warmup:'
+# Rows per map query, the page visualize.html asks for; the budget can't stop
+# a query once it runs, so none may read the whole table
+MAP_LIMIT = 5000
+
+# Queries precomputed after start and after each upload, in the widget format
+# of /api/dashboard: every distribution chart, the scatter limits and the map
+# filters visualize.html offers. CACHE_WARMUP_WIDGETS replaces the list.
+DEFAULT_WARMUP_WIDGETS = [
+    {'widget': 'magnitude_distribution'},
+    {'widget': 'depth_distribution'},
+    {'widget': 'histogram', 'params': {'column': 'hour_of_day'}},
+    {'widget': 'hourly_distribution'},
+    {'widget': 'hourly_distribution_filtered', 'params': {'min_magnitude': 4}},
+    {'widget': 'top_locations'},
+    {'widget': 'magnitude_depth_scatter', 'params': {'limit': 100}},
+    {'widget': 'magnitude_depth_scatter', 'params': {'limit': 200}},
+    {'widget': 'magnitude_depth_scatter', 'params': {'limit': 500}},
+    {'widget': 'earthquakes_map', 'params': {'limit': MAP_LIMIT}},
+    {'widget': 'earthquakes_map', 'params': {'min_magnitude': 5, 'limit': MAP_LIMIT}},
+    {'widget': 'earthquakes_map', 'params': {'min_magnitude': 7, 'limit': MAP_LIMIT}},
+]
+
+
+def warmup_widgets():
+    """The configured warm-up list"""
+    configured = os.getenv('CACHE_WARMUP_WIDGETS')
+    return json.loads(configured) if configured else DEFAULT_WARMUP_WIDGETS
+
+
+class CacheWarmer:
+    """Precomputes hot queries into the cache on a background thread.
+
+    resolve(widget) turns a widget into (cached loader, arguments), the same
+    call its endpoint would make, so the warmed keys are the ones requests
+    look up. Queries run one at a time so live traffic keeps most of the
+    database, and a run stops once it has spent its time budget. Starting a
+    new run, e.g. for a newer dataset version, supersedes the one in progress.
+
+    Every worker starts a run at startup and when it sees a new version, but
+    with a lock (the RedisCache) only the one holding LOCK_PREFIX + version
+    computes; the others read the results from Redis once asked.
+    """
+
+    def __init__(self, resolve, widgets=None, budget=None, enabled=None, lock=None, version=None):
+        self.resolve = resolve
+        self.widgets = widgets if widgets is not None else warmup_widgets()
+        self.budget = budget if budget is not None else CACHE_WARMUP_BUDGET
+        self.enabled = enabled if enabled is not None else CACHE_WARMUP_ENABLED
+        self.lock = lock
+        self.version = version
+        self._generation = 0
+        self._progress = {'state': 'idle'}
+        self._lock = threading.Lock()
+
+    def start(self, reason, exclusive=True):
+        """Begin a run in the background; returns False when warm-up is disabled.
+
+        An exclusive run is skipped when another process already warms the
+        current dataset version.
+        """
+        if not self.enabled:
+            return False
+        with self._lock:
+            self._generation += 1
+            generation = self._generation
+        threading.Thread(target=self.run, args=(reason, generation, exclusive), daemon=True).start()
+        return True
+
+    def _claim(self):
+        """Take the warm-up lock of the current version for one budget"""
+        if self.lock is None or self.version is None:
+            return True
+        # Without Redis the lock is always granted and each worker warms its own L1
+        acquired, _ = self.lock.acquire_lock(f"{LOCK_PREFIX}{self.version()}", self.budget)
+        return acquired
+
+    def run(self, reason, generation=None, exclusive=False):
+        if exclusive and not self._claim():
+            self._publish({'state': 'elsewhere', 'reason': reason}, generation)
+            print(f"🔥 Cache warm-up ({reason}) left to the worker already warming this dataset version")
+            return
+        started_at = time.time()
+        deadline = started_at + self.budget
+        queries = [{'widget': widget.get('widget'), 'params': widget.get('params') or {}, 'status': 'pending'}
+                   for widget in self.widgets]
+        progress = {'state': 'running', 'reason': reason, 'started_at': started_at, 'budget': self.budget,
+                    'queries': queries}
+        if not self._publish(progress, generation):
+            return
+        print(f"🔥 Cache warm-up started ({reason}): {len(queries)} queries, {self.budget:.0f}s budget")
+
+        for widget, query in zip(self.widgets, queries):
+            if generation is not None and generation != self._generation:
+                progress['state'] = 'superseded'
+                break
+            if time.time() >= deadline:
+                progress['state'] = 'budget_exhausted'
+                break
+            query_start = time.time()
+            try:
+                loader, args = self.resolve(widget)
+                query['served_by'] = loader.load(*args).served_by
+                query['status'] = 'done'
+            except Exception as e:
+                print(f"❌ Cache warm-up of {query['widget']} failed: {e}")
+                query['status'] = 'failed'
+                query['error'] = str(e)
+            query['seconds'] = round(time.time() - query_start, 3)
+        else:
+            progress['state'] = 'done'
+        for query in queries:
+            if query['status'] == 'pending':
+                query['status'] = 'skipped'
+
+        progress['elapsed'] = round(time.time() - started_at, 3)
+        self._publish(progress, generation)
+        done = sum(query['status'] == 'done' for query in queries)
+        print(f"🔥 Cache warm-up {progress['state']}: {done}/{len(queries)} queries in {progress['elapsed']}s")
+
+    def _publish(self, progress, generation):
+        # A superseded run no longer reports
+        with self._lock:
+            if generation is not None and generation != self._generation:
+                return False
+            self._progress = progress
+            return True
+
+    def get_progress(self):
+        with self._lock:
+            progress = dict(self._progress)
+        queries = progress.get('queries', [])
+        if 'started_at' in progress and 'elapsed' not in progress:
+            progress['elapsed'] = round(time.time() - progress['started_at'], 3)
+        return {
+            **progress,
+            'enabled': self.enabled,
+            'total': len(queries),
+            'completed': sum(query['status'] != 'pending' for query in queries),
+            'computed': sum(query.get('served_by') == ORIGIN for query in queries),
+            'failed': sum(query['status'] == 'failed' for query in queries),
+            'skipped': sum(query['status'] == 'skipped' for query in queries),
+        }
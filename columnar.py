@@ -0,0 +1,80 @@
+import json
+import struct
+import numpy as np
+import pandas as pd
+
+MEDIA_TYPE = 'application/vnd.earthquakes.columnar'
+MAGIC = b'EQC1'
+
+# Column name, little-endian type code (as decoded by visualize.html) and dtype
+COLUMNS = [
+    ('time', 'f8', '<f8'),       # epoch milliseconds, UTC
+    ('latitude', 'f4', '<f4'),
+    ('longitude', 'f4', '<f4'),
+    ('depth', 'f4', '<f4'),
+    ('magnitude', 'f4', '<f4'),
+    ('place', 'u4', '<u4'),      # index into the header's places list
+]
+
+
+def _align(offset, size=8):
+    return (offset + size - 1) // size * size
+
+
+def encode_columns(columns, meta=None):
+    """Pack event columns into the binary map format.
+
+    Layout: MAGIC, a uint32 header length, a UTF-8 JSON header, then each
+    column as a packed little-endian array starting on an 8 byte boundary so
+    the browser can view it as a typed array without copying. The header
+    holds the row count, column offsets relative to the data section, the
+    place dictionary, the ids and any meta fields.
+    """
+    count = len(columns['id'])
+    buffers = []
+    layout = []
+    offset = 0
+    for name, type_code, dtype in COLUMNS:
+        data = np.ascontiguousarray(columns[name], dtype=dtype).tobytes()
+        offset = _align(offset)
+        layout.append({'name': name, 'type': type_code, 'offset': offset})
+        buffers.append((offset, data))
+        offset += len(data)
+
+    header = json.dumps({
+        'count': count,
+        'columns': layout,
+        'places': list(columns['places']),
+        'ids': list(columns['id']),
+        **(meta or {}),
+    }).encode()
+    data_start = _align(len(MAGIC) + 4 + len(header))
+
+    body = bytearray(data_start + offset)
+    body[:len(MAGIC)] = MAGIC
+    struct.pack_into('<I', body, len(MAGIC), len(header))
+    body[len(MAGIC) + 4:len(MAGIC) + 4 + len(header)] = header
+    for column_offset, data in buffers:
+        body[data_start + column_offset:data_start + column_offset + len(data)] = data
+    return bytes(body)
+
+
+def epoch_millis(times):
+    """datetime64 values or ISO strings as float64 epoch milliseconds"""
+    values = pd.to_datetime(pd.Series(times, dtype=object) if not isinstance(times, np.ndarray) else times)
+    return np.asarray(values, dtype='datetime64[ms]').astype(np.int64).astype(np.float64)
+
+
+def columns_from_rows(rows):
+    """Event columns from row dicts as returned by the search methods"""
+    codes, places = pd.factorize(pd.Series([row['place'] for row in rows], dtype=object))
+    return {
+        'id': [row['id'] for row in rows],
+        'time': epoch_millis([row['time'] for row in rows]),
+        'latitude': [row['latitude'] for row in rows],
+        'longitude': [row['longitude'] for row in rows],
+        'depth': [row['depth'] for row in rows],
+        'magnitude': [row['magnitude'] for row in rows],
+        'place': codes,
+        'places': list(places),
+    }
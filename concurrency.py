@@ -0,0 +1,109 @@
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+# Blocking calls each backend may run at once in one process. Cache calls are
+# Redis round trips, loaders wait on the database (or the snapshot), uploads
+# hold a connection for minutes.
+CACHE_CONCURRENCY = int(os.getenv('CACHE_CONCURRENCY', os.getenv('REDIS_MAX_CONNECTIONS', 20)))
+DB_CONCURRENCY = int(os.getenv('DB_CONCURRENCY', os.getenv('DB_POOL_MAX', 10)))
+UPLOAD_CONCURRENCY = int(os.getenv('UPLOAD_CONCURRENCY', 1))
+
+
+class Backend:
+    """Bounded thread pool for the blocking calls into one backend.
+
+    Views run their queries through call(), so at most max_workers of them
+    reach the backend at once and further calls queue. The request thread
+    blocks meanwhile; request concurrency comes from gunicorn's gthread
+    workers (gunicorn.conf.py), and these pools keep those threads from
+    overrunning the database and Redis. call() runs inline on a thread that
+    already belongs to this pool, and submit() lets a view fan out several
+    calls and wait on their futures. Streamed responses read through
+    stream(), bounded by as many permits.
+    """
+
+    def __init__(self, name, max_workers):
+        self.name = name
+        self.max_workers = max_workers
+        self._executor = ThreadPoolExecutor(max_workers, thread_name_prefix=f"{name}-")
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._active = 0
+        self._queued = 0
+        self._streams = threading.BoundedSemaphore(max_workers)
+        self._streaming = 0
+        self._stats = {'completed': 0, 'failed': 0, 'max_queued': 0, 'wait_time': 0.0}
+
+    def _run(self, fn, args, kwargs, submitted_at):
+        with self._lock:
+            self._queued -= 1
+            self._active += 1
+            self._stats['wait_time'] += time.time() - submitted_at
+        self._local.inside = True
+        failed = False
+        try:
+            return fn(*args, **kwargs)
+        except Exception:
+            failed = True
+            raise
+        finally:
+            self._local.inside = False
+            with self._lock:
+                self._active -= 1
+                self._stats['completed'] += 1
+                self._stats['failed'] += failed
+
+    def submit(self, fn, *args, **kwargs):
+        """Queue fn(*args, **kwargs) on the pool; returns a Future"""
+        with self._lock:
+            self._queued += 1
+            self._stats['max_queued'] = max(self._stats['max_queued'], self._queued)
+        return self._executor.submit(self._run, fn, args, kwargs, time.time())
+
+    def call(self, fn, *args, **kwargs):
+        """Run fn on the pool and wait for its result"""
+        # Waiting on our own pool from one of its threads could deadlock
+        if getattr(self._local, 'inside', False):
+            return fn(*args, **kwargs)
+        return self.submit(fn, *args, **kwargs).result()
+
+    def stream(self, rows):
+        """Iterate rows, a lazy reader of this backend, holding a stream permit.
+
+        A streamed response keeps its connection until the client has read the
+        last row, which would pin a pool thread for as long, so it is read on
+        the response thread instead. The permit is taken at the first row and
+        given back when rows is exhausted or the response is closed.
+        """
+        with self._streams:
+            with self._lock:
+                self._streaming += 1
+            try:
+                yield from rows
+            finally:
+                with self._lock:
+                    self._streaming -= 1
+
+    def get_stats(self):
+        with self._lock:
+            completed = self._stats['completed']
+            return {
+                'max_workers': self.max_workers,
+                'active': self._active,
+                'queued': self._queued,
+                'streaming': self._streaming,
+                **self._stats,
+                'avg_wait_ms': round(self._stats['wait_time'] * 1000 / completed, 3) if completed else None,
+            }
+
+
+CACHE = Backend('cache', CACHE_CONCURRENCY)
+DB = Backend('db', DB_CONCURRENCY)
+UPLOAD = Backend('upload', UPLOAD_CONCURRENCY)
+BACKENDS = (CACHE, DB, UPLOAD)
+
+
+def get_stats():
+    return {backend.name: backend.get_stats() for backend in BACKENDS}
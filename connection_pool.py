@@ -0,0 +1,317 @@
+import os
+import threading
+import time
+from collections import deque
+
+
+class PooledCursor:
+    """Cursor handed out by a pooled connection.
+
+    All checkouts of a connection share one underlying cursor, so executing
+    the same SQL text as the previous statement reuses the prepared statement
+    instead of preparing it again. close() only detaches the wrapper, and a
+    wrapper stops working once its checkout has gone back to the pool.
+    """
+
+    def __init__(self, pooled_conn):
+        object.__setattr__(self, '_pooled', pooled_conn)
+        object.__setattr__(self, '_checkout', pooled_conn._checkout)
+        object.__setattr__(self, '_raw_cursor', pooled_conn._statement_cursor())
+
+    @property
+    def _cursor(self):
+        if self._raw_cursor is None or self._checkout != self._pooled._checkout:
+            raise RuntimeError("Cursor used after it was closed or its connection went back to the pool")
+        return self._raw_cursor
+
+    def execute(self, sql, *params):
+        cursor = self._cursor
+        self._pooled._note_statement(sql)
+        cursor.execute(sql, *params)
+        return self
+
+    def executemany(self, sql, seq_of_params):
+        cursor = self._cursor
+        self._pooled._note_statement(sql)
+        cursor.executemany(sql, seq_of_params)
+        return self
+
+    def close(self):
+        object.__setattr__(self, '_raw_cursor', None)
+
+    def __iter__(self):
+        return iter(self._cursor)
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+    def __setattr__(self, name, value):
+        # Settings outlive the checkout on the shared cursor; release() replaces it
+        cursor = self._cursor
+        self._pooled._cursor_changed = True
+        setattr(cursor, name, value)
+
+
+class PooledConnection:
+    """A raw connection owned by the pool and the state kept across its checkouts"""
+
+    def __init__(self, pool, raw):
+        self._pool = pool
+        self._raw = raw
+        self._cursor = None
+        self._cursor_changed = False
+        self._last_sql = None
+        # Bumped on release, retiring the Checkout and cursor wrappers of the last checkout
+        self._checkout = 0
+        self.created_at = time.time()
+        self.last_used = time.time()
+        self.in_use = False
+
+    def _statement_cursor(self):
+        if self._cursor is None:
+            self._cursor = self._raw.cursor()
+        return self._cursor
+
+    def _note_statement(self, sql):
+        if sql == self._last_sql:
+            self._pool._record('statement_reuses')
+        self._last_sql = sql
+
+    def _reset(self):
+        """Clear per-checkout state before the connection goes back to the pool"""
+        self._checkout += 1
+        if self._cursor_changed:
+            # A fresh cursor rather than undoing settings one by one
+            self._cursor.close()
+            self._cursor = None
+            self._last_sql = None
+            self._cursor_changed = False
+        # End any transaction left open by read-only callers; unread rows
+        # of the shared cursor are discarded by its next execute
+        self._raw.rollback()
+
+    def _discard(self):
+        try:
+            if self._cursor is not None:
+                self._cursor.close()
+            self._raw.close()
+        except Exception:
+            pass
+
+
+class Checkout:
+    """One checkout of a pooled connection, proxying the raw connection.
+
+    close() returns the connection to the pool the first time; after that
+    the handle is dead, so closing it again, or using it, can't reach the
+    connection once another caller has checked it out.
+    """
+
+    def __init__(self, conn):
+        self._conn = conn
+        self._checkout = conn._checkout
+
+    def _live(self):
+        conn = self._conn
+        if conn is None or self._checkout != conn._checkout:
+            raise RuntimeError("Connection used after it was closed")
+        return conn
+
+    def cursor(self):
+        return PooledCursor(self._live())
+
+    def commit(self):
+        self._live()._raw.commit()
+
+    def rollback(self):
+        self._live()._raw.rollback()
+
+    def close(self):
+        conn, self._conn = self._conn, None
+        if conn is not None and self._checkout == conn._checkout:
+            conn._pool.release(conn)
+
+    def __getattr__(self, name):
+        return getattr(self._live()._raw, name)
+
+
+class ConnectionPool:
+    """Thread-safe pool of database connections.
+
+    fill() opens min_size connections up front; more are created on demand up
+    to max_size, and idle connections above min_size are closed after
+    idle_timeout seconds. A connection idle for at least ping_after seconds
+    is checked with a cheap query before it is handed out. One the server
+    dropped within that window goes out unchecked: its first statement fails
+    and release() then discards it, so ping_after=0 checks every checkout.
+    """
+
+    def __init__(self, connect, min_size=None, max_size=None, checkout_timeout=None,
+                 idle_timeout=None, ping_after=None, ping_sql='SELECT 1'):
+        self._connect = connect
+        self.min_size = min_size if min_size is not None else int(os.getenv('DB_POOL_MIN', 1))
+        self.max_size = max_size if max_size is not None else int(os.getenv('DB_POOL_MAX', 10))
+        self.checkout_timeout = checkout_timeout if checkout_timeout is not None else float(os.getenv('DB_POOL_TIMEOUT', 30))
+        self.idle_timeout = idle_timeout if idle_timeout is not None else float(os.getenv('DB_POOL_IDLE_TIMEOUT', 300))
+        self.ping_after = ping_after if ping_after is not None else float(os.getenv('DB_POOL_PING_AFTER', 5))
+        self.ping_sql = ping_sql
+
+        self._idle = deque()
+        self._size = 0
+        self._in_use = 0
+        self._condition = threading.Condition()
+        self._stats = {
+            'created': 0,
+            'closed': 0,
+            'checkouts': 0,
+            'waits': 0,
+            'wait_time': 0.0,
+            'health_check_failures': 0,
+            'idle_evictions': 0,
+            'statement_reuses': 0,
+        }
+
+    def fill(self):
+        """Open connections until min_size are available; returns how many were opened"""
+        opened = 0
+        while True:
+            with self._condition:
+                if self._size >= self.min_size:
+                    return opened
+                self._size += 1
+            try:
+                conn = PooledConnection(self, self._connect())
+            except Exception as e:
+                with self._condition:
+                    self._size -= 1
+                    self._condition.notify()
+                print(f"Could not pre-open a pooled connection: {e}")
+                return opened
+            self._record('created')
+            with self._condition:
+                self._idle.append(conn)
+                self._condition.notify()
+            opened += 1
+
+    def _record(self, name, amount=1):
+        with self._condition:
+            self._stats[name] += amount
+
+    def acquire(self):
+        """Check out a healthy connection, opening a new one if the pool has room.
+
+        Returns a Checkout; closing it gives the connection back.
+        """
+        deadline = time.time() + self.checkout_timeout
+        with self._condition:
+            self._evict_idle()
+            waited_since = None
+            while True:
+                if self._idle:
+                    conn = self._idle.pop()
+                    break
+                if self._size < self.max_size:
+                    conn = None
+                    self._size += 1
+                    break
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    raise TimeoutError(f"No database connection available after {self.checkout_timeout}s")
+                if waited_since is None:
+                    waited_since = time.time()
+                    self._stats['waits'] += 1
+                self._condition.wait(remaining)
+            if waited_since is not None:
+                self._stats['wait_time'] += time.time() - waited_since
+            self._in_use += 1
+            self._stats['checkouts'] += 1
+
+        try:
+            if conn is None:
+                conn = PooledConnection(self, self._connect())
+                self._record('created')
+            elif not self._is_healthy(conn):
+                conn._discard()
+                self._record('closed')
+                conn = PooledConnection(self, self._connect())
+                self._record('created')
+        except Exception:
+            with self._condition:
+                self._size -= 1
+                self._in_use -= 1
+                self._condition.notify()
+            raise
+
+        conn.in_use = True
+        return Checkout(conn)
+
+    def _is_healthy(self, conn):
+        if time.time() - conn.last_used < self.ping_after:
+            return True
+        try:
+            cursor = conn._statement_cursor()
+            conn._last_sql = None
+            cursor.execute(self.ping_sql)
+            cursor.fetchall()
+            return True
+        except Exception as e:
+            print(f"Pooled connection failed health check: {e}")
+            self._record('health_check_failures')
+            return False
+
+    def release(self, conn):
+        """Return a connection to the pool, dropping it if it can't be reset"""
+        conn.in_use = False
+        conn.last_used = time.time()
+        try:
+            conn._reset()
+            healthy = True
+        except Exception:
+            healthy = False
+
+        with self._condition:
+            self._in_use -= 1
+            if healthy:
+                self._idle.append(conn)
+            else:
+                self._size -= 1
+                self._stats['closed'] += 1
+            self._condition.notify()
+
+        if not healthy:
+            conn._discard()
+
+    def _evict_idle(self):
+        """Close connections idle longer than idle_timeout, keeping min_size around"""
+        now = time.time()
+        # Oldest idle connections sit at the left of the deque
+        while self._idle and self._size > self.min_size and now - self._idle[0].last_used > self.idle_timeout:
+            conn = self._idle.popleft()
+            self._size -= 1
+            self._stats['idle_evictions'] += 1
+            self._stats['closed'] += 1
+            conn._discard()
+
+    def close_all(self):
+        """Close every idle connection"""
+        with self._condition:
+            while self._idle:
+                self._idle.pop()._discard()
+                self._size -= 1
+                self._stats['closed'] += 1
+
+    def get_stats(self):
+        """Get pool utilisation statistics"""
+        with self._condition:
+            stats = dict(self._stats)
+            stats.update({
+                'size': self._size,
+                'in_use': self._in_use,
+                'idle': len(self._idle),
+                'min_size': self.min_size,
+                'max_size': self.max_size,
+                'utilisation': round(self._in_use / self.max_size * 100, 2) if self.max_size else 0,
+                'avg_wait_time': round(stats['wait_time'] / stats['waits'], 4) if stats['waits'] else 0,
+            })
+            stats['wait_time'] = round(stats['wait_time'], 4)
+            return stats
@@ -1,10 +1,32 @@
-import pyodbc
+try:
+    import pyodbc
+except ImportError:  # only needed for the SQL Server backend
+    pyodbc = None
+import numpy as np
 import pandas as pd
 from datetime import datetime, timedelta
 import math
 import os
 from timezonefinder import TimezoneFinder
 import pytz
+from timezone_enrichment import TimezoneEnricher
+from connection_pool import ConnectionPool
+from spatial_index import bounding_box, EARTH_RADIUS_KM, MAX_DISTANCE_KM
+from place_index import trigrams, MIN_INDEXED_LENGTH
+from histogram import MAGNITUDE_BINS, DEPTH_BINS, bin_labels, bucket_case_sql, validate_bins
+from summary_cube import SummaryCube, CUBE_DEPTH_BINS, DIMENSIONS, NO_HOUR
+from pagination import decode_after, make_page
+
+# Region of a place: the text after the first comma, or the whole place
+REGION_SQL = """CASE
+                        WHEN CHARINDEX(',', place) > 0
+                        THEN LTRIM(RTRIM(SUBSTRING(place, CHARINDEX(',', place) + 1, LEN(place))))
+                        ELSE place
+                    END"""
+# Distinct searches whose match count is kept between pages
+MAX_CACHED_TOTALS = 1024
+# Columns fetch_all_columns reads by default, everything a snapshot holds
+SNAPSHOT_COLUMNS = ('id', 'time', 'latitude', 'longitude', 'depth', 'mag', 'place', 'hour_of_day')
 
 class DatabaseManager:
     def __init__(self):
@@ -20,16 +42,54 @@ class DatabaseManager:
             "TrustServerCertificate=no;"
             "Connection Timeout=30;"
         )
+        # Connections are reused across requests instead of reconnecting every call
+        self.pool = ConnectionPool(self._connect)
+        # All ids, cached for random sampling, and match counts of paged
+        # searches; both are cleared whenever the dataset version changes
+        self._ids = None
+        self._totals = {}
+        # Whether the place trigram tables exist, None until checked
+        self._has_place_index = None
         # Initialize timezone finder
         self.tf = TimezoneFinder()
+        self.tz_enricher = TimezoneEnricher(self.tf)
     
+    # SQL dialect hooks; other backends override these
+    def _connect(self):
+        """Open a raw connection for the pool"""
+        return pyodbc.connect(self.connection_string)
+
+    def _limit_clause(self, limit):
+        """Row limit placed after ORDER BY"""
+        return f"OFFSET 0 ROWS FETCH NEXT {int(limit)} ROWS ONLY"
+
+    def _enable_bulk_insert(self, cursor):
+        cursor.fast_executemany = True
+
+    def _begin_transaction(self, cursor):
+        """Open a transaction that DDL statements join too.
+
+        pyodbc connections always run inside one, so there is nothing to do.
+        """
+
+    def _rename_table(self, cursor, old, new):
+        cursor.execute("EXEC sp_rename ?, ?", old, new)
+
+    def _datetime_param(self, value):
+        """Normalize a user supplied date/time to a naive UTC datetime"""
+        return pd.to_datetime(value, utc=True).tz_localize(None).to_pydatetime()
+
     def get_connection(self):
-        """Get database connection"""
+        """Get database connection from the pool; close() returns it"""
         try:
-            return pyodbc.connect(self.connection_string)
+            return self.pool.acquire()
         except Exception as e:
             print(f"Database connection error: {e}")
             return None
+
+    def get_pool_stats(self):
+        """Get connection pool statistics"""
+        return self.pool.get_stats()
     
     def calculate_local_time_fields(self, utc_time, latitude, longitude):
         """Calculate local time, hour_of_day, and day_of_week based on coordinates"""
@@ -71,22 +131,379 @@ class DatabaseManager:
             except:
                 return None, None, None
 
-    def create_table_and_upload_data(self, df):
-        """Create table and upload data in batches with correct local time calculation"""
+    def _to_insert_rows(self, enriched):
+        """Convert an enriched DataFrame into insert tuples of plain Python values"""
+        columns = ['id', 'time', 'latitude', 'longitude', 'depth', 'mag', 'place',
+                   'local_time', 'hour_of_day', 'day_of_week']
+        frame = enriched[columns].astype({
+            'id': str, 'latitude': float, 'longitude': float,
+            'depth': float, 'mag': float, 'place': str
+        }).astype(object)
+        frame = frame.where(frame.notna(), None)
+        return list(frame.itertuples(index=False, name=None))
+
+    def _create_table(self, cursor, table='earthquakes_511610'):
+        """Drop and recreate an earthquakes table, without its secondary indexes"""
+        cursor.execute(f"DROP TABLE IF EXISTS {table}")
+        cursor.execute(f"""
+        CREATE TABLE {table} (
+            id NVARCHAR(50) PRIMARY KEY,
+            time DATETIME2 NOT NULL,
+            latitude FLOAT NOT NULL,
+            longitude FLOAT NOT NULL,
+            depth FLOAT NOT NULL,
+            mag FLOAT NOT NULL,
+            place NVARCHAR(500) NOT NULL,
+            local_time DATETIME2,
+            hour_of_day INT,
+            day_of_week INT
+        )
+        """)
+
+    def _create_indexes(self, cursor):
+        """Secondary indexes of earthquakes_511610, built once its rows are loaded"""
+        create_index_sql = """
+        CREATE INDEX IX_earthquakes_time ON earthquakes_511610(time);
+        CREATE INDEX IX_earthquakes_magnitude ON earthquakes_511610(mag);
+        CREATE INDEX IX_earthquakes_location ON earthquakes_511610(latitude, longitude);
+        CREATE INDEX IX_earthquakes_place ON earthquakes_511610(place);
+        CREATE INDEX IX_earthquakes_local_time ON earthquakes_511610(local_time);
+        CREATE INDEX IX_earthquakes_hour ON earthquakes_511610(hour_of_day);
+        """
+
+        # One statement per execute so every backend accepts it
+        for statement in create_index_sql.split(';'):
+            if statement.strip():
+                cursor.execute(statement)
+
+    def _insert_rows(self, conn, cursor, rows, table='earthquakes_511610', batch_size=200):
+        """Insert prepared tuples in committed batches"""
+        insert_sql = f"""
+        INSERT INTO {table}
+        (id, time, latitude, longitude, depth, mag, place, local_time, hour_of_day, day_of_week)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        """
+        for i in range(0, len(rows), batch_size):
+            cursor.executemany(insert_sql, rows[i:i + batch_size])
+            conn.commit()
+
+    def _rebuild_place_index(self, conn, cursor, batch_size=1000):
+        """Recreate the place trigram side tables from the places currently stored.
+
+        Like the other derived tables it is written in the caller's
+        transaction, which commits it together with the rows it describes.
+
+        earthquake_places numbers the distinct places and
+        earthquake_place_trigrams maps each lowercase trigram to the places
+        containing it, so substring search can seek instead of scanning.
+        """
+        # Searches check again once the caller has committed or rolled back
+        self._has_place_index = None
+        cursor.execute("DROP TABLE IF EXISTS earthquake_place_trigrams")
+        cursor.execute("DROP TABLE IF EXISTS earthquake_places")
+        cursor.execute("""
+            CREATE TABLE earthquake_places (
+                place_id INT PRIMARY KEY,
+                place NVARCHAR(500) NOT NULL
+            )
+        """)
+        cursor.execute("""
+            CREATE TABLE earthquake_place_trigrams (
+                trigram NVARCHAR(3) NOT NULL,
+                place_id INT NOT NULL,
+                PRIMARY KEY (trigram, place_id)
+            )
+        """)
+        cursor.execute("SELECT DISTINCT place FROM earthquakes_511610")
+        places = [row[0] for row in cursor.fetchall()]
+
+        trigram_count = self._insert_places(cursor, list(enumerate(places)), batch_size)
+        print(f"Indexed {len(places)} places with {trigram_count} trigrams")
+
+    def _insert_places(self, cursor, place_rows, batch_size=1000):
+        """Add (place_id, place) rows and their trigrams; returns the trigram count"""
+        trigram_rows = [(gram, place_id) for place_id, place in place_rows for gram in trigrams(place)]
+        for sql, rows in (("INSERT INTO earthquake_places (place_id, place) VALUES (?, ?)", place_rows),
+                          ("INSERT INTO earthquake_place_trigrams (trigram, place_id) VALUES (?, ?)", trigram_rows)):
+            for i in range(0, len(rows), batch_size):
+                cursor.executemany(sql, rows[i:i + batch_size])
+        return len(trigram_rows)
+
+    def _replaced_places(self, cursor, staging):
+        """Places the merge of staging may take away from stored events. Must run before the merge."""
+        cursor.execute(f"""
+            SELECT DISTINCT e.place FROM earthquakes_511610 e
+            JOIN {staging} s ON s.id = e.id
+            WHERE e.place <> s.place
+        """)
+        return [row[0] for row in cursor.fetchall()]
+
+    def _update_place_index(self, cursor, staging, replaced_places, batch_size=1000):
+        """Bring the place trigram tables up to date after merging staging.
+
+        Staged places not indexed yet get the next free ids, and places from
+        replaced_places that no event uses any more are dropped, so only the
+        places the upload touched are looked at.
+        """
+        unused = []
+        # Stay well below the driver's limit on parameters per statement
+        for i in range(0, len(replaced_places), 500):
+            batch = replaced_places[i:i + 500]
+            marks = ", ".join("?" * len(batch))
+            cursor.execute(f"SELECT DISTINCT place FROM earthquakes_511610 WHERE place IN ({marks})", *batch)
+            still_used = {row[0] for row in cursor.fetchall()}
+            unused.extend(place for place in batch if place not in still_used)
+        for i in range(0, len(unused), 500):
+            batch = unused[i:i + 500]
+            marks = ", ".join("?" * len(batch))
+            cursor.execute(f"""
+                DELETE FROM earthquake_place_trigrams
+                WHERE place_id IN (SELECT place_id FROM earthquake_places WHERE place IN ({marks}))
+            """, *batch)
+            cursor.execute(f"DELETE FROM earthquake_places WHERE place IN ({marks})", *batch)
+
+        cursor.execute(f"""
+            SELECT DISTINCT s.place FROM {staging} s
+            WHERE NOT EXISTS (SELECT 1 FROM earthquake_places p WHERE p.place = s.place)
+        """)
+        added = [row[0] for row in cursor.fetchall()]
+        cursor.execute("SELECT MAX(place_id) FROM earthquake_places")
+        last_id = cursor.fetchone()[0]
+        first_id = 0 if last_id is None else last_id + 1
+        trigram_count = self._insert_places(cursor, list(enumerate(added, start=first_id)), batch_size)
+        print(f"Indexed {len(added)} new places with {trigram_count} trigrams, dropped {len(unused)} unused")
+
+    def _cube_cells_sql(self, source):
+        """SELECT of the summary cube cell each row of source falls in, and its parameters"""
+        depth_bin_sql, params = bucket_case_sql('depth', CUBE_DEPTH_BINS)
+        return f"""
+                SELECT COALESCE(hour_of_day, {NO_HOUR}) AS hour_of_day,
+                       CAST(FLOOR(mag) AS INT) AS mag_bin,
+                       {depth_bin_sql} AS depth_bin,
+                       {REGION_SQL} AS region
+                FROM {source}""", params
+
+    def _create_cube_table(self, cursor, table):
+        cursor.execute(f"DROP TABLE IF EXISTS {table}")
+        cursor.execute(f"""
+            CREATE TABLE {table} (
+                hour_of_day INT NOT NULL,
+                mag_bin INT NOT NULL,
+                depth_bin INT NOT NULL,
+                region NVARCHAR(500) NOT NULL,
+                event_count INT NOT NULL
+            )
+        """)
+
+    def _rebuild_summary_cube(self, conn, cursor):
+        """Recreate earthquake_summary_cube, the pre-aggregated dashboard counts"""
+        cells_sql, params = self._cube_cells_sql('earthquakes_511610')
+        self._create_cube_table(cursor, 'earthquake_summary_cube')
+        cursor.execute(f"""
+            INSERT INTO earthquake_summary_cube (hour_of_day, mag_bin, depth_bin, region, event_count)
+            SELECT hour_of_day, mag_bin, depth_bin, region, COUNT(*)
+            FROM ({cells_sql}
+            ) cells
+            GROUP BY hour_of_day, mag_bin, depth_bin, region
+        """, *params)
+        cursor.execute("SELECT COUNT(*) FROM earthquake_summary_cube")
+        print(f"Built summary cube with {cursor.fetchone()[0]} cells")
+
+    def _stage_cube_delta(self, cursor, staging, delta):
+        """Fill delta with the cube cell changes merging staging will cause.
+
+        Every stored row the merge may replace counts -1 in its cell and every
+        staged row +1. Unchanged rows cancel out, so only cells whose count
+        really moves are kept. Must run before the merge.
+        """
+        old_sql, old_params = self._cube_cells_sql(
+            f"(SELECT * FROM earthquakes_511610 WHERE id IN (SELECT id FROM {staging})) replaced")
+        new_sql, new_params = self._cube_cells_sql(staging)
+        self._create_cube_table(cursor, delta)
+        cursor.execute(f"""
+            INSERT INTO {delta} (hour_of_day, mag_bin, depth_bin, region, event_count)
+            SELECT hour_of_day, mag_bin, depth_bin, region, SUM(change_count)
+            FROM (
+                SELECT old_cells.*, -1 AS change_count FROM ({old_sql}
+                ) old_cells
+                UNION ALL
+                SELECT new_cells.*, 1 AS change_count FROM ({new_sql}
+                ) new_cells
+            ) changes
+            GROUP BY hour_of_day, mag_bin, depth_bin, region
+            HAVING SUM(change_count) <> 0
+        """, *old_params, *new_params)
+
+    def _apply_cube_delta(self, cursor, delta):
+        """Add the counts staged by _stage_cube_delta to earthquake_summary_cube"""
+        cube = 'earthquake_summary_cube'
+        same_cell = " AND ".join(f"d.{column} = {cube}.{column}"
+                                 for column in ('hour_of_day', 'mag_bin', 'depth_bin', 'region'))
+        cursor.execute(f"""
+            UPDATE {cube}
+            SET event_count = event_count + (SELECT d.event_count FROM {delta} d WHERE {same_cell})
+            WHERE EXISTS (SELECT 1 FROM {delta} d WHERE {same_cell})
+        """)
+        cursor.execute(f"""
+            INSERT INTO {cube} (hour_of_day, mag_bin, depth_bin, region, event_count)
+            SELECT d.hour_of_day, d.mag_bin, d.depth_bin, d.region, d.event_count
+            FROM {delta} d
+            WHERE NOT EXISTS (SELECT 1 FROM {cube} WHERE {same_cell})
+        """)
+        cursor.execute(f"DELETE FROM {cube} WHERE event_count <= 0")
+        cursor.execute(f"SELECT COUNT(*) FROM {delta}")
+        print(f"Updated {cursor.fetchone()[0]} summary cube cells")
+        cursor.execute(f"DROP TABLE {delta}")
+
+    def _bump_dataset_version(self, conn, cursor):
+        """Advance the dataset version in dataset_meta after the data changed"""
+        if not self._table_exists(cursor, 'dataset_meta'):
+            cursor.execute("""
+                CREATE TABLE dataset_meta (
+                    name NVARCHAR(50) PRIMARY KEY,
+                    value BIGINT NOT NULL
+                )
+            """)
+            cursor.execute("INSERT INTO dataset_meta (name, value) VALUES ('version', 0)")
+        cursor.execute("UPDATE dataset_meta SET value = value + 1 WHERE name = 'version'")
+        cursor.execute("SELECT value FROM dataset_meta WHERE name = 'version'")
+        version = cursor.fetchone()[0]
+        print(f"Dataset version is now {version}")
+        return version
+
+    def get_dataset_version(self):
+        """Version of the stored data, bumped by every upload; 0 before the first, None on error"""
+        conn = self.get_connection()
+        if not conn:
+            return None
+
+        try:
+            cursor = conn.cursor()
+            version = 0
+            if self._table_exists(cursor, 'dataset_meta'):
+                cursor.execute("SELECT value FROM dataset_meta WHERE name = 'version'")
+                row = cursor.fetchone()
+                version = int(row[0]) if row else 0
+            cursor.close()
+            conn.close()
+            return version
+
+        except Exception as e:
+            if conn:
+                conn.close()
+            print(f"Error reading dataset version: {e}")
+            return None
+
+    def get_summary_cube(self, dimensions=DIMENSIONS):
+        """Load the summary cube rolled up to dimensions, None if it hasn't been built"""
+        conn = self.get_connection()
+        if not conn:
+            return None
+
+        try:
+            cursor = conn.cursor()
+            if not self._table_exists(cursor, 'earthquake_summary_cube'):
+                conn.close()
+                return None
+            columns = ', '.join(dimensions)
+            cursor.execute(f"""
+                SELECT {columns}, SUM(event_count)
+                FROM earthquake_summary_cube
+                GROUP BY {columns}
+            """)
+            rows = cursor.fetchall()
+            cursor.close()
+            conn.close()
+            return SummaryCube.from_rows(rows, dimensions)
+
+        except Exception as e:
+            if conn:
+                conn.close()
+            print(f"Error loading summary cube: {e}")
+            return None
+
+    def create_table_and_upload_data(self, data):
+        """Create table and upload data with correct local time calculation.
+
+        data is either a DataFrame or an iterable of DataFrame chunks; chunks are
+        enriched and inserted one at a time so memory stays bounded by the chunk size.
+
+        Rows are loaded into a separate table first. Only once every chunk has
+        been read does one transaction swap it in for the live table and
+        rebuild the place index, summary cube and dataset version, so a bad or
+        interrupted upload leaves the current data and everything derived
+        from it as they were.
+        """
+        chunks = [data] if isinstance(data, pd.DataFrame) else data
+        load_table = 'earthquakes_511610_load'
+
         conn = self.get_connection()
         if not conn:
             return False, "Database connection failed"
-        
+
         try:
             cursor = conn.cursor()
-            
-            # Drop table if exists
-            cursor.execute("IF OBJECT_ID('earthquakes_511610', 'U') IS NOT NULL DROP TABLE earthquakes_511610")
-            
-            # Create table with indexes
-            create_table_sql = """
-            CREATE TABLE earthquakes_511610 (
-                id NVARCHAR(50) PRIMARY KEY,
+            self._create_table(cursor, load_table)
+            conn.commit()
+
+            self._enable_bulk_insert(cursor)
+            total_rows = 0
+
+            # One timezone worker pool for all chunks of the upload
+            with self.tz_enricher.worker_pool():
+                for chunk in chunks:
+                    if len(chunk) == 0:
+                        continue
+                    print(f"Processing {len(chunk)} earthquake records with timezone calculations...")
+
+                    # Enrich the whole chunk at once instead of row by row
+                    enriched = self.tz_enricher.enrich(chunk)
+                    rows = self._to_insert_rows(enriched)
+                    del enriched
+
+                    self._insert_rows(conn, cursor, rows, table=load_table)
+                    total_rows += len(rows)
+                    print(f"Inserted {total_rows} records...")
+
+            if total_rows == 0:
+                raise ValueError("The upload contained no valid earthquake records")
+
+            self._begin_transaction(cursor)
+            cursor.execute("DROP TABLE IF EXISTS earthquakes_511610")
+            self._rename_table(cursor, load_table, 'earthquakes_511610')
+            self._create_indexes(cursor)
+            self._rebuild_place_index(conn, cursor)
+            self._rebuild_summary_cube(conn, cursor)
+            self._bump_dataset_version(conn, cursor)
+            conn.commit()
+            self.clear_dataset_caches()
+            cursor.close()
+            conn.close()
+            print(f"✅ Successfully uploaded {total_rows} records with timezone-aware local times")
+            return True, f"Successfully uploaded {total_rows} records with timezone-aware local times"
+
+        except Exception as e:
+            if conn:
+                self._discard_table(conn, load_table)
+                conn.close()
+            print(f"❌ Error uploading data: {e}")
+            return False, str(e)
+
+    def _discard_table(self, conn, table):
+        """Roll back and drop a half-filled work table after a failed upload"""
+        try:
+            conn.rollback()
+            cursor = conn.cursor()
+            cursor.execute(f"DROP TABLE IF EXISTS {table}")
+            conn.commit()
+        except Exception as e:
+            print(f"Error dropping {table}: {e}")
+    
+    def _staging_table_sql(self, staging):
+        # Staging keeps the first occurrence of duplicate ids in the upload
+        return f"""
+            CREATE TABLE {staging} (
+                id NVARCHAR(50) PRIMARY KEY WITH (IGNORE_DUP_KEY = ON),
                 time DATETIME2 NOT NULL,
                 latitude FLOAT NOT NULL,
                 longitude FLOAT NOT NULL,
@@ -96,110 +513,237 @@ class DatabaseManager:
                 local_time DATETIME2,
                 hour_of_day INT,
                 day_of_week INT
-            );
-            
-            CREATE INDEX IX_earthquakes_time ON earthquakes_511610(time);
-            CREATE INDEX IX_earthquakes_magnitude ON earthquakes_511610(mag);
-            CREATE INDEX IX_earthquakes_location ON earthquakes_511610(latitude, longitude);
-            CREATE INDEX IX_earthquakes_place ON earthquakes_511610(place);
-            CREATE INDEX IX_earthquakes_local_time ON earthquakes_511610(local_time);
-            CREATE INDEX IX_earthquakes_hour ON earthquakes_511610(hour_of_day);
-            """
-            
-            cursor.execute(create_table_sql)
+            )
+        """
+
+    def _changed_predicate(self, existing, new):
+        """SQL condition that is true when a staged event differs from the stored one"""
+        return " OR ".join(
+            f"{existing}.{column} <> {new}.{column}"
+            for column in ('time', 'latitude', 'longitude', 'depth', 'mag', 'place')
+        ).join('()')
+
+    def _merge_staging(self, cursor, staging):
+        """Insert new rows and update changed rows from the staging table"""
+        changed_predicate = self._changed_predicate('e', 's')
+        cursor.execute(f"""
+            MERGE earthquakes_511610 AS e
+            USING {staging} AS s
+            ON e.id = s.id
+            WHEN MATCHED AND {changed_predicate} THEN
+                UPDATE SET time = s.time, latitude = s.latitude, longitude = s.longitude,
+                           depth = s.depth, mag = s.mag, place = s.place,
+                           local_time = s.local_time, hour_of_day = s.hour_of_day,
+                           day_of_week = s.day_of_week
+            WHEN NOT MATCHED BY TARGET THEN
+                INSERT (id, time, latitude, longitude, depth, mag, place, local_time, hour_of_day, day_of_week)
+                VALUES (s.id, s.time, s.latitude, s.longitude, s.depth, s.mag, s.place,
+                        s.local_time, s.hour_of_day, s.day_of_week);
+        """)
+
+    def _table_exists(self, cursor, table):
+        cursor.execute("SELECT OBJECT_ID(?, 'U')", table)
+        return cursor.fetchone()[0] is not None
+
+    def upsert_data(self, data, batch_size=200, enrich_chunk_size=50000):
+        """Merge new and updated events into the table, keyed on id.
+
+        Rows are bulk loaded into a staging table, local time fields are copied
+        over for events whose time and coordinates are unchanged, and timezone
+        enrichment only runs for new or moved events before the MERGE. The
+        summary cube and the place index are adjusted by the staged rows alone,
+        and the merge, those adjustments and the version bump commit together.
+        """
+        chunks = [data] if isinstance(data, pd.DataFrame) else data
+        staging = 'earthquakes_511610_staging'
+        cube_delta = 'earthquake_summary_cube_delta'
+
+        conn = self.get_connection()
+        if not conn:
+            return False, "Database connection failed"
+
+        try:
+            cursor = conn.cursor()
+            if not self._table_exists(cursor, 'earthquakes_511610'):
+                print("Main table missing, creating it before merge...")
+                self._create_table(cursor)
+                self._create_indexes(cursor)
+
+            cursor.execute(f"DROP TABLE IF EXISTS {staging}")
+            cursor.execute(self._staging_table_sql(staging))
             conn.commit()
-            
-            # Prepare data for insertion
-            batch_size = 100
-            total_rows = len(df)
-            processed_count = 0
-            
-            print(f"Processing {total_rows} earthquake records with timezone calculations...")
-
-            # Preprocess all local time data to avoid single calculation in loop
-            local_times = []
-            for _, row in df.iterrows():
-                time_obj = pd.to_datetime(row['time'])
-                local_time, hour_of_day, day_of_week = self.calculate_local_time_fields(
-                    row['time'], row['latitude'], row['longitude']
-                )
-                local_times.append((
-                    str(row['id']),
-                    time_obj,
-                    float(row['latitude']),
-                    float(row['longitude']),
-                    float(row['depth']),
-                    float(row['mag']),
-                    str(row['place']),
-                    local_time,
-                    hour_of_day,
-                    day_of_week
-                ))
-
-            print("✅ Finished timezone calculations, start batch inserting...")
-
-            # Batch Insert
-            conn = self.get_connection()
-            if not conn:
-                print("Database connection failed.")
-                return False, "Database connection failed"
+            self._enable_bulk_insert(cursor)
 
-            try:
-                cursor = conn.cursor()
-                cursor.fast_executemany = True
+            # 1. Bulk load raw rows, without enrichment
+            for chunk in chunks:
+                if len(chunk) == 0:
+                    continue
+                raw = chunk.copy()
+                raw['time'] = pd.to_datetime(raw['time'], utc=True, errors='coerce').dt.tz_localize(None)
+                raw['local_time'] = pd.NaT
+                raw['hour_of_day'] = pd.NA
+                raw['day_of_week'] = pd.NA
+                rows = self._to_insert_rows(raw)
+                self._insert_rows(conn, cursor, rows, table=staging, batch_size=batch_size)
+            # Duplicate ids in the upload were dropped by the staging key
+            cursor.execute(f"SELECT COUNT(*) FROM {staging}")
+            staged = cursor.fetchone()[0]
+            print(f"Staged {staged} records")
+
+            # 2. Reuse local time fields of events whose time and position didn't change
+            cursor.execute(f"""
+                UPDATE {staging} SET local_time = e.local_time,
+                                     hour_of_day = e.hour_of_day,
+                                     day_of_week = e.day_of_week
+                FROM earthquakes_511610 e
+                WHERE e.id = {staging}.id AND e.time = {staging}.time
+                  AND e.latitude = {staging}.latitude AND e.longitude = {staging}.longitude
+            """)
+            conn.commit()
 
-                insert_sql = """
-                INSERT INTO earthquakes_511610 
-                (id, time, latitude, longitude, depth, mag, place, local_time, hour_of_day, day_of_week)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-                """
+            # 3. Enrich only the new or moved events, a chunk at a time
+            update_sql = f"""
+                UPDATE {staging} SET local_time = ?, hour_of_day = ?, day_of_week = ?
+                WHERE id = ?
+            """
+            enriched_count = 0
+            last_id = ''
+            with self.tz_enricher.worker_pool():
+                while True:
+                    cursor.execute(f"""
+                        SELECT id, time, latitude, longitude FROM {staging}
+                        WHERE hour_of_day IS NULL AND id > ?
+                        ORDER BY id {self._limit_clause(enrich_chunk_size)}
+                    """, last_id)
+                    pending = cursor.fetchall()
+                    if not pending:
+                        break
+                    last_id = pending[-1][0]
 
-                batch_size = 200
-                total_rows = len(local_times)
+                    frame = pd.DataFrame.from_records(
+                        [tuple(row) for row in pending], columns=['id', 'time', 'latitude', 'longitude'])
+                    enriched = self.tz_enricher.enrich(frame)
+                    updates = [
+                        (row.local_time.to_pydatetime() if pd.notna(row.local_time) else None,
+                         int(row.hour_of_day) if pd.notna(row.hour_of_day) else None,
+                         int(row.day_of_week) if pd.notna(row.day_of_week) else None,
+                         row.id)
+                        for row in enriched.itertuples(index=False)
+                    ]
+                    for i in range(0, len(updates), batch_size):
+                        cursor.executemany(update_sql, updates[i:i + batch_size])
+                        conn.commit()
+                    enriched_count += len(updates)
+            print(f"Calculated timezones for {enriched_count} new or changed records")
 
-                for i in range(0, total_rows, batch_size):
-                    batch = local_times[i:i + batch_size]
-                    cursor.executemany(insert_sql, batch)
-                    conn.commit()
-                    print(f"Inserted {min(i + batch_size, total_rows)} / {total_rows} records...")
+            # 4. Merge the delta into the main table
+            changed_predicate = self._changed_predicate('e', 's')
+            cursor.execute(f"""
+                SELECT
+                    SUM(CASE WHEN e.id IS NULL THEN 1 ELSE 0 END),
+                    SUM(CASE WHEN e.id IS NOT NULL AND {changed_predicate} THEN 1 ELSE 0 END)
+                FROM {staging} s
+                LEFT JOIN earthquakes_511610 e ON e.id = s.id
+            """)
+            inserted, updated = [count or 0 for count in cursor.fetchone()]
 
-                cursor.close()
-                conn.close()
-                print(f"✅ Successfully uploaded {total_rows} records with timezone-aware local times")
-                return True, f"Successfully uploaded {total_rows} records with timezone-aware local times"
+            self._begin_transaction(cursor)
+            cube_exists = self._table_exists(cursor, 'earthquake_summary_cube')
+            places_exist = (self._table_exists(cursor, 'earthquake_places')
+                            and self._table_exists(cursor, 'earthquake_place_trigrams'))
+            if cube_exists:
+                self._stage_cube_delta(cursor, staging, cube_delta)
+            if places_exist:
+                replaced_places = self._replaced_places(cursor, staging)
+            self._merge_staging(cursor, staging)
+            if cube_exists:
+                self._apply_cube_delta(cursor, cube_delta)
+            else:
+                self._rebuild_summary_cube(conn, cursor)
+            if places_exist:
+                self._update_place_index(cursor, staging, replaced_places)
+            else:
+                self._rebuild_place_index(conn, cursor)
+            cursor.execute(f"DROP TABLE {staging}")
+            self._bump_dataset_version(conn, cursor)
+            conn.commit()
+            self.clear_dataset_caches()
 
-            except Exception as e:
-                if conn:
-                    conn.close()
-                print(f"❌ Error uploading data: {e}")
-                return False, str(e)
+            cursor.close()
+            conn.close()
+            message = (f"Merged {staged} records: {inserted} new, {updated} updated, "
+                       f"{staged - inserted - updated} unchanged")
+            print(f"✅ {message}")
+            return True, message
 
         except Exception as e:
             if conn:
+                self._discard_table(conn, cube_delta)
                 conn.close()
-            print(f"❌ Error uploading data: {e}")
+            print(f"❌ Error merging data: {e}")
             return False, str(e)
-    
-    def get_random_earthquake(self):
-        """Get a random earthquake record"""
+
+    def clear_dataset_caches(self):
+        """Drop the cached ids, counts and place index flag, e.g. after another worker changed the dataset"""
+        self._ids = None
+        self._totals = {}
+        self._has_place_index = None
+
+    def _sample_ids(self, cursor):
+        """Every id in the table, loaded once and cached"""
+        ids = self._ids
+        if ids is None:
+            cursor.execute("SELECT id FROM earthquakes_511610")
+            ids = np.array([row[0] for row in cursor.fetchall()], dtype=object)
+            self._ids = ids
+        return ids
+
+    def _rows_by_id(self, cursor, ids, batch_size):
+        """Fetch rows for ids with WHERE id IN, keyed by id"""
+        unique_ids = list(dict.fromkeys(ids))
+        rows_by_id = {}
+        for i in range(0, len(unique_ids), batch_size):
+            batch = unique_ids[i:i + batch_size]
+            cursor.execute(f"""
+                SELECT id, time, latitude, longitude, depth, mag, place 
+                FROM earthquakes_511610 
+                WHERE id IN ({', '.join('?' * len(batch))})
+            """, *batch)
+            rows_by_id.update((row[0], row) for row in cursor.fetchall())
+        return rows_by_id
+
+    def get_random_earthquakes(self, n, seed=None, batch_size=1000):
+        """Get n uniformly random earthquake records, drawn with replacement.
+
+        Ids are sampled from a cached id array and the rows fetched with
+        WHERE id IN, instead of sorting the whole table by a random key for
+        every row. The same seed gives the same sample for the same data.
+        """
         conn = self.get_connection()
         if not conn:
-            return None
+            return []
         
         try:
             cursor = conn.cursor()
-            cursor.execute("""
-                SELECT TOP 1 id, time, latitude, longitude, depth, mag, place 
-                FROM earthquakes_511610 
-                ORDER BY NEWID()
-            """)
-            
-            row = cursor.fetchone()
+            rng = np.random.default_rng(seed)
+            ids = self._sample_ids(cursor)
+            picked = ids[rng.integers(0, len(ids), n)] if len(ids) else []
+            rows_by_id = self._rows_by_id(cursor, picked, batch_size)
+            if len(rows_by_id) < len(set(picked)):
+                # Rows were replaced since the ids were cached, e.g. by another worker
+                self._ids = None
+                ids = self._sample_ids(cursor)
+                picked = ids[rng.integers(0, len(ids), n)] if len(ids) else []
+                rows_by_id = self._rows_by_id(cursor, picked, batch_size)
             cursor.close()
             conn.close()
             
-            if row:
-                return {
+            results = []
+            for id_ in picked:
+                row = rows_by_id.get(id_)
+                if row is None:
+                    continue
+                results.append({
                     'id': row[0],
                     'time': row[1].isoformat() if row[1] else None,
                     'latitude': row[2],
@@ -207,213 +751,341 @@ class DatabaseManager:
                     'depth': row[4],
                     'magnitude': row[5],
                     'place': row[6]
-                }
-            return None
+                })
+            return results
             
         except Exception as e:
             if conn:
                 conn.close()
-            print(f"Error getting random earthquake: {e}")
-            return None
-    
-    def search_by_place(self, place_substring):
-        """Search earthquakes by place substring"""
+            print(f"Error getting random earthquakes: {e}")
+            return []
+
+    def get_earthquakes_by_id(self, ids, batch_size=1000):
+        """Events with the given ids, in that order; ids not found are skipped"""
         conn = self.get_connection()
         if not conn:
             return []
-        
+
         try:
             cursor = conn.cursor()
-            cursor.execute("""
-                SELECT id, time, latitude, longitude, depth, mag, place 
-                FROM earthquakes_511610 
-                WHERE place LIKE ?
-                ORDER BY time DESC
-            """, f'%{place_substring}%')
-            
-            rows = cursor.fetchall()
+            rows_by_id = self._rows_by_id(cursor, ids, batch_size)
             cursor.close()
             conn.close()
-            
-            results = []
-            for row in rows:
-                results.append({
-                    'id': row[0],
-                    'time': row[1].isoformat() if row[1] else None,
-                    'latitude': row[2],
-                    'longitude': row[3],
-                    'depth': row[4],
-                    'magnitude': row[5],
-                    'place': row[6]
-                })
-            
-            return results
-            
+            return [self._event_row(rows_by_id[id_]) for id_ in ids if id_ in rows_by_id]
+
         except Exception as e:
             if conn:
                 conn.close()
-            print(f"Error searching by place: {e}")
+            print(f"Error getting earthquakes by id: {e}")
             return []
+
+    def get_random_earthquake(self):
+        """Get a random earthquake record"""
+        results = self.get_random_earthquakes(1)
+        return results[0] if results else None
     
-    def search_by_location(self, lat, lon, radius_km):
-        """Search earthquakes within radius of location"""
+    def _keyset_predicate(self, order, after):
+        """Condition continuing an (order DESC, id DESC) scan after a token"""
+        if after is None:
+            return None, []
+        key, last_id = decode_after(after)
+        if order == 'time':
+            key = self._datetime_param(key)
+        return f"({order} < ? OR ({order} = ? AND id < ?))", [key, key, last_id]
+
+    def _events_query(self, where, params, order, limit=None, after=None):
+        """SELECT for events matching where, sorted by order ('time' or 'mag') descending.
+
+        Ties break on id, so the order is total and `after` can resume a scan
+        with a keyset predicate rather than an OFFSET. Returns (sql, params).
+        """
+        keyset, keyset_params = self._keyset_predicate(order, after)
+        conditions = [condition for condition in (where, keyset) if condition]
+        where_sql = f"WHERE {' AND '.join(conditions)}" if conditions else ''
+        return f"""
+            SELECT id, time, latitude, longitude, depth, mag, place 
+            FROM earthquakes_511610 
+            {where_sql}
+            ORDER BY {order} DESC, id DESC {self._limit_clause(limit) if limit else ''}
+        """, [*params, *keyset_params]
+
+    def _event_row(self, row):
+        return {
+            'id': row[0],
+            'time': row[1].isoformat() if row[1] else None,
+            'latitude': row[2],
+            'longitude': row[3],
+            'depth': row[4],
+            'magnitude': row[5],
+            'place': row[6]
+        }
+
+    def _search_events(self, action, where, params, order, limit=None, after=None, include_total=False):
+        """Events matching where as a Page; the include_total count ignores `after`"""
         conn = self.get_connection()
         if not conn:
             return []
         
         try:
             cursor = conn.cursor()
-            # Using Haversine formula approximation
-            cursor.execute("""
-                SELECT id, time, latitude, longitude, depth, mag, place,
-                       (6371 * ACOS(COS(RADIANS(?)) * COS(RADIANS(latitude)) * 
-                        COS(RADIANS(longitude) - RADIANS(?)) + 
-                        SIN(RADIANS(?)) * SIN(RADIANS(latitude)))) AS distance
-                FROM earthquakes_511610
-                WHERE (6371 * ACOS(COS(RADIANS(?)) * COS(RADIANS(latitude)) * 
-                       COS(RADIANS(longitude) - RADIANS(?)) + 
-                       SIN(RADIANS(?)) * SIN(RADIANS(latitude)))) <= ?
-                ORDER BY distance
-            """, lat, lon, lat, lat, lon, lat, radius_km)
-            
+            # One extra row tells whether another page follows
+            sql, query_params = self._events_query(where, params, order, limit + 1 if limit else None, after)
+            cursor.execute(sql, *query_params)
             rows = cursor.fetchall()
+
+            total = self._count_events(cursor, where, params) if include_total else None
             cursor.close()
             conn.close()
             
-            results = []
-            for row in rows:
-                results.append({
-                    'id': row[0],
-                    'time': row[1].isoformat() if row[1] else None,
-                    'latitude': row[2],
-                    'longitude': row[3],
-                    'depth': row[4],
-                    'magnitude': row[5],
-                    'place': row[6],
-                    'distance_km': round(row[7], 2)
-                })
-            
-            return results
+            return make_page([self._event_row(row) for row in rows], limit, order, total)
             
         except Exception as e:
             if conn:
                 conn.close()
-            print(f"Error searching by location: {e}")
+            print(f"Error {action}: {e}")
             return []
+
+    def _count_events(self, cursor, where, params):
+        """Number of events matching where, counted once per dataset version"""
+        key = (where, tuple(params))
+        totals = self._totals
+        total = totals.get(key)
+        if total is None:
+            cursor.execute(f"SELECT COUNT(*) FROM earthquakes_511610 {f'WHERE {where}' if where else ''}",
+                           *params)
+            total = cursor.fetchone()[0]
+            if len(totals) >= MAX_CACHED_TOTALS:
+                totals.clear()
+            totals[key] = total
+        return total
+
+    def _iter_events(self, action, where, params, order, limit=None, after=None, batch_size=1000):
+        """Generator over the same rows, read from the cursor with fetchmany.
+
+        The connection stays checked out until the generator is exhausted or
+        closed, so memory doesn't grow with the number of matching rows.
+        Errors propagate, so a reader can tell a failed scan from a short one.
+        """
+        conn = self.get_connection()
+        if not conn:
+            raise ConnectionError("Database connection failed")
+        
+        try:
+            cursor = conn.cursor()
+            sql, query_params = self._events_query(where, params, order, limit, after)
+            cursor.execute(sql, *query_params)
+            while True:
+                rows = cursor.fetchmany(batch_size)
+                if not rows:
+                    break
+                for row in rows:
+                    yield self._event_row(row)
+            cursor.close()
+        except Exception as e:
+            print(f"Error {action}: {e}")
+            raise
+        finally:
+            conn.close()
+
+    def _events(self, action, where, params, order, limit=None, after=None, include_total=False,
+                stream=False):
+        if stream:
+            return self._iter_events(action, where, params, order, limit, after)
+        return self._search_events(action, where, params, order, limit, after, include_total)
+
+    def search_by_place(self, place_substring, limit=None, after=None, include_total=False, stream=False):
+        """Search earthquakes by place substring, newest first.
+
+        A leading wildcard LIKE can't use IX_earthquakes_place, so the place
+        trigram tables narrow the search to places containing every trigram of
+        the substring first. LIKE then confirms the match, and the matching
+        places seek on the place index.
+        """
+        pattern = f'%{place_substring}%'
+        where = "place LIKE ?"
+        params = [pattern]
+        if len(place_substring) >= MIN_INDEXED_LENGTH and self._place_index_exists():
+            grams = sorted(trigrams(place_substring))
+            where = f"""place IN (
+                    SELECT p.place FROM earthquake_places p
+                    JOIN (
+                        SELECT place_id FROM earthquake_place_trigrams
+                        WHERE trigram IN ({', '.join('?' * len(grams))})
+                        GROUP BY place_id
+                        HAVING COUNT(*) = ?
+                    ) t ON t.place_id = p.place_id
+                ) AND place LIKE ?"""
+            params = [*grams, len(grams), pattern]
+        return self._events("searching by place", where, params, 'time',
+                            limit, after, include_total, stream)
+
+    def _place_index_exists(self):
+        """Whether the trigram tables exist, checked once per dataset version"""
+        if self._has_place_index is not None:
+            return self._has_place_index
+        conn = self.get_connection()
+        if not conn:
+            return False
+        try:
+            self._has_place_index = self._table_exists(conn.cursor(), 'earthquake_place_trigrams')
+            return self._has_place_index
+        except Exception:
+            return False
+        finally:
+            conn.close()
     
-    def search_by_time_range(self, start_date, end_date):
-        """Search earthquakes within time range"""
+    def _query_radius(self, cursor, lat, lon, radius_km, limit=None):
+        """Rows within radius_km, nearest first.
+
+        The bounding box predicates let the database seek on
+        IX_earthquakes_location; the haversine term is computed once, in the
+        derived table, and only for rows inside the box.
+        """
+        min_lat, max_lat, lon_ranges = bounding_box(lat, lon, radius_km)
+        where = "latitude BETWEEN ? AND ?"
+        params = [min_lat, max_lat]
+        if lon_ranges is not None:
+            where += " AND (" + " OR ".join("longitude BETWEEN ? AND ?" for _ in lon_ranges) + ")"
+            for low, high in lon_ranges:
+                params.extend([low, high])
+
+        # Compare the haversine term itself: distance <= r  <=>  hav <= sin^2(r / 2R)
+        if radius_km >= MAX_DISTANCE_KM:
+            max_hav = 2.0
+        else:
+            max_hav = math.sin(radius_km / (2 * EARTH_RADIUS_KM)) ** 2
+
+        cursor.execute(f"""
+            SELECT id, time, latitude, longitude, depth, mag, place,
+                   2 * 6371 * ASIN(SQRT(CASE WHEN hav > 1 THEN 1.0 ELSE hav END)) AS distance
+            FROM (
+                SELECT id, time, latitude, longitude, depth, mag, place,
+                       POWER(SIN((RADIANS(latitude) - RADIANS(?)) / 2), 2) +
+                       COS(RADIANS(?)) * COS(RADIANS(latitude)) *
+                       POWER(SIN((RADIANS(longitude) - RADIANS(?)) / 2), 2) AS hav
+                FROM earthquakes_511610
+                WHERE {where}
+            ) candidates
+            WHERE hav <= ?
+            ORDER BY hav {self._limit_clause(limit) if limit else ''}
+        """, lat, lat, lon, *params, max_hav)
+
+        return [
+            {
+                'id': row[0],
+                'time': row[1].isoformat() if row[1] else None,
+                'latitude': row[2],
+                'longitude': row[3],
+                'depth': row[4],
+                'magnitude': row[5],
+                'place': row[6],
+                'distance_km': round(row[7], 2)
+            }
+            for row in cursor.fetchall()
+        ]
+
+    def search_by_location(self, lat, lon, radius_km):
+        """Search earthquakes within radius of location"""
         conn = self.get_connection()
         if not conn:
             return []
         
         try:
             cursor = conn.cursor()
-            cursor.execute("""
-                SELECT id, time, latitude, longitude, depth, mag, place 
-                FROM earthquakes_511610 
-                WHERE time BETWEEN ? AND ?
-                ORDER BY time DESC
-            """, start_date, end_date)
-            
-            rows = cursor.fetchall()
+            results = self._query_radius(cursor, lat, lon, radius_km)
             cursor.close()
             conn.close()
-            
-            results = []
-            for row in rows:
-                results.append({
-                    'id': row[0],
-                    'time': row[1].isoformat() if row[1] else None,
-                    'latitude': row[2],
-                    'longitude': row[3],
-                    'depth': row[4],
-                    'magnitude': row[5],
-                    'place': row[6]
-                })
-            
             return results
             
         except Exception as e:
             if conn:
                 conn.close()
-            print(f"Error searching by time range: {e}")
+            print(f"Error searching by location: {e}")
             return []
-    
-    def search_by_magnitude(self, min_mag, max_mag):
-        """Search earthquakes within magnitude range"""
+
+    def search_nearest(self, lat, lon, k=10):
+        """Find the k earthquakes nearest to a location"""
         conn = self.get_connection()
         if not conn:
             return []
-        
+
         try:
             cursor = conn.cursor()
-            cursor.execute("""
-                SELECT id, time, latitude, longitude, depth, mag, place 
-                FROM earthquakes_511610 
-                WHERE mag BETWEEN ? AND ?
-                ORDER BY mag DESC
-            """, min_mag, max_mag)
-            
-            rows = cursor.fetchall()
+            # Widen the box until it holds k events; its k closest are the answer
+            radius_km = 100
+            while True:
+                results = self._query_radius(cursor, lat, lon, radius_km, limit=k)
+                if len(results) >= k or radius_km >= MAX_DISTANCE_KM:
+                    break
+                radius_km = min(radius_km * 4, MAX_DISTANCE_KM)
             cursor.close()
             conn.close()
-            
-            results = []
-            for row in rows:
-                results.append({
-                    'id': row[0],
-                    'time': row[1].isoformat() if row[1] else None,
-                    'latitude': row[2],
-                    'longitude': row[3],
-                    'depth': row[4],
-                    'magnitude': row[5],
-                    'place': row[6]
-                })
-            
             return results
-            
+
         except Exception as e:
             if conn:
                 conn.close()
-            print(f"Error searching by magnitude: {e}")
+            print(f"Error searching nearest: {e}")
             return []
+    
+    def search_by_time_range(self, start_date, end_date, limit=None, after=None, include_total=False,
+                             stream=False):
+        """Search earthquakes within time range"""
+        try:
+            params = [self._datetime_param(start_date), self._datetime_param(end_date)]
+        except Exception as e:
+            print(f"Error searching by time range: {e}")
+            return []
+        return self._events("searching by time range", "time BETWEEN ? AND ?", params,
+                            'time', limit, after, include_total, stream)
+    
+    def search_by_magnitude(self, min_mag, max_mag, limit=None, after=None, include_total=False,
+                            stream=False):
+        """Search earthquakes within magnitude range"""
+        return self._events("searching by magnitude", "mag BETWEEN ? AND ?", [min_mag, max_mag],
+                            'mag', limit, after, include_total, stream)
         
     # Visualize
-    def get_magnitude_distribution(self):
-        """Get earthquake count by magnitude ranges"""
+    def get_histogram(self, column, edges, unit=''):
+        """Count rows per bin of column in a single GROUP BY.
+
+        edges are ascending bin boundaries; bins are half-open [low, high) and
+        math.inf edges make open-ended bins. Returns {label: count} in bin order.
+        """
+        edges = validate_bins(edges)
+        labels = bin_labels(edges, unit)
+        bucket_sql, params = bucket_case_sql(column, edges)
+
         conn = self.get_connection()
         if not conn:
             return {}
         
         try:
             cursor = conn.cursor()
-            intervals = [(0,1), (1,2), (2,3), (3,4), (4,5)]
-            results = {}
-            
-            for low, high in intervals:
-                cursor.execute("""
-                    SELECT COUNT(*) FROM earthquakes_511610 
-                    WHERE mag >= ? AND mag < ?
-                """, low, high)
-                count = cursor.fetchone()[0]
-                results[f'{low}-{high}'] = count
-            
-            # Count for 5+
-            cursor.execute("SELECT COUNT(*) FROM earthquakes_511610 WHERE mag >= 5")
-            count_5plus = cursor.fetchone()[0]
-            results['5+'] = count_5plus
-            
+            cursor.execute(f"""
+                SELECT bucket, COUNT(*) FROM (
+                    SELECT {bucket_sql} AS bucket FROM earthquakes_511610
+                ) buckets
+                WHERE bucket IS NOT NULL
+                GROUP BY bucket
+            """, *params)
+            counts = dict(cursor.fetchall())
             cursor.close()
             conn.close()
-            return results
+            return {label: counts.get(bucket, 0) for bucket, label in enumerate(labels)}
             
         except Exception as e:
             if conn:
                 conn.close()
-            print(f"Error getting magnitude distribution: {e}")
+            print(f"Error getting {column} histogram: {e}")
             return {}
 
+    def get_magnitude_distribution(self, edges=MAGNITUDE_BINS):
+        """Get earthquake count by magnitude ranges"""
+        cube = self.get_summary_cube(('mag_bin',))
+        results = cube.magnitude_distribution(edges) if cube is not None else None
+        return results if results is not None else self.get_histogram('mag', edges)
+
     def get_recent_magnitude_depth(self, limit=100):
         """Get magnitude vs depth for recent earthquakes"""
         conn = self.get_connection()
@@ -423,9 +1095,9 @@ class DatabaseManager:
         try:
             cursor = conn.cursor()
             cursor.execute(f"""
-                SELECT TOP {limit} mag, depth, time, place 
+                SELECT mag, depth, time, place 
                 FROM earthquakes_511610 
-                ORDER BY time DESC
+                ORDER BY time DESC {self._limit_clause(limit)}
             """)
             
             rows = cursor.fetchall()
@@ -451,6 +1123,10 @@ class DatabaseManager:
 
     def get_hourly_distribution(self):
         """Get earthquake count by hour of day"""
+        cube = self.get_summary_cube(('hour_of_day',))
+        if cube is not None:
+            return cube.hourly_distribution()
+
         conn = self.get_connection()
         if not conn:
             return {}
@@ -483,6 +1159,11 @@ class DatabaseManager:
 
     def get_hourly_distribution_filtered(self, min_magnitude=0):
         """Get earthquake count by hour of day filtered by minimum magnitude"""
+        cube = self.get_summary_cube(('hour_of_day', 'mag_bin'))
+        results = cube.hourly_distribution_filtered(min_magnitude) if cube is not None else None
+        if results is not None:
+            return results
+
         conn = self.get_connection()
         if not conn:
             return {}
@@ -511,50 +1192,18 @@ class DatabaseManager:
             print(f"Error getting hourly distribution filtered: {e}")
             return {}
 
-    def get_depth_distribution(self):
+    def get_depth_distribution(self, edges=DEPTH_BINS):
         """Get earthquake count by depth ranges"""
-        conn = self.get_connection()
-        if not conn:
-            return {}
-        
-        try:
-            cursor = conn.cursor()
-            depth_ranges = [
-                (0, 10, "0-10km"),
-                (10, 50, "10-50km"),
-                (50, 100, "50-100km"),
-                (100, 300, "100-300km"),
-                (300, 1000, "300km+")
-            ]
-            
-            results = {}
-            for min_depth, max_depth, label in depth_ranges:
-                if label == "300km+":
-                    cursor.execute("""
-                        SELECT COUNT(*) FROM earthquakes_511610 
-                        WHERE depth >= ?
-                    """, min_depth)
-                else:
-                    cursor.execute("""
-                        SELECT COUNT(*) FROM earthquakes_511610 
-                        WHERE depth >= ? AND depth < ?
-                    """, min_depth, max_depth)
-                
-                count = cursor.fetchone()[0]
-                results[label] = count
-            
-            cursor.close()
-            conn.close()
-            return results
-            
-        except Exception as e:
-            if conn:
-                conn.close()
-            print(f"Error getting depth distribution: {e}")
-            return {}
+        cube = self.get_summary_cube(('depth_bin',))
+        results = cube.depth_distribution(edges) if cube is not None else None
+        return results if results is not None else self.get_histogram('depth', edges, unit='km')
 
     def get_top_locations(self, limit=10):
         """Get top earthquake locations by count"""
+        cube = self.get_summary_cube(('region',))
+        if cube is not None:
+            return cube.top_locations(limit)
+
         conn = self.get_connection()
         if not conn:
             return []
@@ -562,22 +1211,14 @@ class DatabaseManager:
         try:
             cursor = conn.cursor()
             cursor.execute(f"""
-                SELECT TOP {limit} 
-                    CASE 
-                        WHEN CHARINDEX(',', place) > 0 
-                        THEN LTRIM(RTRIM(SUBSTRING(place, CHARINDEX(',', place) + 1, LEN(place))))
-                        ELSE place 
-                    END as location,
+                SELECT
+                    {REGION_SQL} as location,
                     COUNT(*) as count
                 FROM earthquakes_511610 
                 WHERE place IS NOT NULL
                 GROUP BY 
-                    CASE 
-                        WHEN CHARINDEX(',', place) > 0 
-                        THEN LTRIM(RTRIM(SUBSTRING(place, CHARINDEX(',', place) + 1, LEN(place))))
-                        ELSE place 
-                    END
-                ORDER BY COUNT(*) DESC
+                    {REGION_SQL}
+                ORDER BY COUNT(*) DESC {self._limit_clause(limit)}
             """)
             
             rows = cursor.fetchall()
@@ -599,49 +1240,37 @@ class DatabaseManager:
             print(f"Error getting top locations: {e}")
             return []
 
-    def get_earthquakes_past_30_days(self, min_magnitude=None):
+    def get_earthquakes_past_30_days(self, min_magnitude=None, limit=None, after=None, include_total=False,
+                                    stream=False):
         """Get earthquakes from the past 30 days for map visualization"""
+        if min_magnitude is not None:
+            return self._events("getting earthquakes past 30 days", "mag >= ?", [min_magnitude],
+                                'time', limit, after, include_total, stream)
+        return self._events("getting earthquakes past 30 days", None, [],
+                            'time', limit, after, include_total, stream)
+
+    def fetch_all_columns(self, names=SNAPSHOT_COLUMNS, batch_size=50000):
+        """Read names of every event as column lists, for building in-memory indexes"""
         conn = self.get_connection()
         if not conn:
-            return []
-        
+            return None
+
         try:
             cursor = conn.cursor()
-            
-            if min_magnitude is not None:
-                cursor.execute("""
-                    SELECT id, time, latitude, longitude, depth, mag, place 
-                    FROM earthquakes_511610 
-                    WHERE mag >= ?
-                    ORDER BY time DESC
-                """, min_magnitude)
-            else:
-                cursor.execute("""
-                    SELECT id, time, latitude, longitude, depth, mag, place 
-                    FROM earthquakes_511610 
-                    ORDER BY time DESC
-                """)
-            
-            rows = cursor.fetchall()
+            cursor.execute(f"SELECT {', '.join(names)} FROM earthquakes_511610")
+            columns = {name: [] for name in names}
+            while True:
+                rows = cursor.fetchmany(batch_size)
+                if not rows:
+                    break
+                for name, values in zip(names, zip(*rows)):
+                    columns[name].extend(values)
             cursor.close()
             conn.close()
-            
-            results = []
-            for row in rows:
-                results.append({
-                    'id': row[0],
-                    'time': row[1].isoformat() if row[1] else None,
-                    'latitude': float(row[2]) if row[2] else 0,
-                    'longitude': float(row[3]) if row[3] else 0,
-                    'depth': float(row[4]) if row[4] else 0,
-                    'magnitude': float(row[5]) if row[5] else 0,
-                    'place': row[6] if row[6] else ''
-                })
-            
-            return results
-            
+            return columns
+
         except Exception as e:
             if conn:
                 conn.close()
-            print(f"Error getting earthquakes past 30 days: {e}")
-            return []
+            print(f"Error fetching columns: {e}")
+            return None
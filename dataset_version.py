@@ -0,0 +1,96 @@
+import os
+import threading
+import time
+
+# Seconds a worker trusts its last read of the version
+VERSION_CHECK_INTERVAL = float(os.getenv('DATASET_VERSION_CHECK_INTERVAL', 1))
+# Seconds between reads of dataset_meta itself, in case the Redis mirror
+# missed a publish
+META_CHECK_INTERVAL = float(os.getenv('DATASET_VERSION_META_INTERVAL', 30))
+# Redis key mirroring the version stored in dataset_meta
+REDIS_KEY = 'dataset_version'
+# Cache keys of version v start with f"{KEY_PREFIX}{v}:"
+KEY_PREFIX = 'dataset:'
+
+
+def key_namespace(version):
+    return f"{KEY_PREFIX}{version}:"
+
+
+class DatasetVersion:
+    """The version of the uploaded data, as seen by every worker.
+
+    The dataset_meta row written at the end of an upload is authoritative and
+    Redis mirrors it so workers can poll it cheaply. Each worker re-reads the
+    version at most every VERSION_CHECK_INTERVAL seconds and calls the
+    on_change callbacks when it moves. Versions only grow: the mirror is
+    only ever raised, and every META_CHECK_INTERVAL seconds a worker also
+    reads dataset_meta and repairs a mirror that fell behind.
+    """
+
+    def __init__(self, db_manager, redis_cache, check_interval=None, meta_check_interval=None):
+        self.db_manager = db_manager
+        self.redis_cache = redis_cache
+        self.check_interval = check_interval if check_interval is not None else VERSION_CHECK_INTERVAL
+        self.meta_check_interval = meta_check_interval if meta_check_interval is not None else META_CHECK_INTERVAL
+        self._version = None
+        self._checked_at = 0
+        self._meta_checked_at = 0
+        self._listeners = []
+        self._lock = threading.Lock()
+
+    def on_change(self, callback):
+        """Call callback(old_version, new_version) whenever the version moves"""
+        self._listeners.append(callback)
+
+    def current(self):
+        """The current version, 0 until one has been read"""
+        if time.time() - self._checked_at >= self.check_interval:
+            with self._lock:
+                if time.time() - self._checked_at >= self.check_interval:
+                    self._update(self._read())
+        return self._version if self._version is not None else 0
+
+    def publish(self, version):
+        """Announce a version this process just wrote to the database"""
+        self.redis_cache.set_max(REDIS_KEY, version)
+        with self._lock:
+            self._update(version)
+        # Only the uploading worker sweeps Redis
+        threading.Thread(target=self.cleanup, args=(version,), daemon=True).start()
+
+    def cleanup(self, version):
+        """Delete cache entries of versions older than version, a SCAN batch at a time"""
+        def is_older(key):
+            try:
+                return int(key[len(KEY_PREFIX):].split(':', 1)[0]) < version
+            except ValueError:
+                return False
+
+        start_time = time.time()
+        deleted = self.redis_cache.scan_delete(f"{KEY_PREFIX}*", is_older)
+        print(f"🧹 Removed {deleted} cache entries older than dataset version {version} "
+              f"in {time.time() - start_time:.2f}s")
+        return deleted
+
+    def _read(self):
+        version = self.redis_cache.get(REDIS_KEY)
+        if version is None or time.time() - self._meta_checked_at >= self.meta_check_interval:
+            stored = self.db_manager.get_dataset_version()
+            self._meta_checked_at = time.time()
+            if stored is not None and (version is None or stored > version):
+                # The mirror is missing or a publish to it failed; raising it
+                # never overwrites a newer published version
+                self.redis_cache.set_max(REDIS_KEY, stored)
+                version = stored
+        return version
+
+    def _update(self, version):
+        self._checked_at = time.time()
+        if version is None or version == self._version:
+            return
+        old, self._version = self._version, version
+        if old is not None:
+            print(f"🔁 Dataset version changed: {old} -> {version}")
+            for callback in self._listeners:
+                callback(old, version)
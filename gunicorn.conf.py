@@ -0,0 +1,21 @@
+import os
+
+# Run with: gunicorn app:app
+# Each worker serves requests on a set of threads, so one slow query or
+# upload no longer holds up every request queued behind it. Calls into the
+# database, Redis and the upload path are capped per backend by the pools in
+# concurrency.py, so more threads don't mean more load on those services.
+bind = f"0.0.0.0:{os.getenv('PORT', 8000)}"
+workers = int(os.getenv('WEB_CONCURRENCY', 2))
+worker_class = 'gthread'
+threads = int(os.getenv('GUNICORN_THREADS', 32))
+# Uploads of large catalogs run for minutes
+timeout = int(os.getenv('GUNICORN_TIMEOUT', 600))
+graceful_timeout = 30
+keepalive = 5
+
+
+def post_worker_init(worker):
+    # app.py defers its connections and background threads to this call
+    from app import start_services
+    start_services()
@@ -0,0 +1,80 @@
+import math
+
+# Columns a histogram can be computed over
+HISTOGRAM_COLUMNS = {'mag', 'depth', 'hour_of_day'}
+
+MAGNITUDE_BINS = [0, 1, 2, 3, 4, 5, math.inf]
+DEPTH_BINS = [0, 10, 50, 100, 300, math.inf]
+HOUR_BINS = list(range(25))
+
+# Keeps the CASE expression and its parameter list bounded
+MAX_BINS = 200
+
+DEFAULT_BINS = {'mag': MAGNITUDE_BINS, 'depth': DEPTH_BINS, 'hour_of_day': HOUR_BINS}
+UNITS = {'mag': '', 'depth': 'km', 'hour_of_day': ''}
+
+
+def parse_bins(text):
+    """Parse comma separated bin edges like "0,1,2,5,inf" """
+    try:
+        edges = [float(part) for part in text.split(',') if part.strip()]
+    except ValueError:
+        raise ValueError(f"Invalid bin edges: {text}")
+    return validate_bins(edges)
+
+
+def validate_bins(edges):
+    edges = list(edges)
+    if len(edges) < 2:
+        raise ValueError("At least two bin edges are required")
+    if len(edges) > MAX_BINS + 1:
+        raise ValueError(f"At most {MAX_BINS} bins are supported")
+    if any(math.isnan(edge) for edge in edges):
+        raise ValueError("Bin edges can't be NaN")
+    if any(low >= high for low, high in zip(edges, edges[1:])):
+        raise ValueError("Bin edges must be strictly increasing")
+    return edges
+
+
+def _format_edge(edge):
+    return str(int(edge)) if float(edge).is_integer() else str(edge)
+
+
+def bin_labels(edges, unit=''):
+    """Labels like "0-1" and "5+", or "0-10km" and "300km+" with a unit.
+
+    Bins are half-open [low, high); an infinite last edge makes an open-ended
+    bin and an infinite first edge one for everything below the second edge.
+    """
+    labels = []
+    for low, high in zip(edges, edges[1:]):
+        if math.isinf(low) and math.isinf(high):
+            labels.append('all')
+        elif math.isinf(high):
+            labels.append(f"{_format_edge(low)}{unit}+")
+        elif math.isinf(low):
+            labels.append(f"<{_format_edge(high)}{unit}")
+        else:
+            labels.append(f"{_format_edge(low)}-{_format_edge(high)}{unit}")
+    return labels
+
+
+def bucket_case_sql(column, edges):
+    """CASE expression numbering the bin a column value falls in, NULL if none.
+
+    Returns the SQL and its parameters; column must come from HISTOGRAM_COLUMNS.
+    """
+    if column not in HISTOGRAM_COLUMNS:
+        raise ValueError(f"Unsupported histogram column: {column}")
+    whens = []
+    params = []
+    for bucket, (low, high) in enumerate(zip(edges, edges[1:])):
+        conditions = []
+        if not math.isinf(low):
+            conditions.append(f"{column} >= ?")
+            params.append(low)
+        if not math.isinf(high):
+            conditions.append(f"{column} < ?")
+            params.append(high)
+        whens.append(f"WHEN {' AND '.join(conditions) or f'{column} IS NOT NULL'} THEN {bucket}")
+    return f"CASE {' '.join(whens)} END", params
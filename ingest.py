@@ -0,0 +1,60 @@
+import os
+import pandas as pd
+
+# Only these columns are read from the (much wider) USGS catalog
+REQUIRED_COLUMNS = ['id', 'time', 'latitude', 'longitude', 'depth', 'mag', 'place']
+CRITICAL_COLUMNS = ['time', 'latitude', 'longitude', 'depth', 'mag', 'place']
+
+# Explicit dtypes skip type inference; coordinates stay float64 so stored
+# values are unchanged
+CSV_DTYPES = {
+    'id': 'str',
+    'time': 'str',
+    'latitude': 'float64',
+    'longitude': 'float64',
+    'depth': 'float64',
+    'mag': 'float64',
+    'place': 'str',
+}
+
+DEFAULT_CHUNK_SIZE = int(os.getenv('INGEST_CHUNK_SIZE', 50000))
+
+
+class CsvIngestStream:
+    """Stream a catalog CSV as cleaned, fixed-size DataFrame chunks.
+
+    Iterate it to get chunks for DatabaseManager.create_table_and_upload_data.
+    Row counts are accumulated while iterating and, when cleaned_path is given,
+    each cleaned chunk is appended to that CSV so no full copy is ever held.
+    """
+
+    def __init__(self, source, chunk_size=None, cleaned_path=None):
+        self.source = source
+        self.chunk_size = chunk_size or DEFAULT_CHUNK_SIZE
+        self.cleaned_path = cleaned_path
+        self.initial_count = 0
+        self.cleaned_count = 0
+
+    def __iter__(self):
+        reader = pd.read_csv(
+            self.source,
+            usecols=REQUIRED_COLUMNS,
+            dtype=CSV_DTYPES,
+            chunksize=self.chunk_size,
+        )
+        write_header = True
+        with reader:
+            for chunk in reader:
+                self.initial_count += len(chunk)
+
+                # Clean data - remove rows with null values in critical columns
+                cleaned = chunk.dropna(subset=CRITICAL_COLUMNS)[REQUIRED_COLUMNS]
+                self.cleaned_count += len(cleaned)
+
+                if self.cleaned_path:
+                    cleaned.to_csv(self.cleaned_path, mode='w' if write_header else 'a',
+                                   header=write_header, index=False)
+                    write_header = False
+
+                print(f"📊 Chunk cleaned: {self.initial_count} read, {self.cleaned_count} kept so far")
+                yield cleaned
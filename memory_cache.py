@@ -1,56 +1,73 @@
-# Create a new file: memory_cache.py
+import os
+import threading
 import time
-import json
+from collections import OrderedDict
 
 class MemoryCache:
-    def __init__(self):
-        self.cache = {}
+    """Bounded in-process cache with per-key expiry.
+
+    Holds at most max_entries keys and evicts the least recently used one
+    when full. Safe to share between request threads. Values are stored as
+    given, not copied, so callers must not modify what get returns. Keys are
+    used verbatim; build them with tiered_cache.canonical_key.
+    """
+
+    def __init__(self, max_entries=None):
+        self.max_entries = max_entries or int(os.getenv('MEMORY_CACHE_MAX_ENTRIES', 1024))
+        self.cache = OrderedDict()
         self.timestamps = {}
-        print("✅ Memory cache initialized")
-    
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        print(f"✅ Memory cache initialized ({self.max_entries} entries max)")
+
     def set(self, key, value, expire_time=3600):
         """Set value in memory cache"""
-        try:
-            normalized_key = key.lower().strip()
-            self.cache[normalized_key] = value
-            self.timestamps[normalized_key] = time.time() + expire_time
-            print(f"✅ MEMORY CACHE SET: {normalized_key}")
-            return True
-        except Exception as e:
-            print(f"❌ Memory cache SET error: {e}")
-            return False
-    
+        with self._lock:
+            self.cache[key] = value
+            self.cache.move_to_end(key)
+            self.timestamps[key] = time.time() + expire_time
+            while len(self.cache) > self.max_entries:
+                oldest, _ = self.cache.popitem(last=False)
+                del self.timestamps[oldest]
+                self.evictions += 1
+        return True
+
     def get(self, key):
-        """Get value from memory cache"""
-        try:
-            normalized_key = key.lower().strip()
-            
-            # Check if key exists and not expired
-            if normalized_key in self.cache:
-                if time.time() < self.timestamps[normalized_key]:
-                    print(f"🎯 MEMORY CACHE HIT: {normalized_key}")
-                    return self.cache[normalized_key]
-                else:
-                    # Remove expired entry
-                    del self.cache[normalized_key]
-                    del self.timestamps[normalized_key]
-                    print(f"⏰ MEMORY CACHE EXPIRED: {normalized_key}")
-            
-            print(f"❌ MEMORY CACHE MISS: {normalized_key}")
+        """Get value from memory cache, None if missing or expired"""
+        with self._lock:
+            if key in self.cache:
+                if time.time() < self.timestamps[key]:
+                    self.cache.move_to_end(key)
+                    self.hits += 1
+                    return self.cache[key]
+                # Remove expired entry
+                del self.cache[key]
+                del self.timestamps[key]
+            self.misses += 1
             return None
-        except Exception as e:
-            print(f"❌ Memory cache GET error: {e}")
-            return None
-    
+
+    def delete(self, key):
+        with self._lock:
+            self.timestamps.pop(key, None)
+            return self.cache.pop(key, None) is not None
+
     def clear_all(self):
         """Clear all cache"""
-        self.cache.clear()
-        self.timestamps.clear()
+        with self._lock:
+            self.cache.clear()
+            self.timestamps.clear()
         print("🗑️ Memory cache cleared")
-    
+
     def get_stats(self):
         """Get cache statistics"""
-        return {
-            'total_keys': len(self.cache),
-            'keys': list(self.cache.keys())
-        }
+        with self._lock:
+            return {
+                'total_keys': len(self.cache),
+                'max_entries': self.max_entries,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'keys': list(self.cache.keys())[-20:]
+            }
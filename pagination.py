@@ -0,0 +1,66 @@
+import base64
+import json
+import os
+
+# Upper bound on the limit a client can ask for
+MAX_PAGE_SIZE = int(os.getenv('MAX_PAGE_SIZE', 5000))
+# Page size when a request gives no limit
+DEFAULT_PAGE_SIZE = min(int(os.getenv('DEFAULT_PAGE_SIZE', 1000)), MAX_PAGE_SIZE)
+
+# Row field holding the sort key for each supported order
+SORT_FIELDS = {'time': 'time', 'mag': 'magnitude'}
+
+
+class Page(list):
+    """A list of rows plus what is needed to fetch the next page.
+
+    next_after is the token to pass as `after` for the following page, None
+    on the last page. total is the number of rows matching the search, when
+    it was asked for. Serializes like a plain list.
+    """
+
+    def __init__(self, rows=(), next_after=None, total=None):
+        super().__init__(rows)
+        self.next_after = next_after
+        self.total = total
+
+
+def encode_after(key, id_):
+    """Opaque token for resuming a (key DESC, id DESC) scan after a row"""
+    return base64.urlsafe_b64encode(json.dumps([key, id_]).encode()).decode().rstrip('=')
+
+
+def decode_after(token):
+    """(key, id) from a token made by encode_after; ValueError if malformed"""
+    try:
+        key, id_ = json.loads(base64.urlsafe_b64decode(token + '=' * (-len(token) % 4)))
+    except Exception:
+        raise ValueError(f"Invalid pagination token: {token}")
+    if not isinstance(id_, str) or not isinstance(key, (str, int, float)):
+        raise ValueError(f"Invalid pagination token: {token}")
+    return key, id_
+
+
+def make_page(rows, limit, order, total=None):
+    """Trim rows fetched with limit + 1 to a Page, with a token if more follow"""
+    if limit is None or len(rows) <= limit:
+        return Page(rows, total=total)
+    rows = rows[:limit]
+    last = rows[-1]
+    return Page(rows, encode_after(last[SORT_FIELDS[order]], last['id']), total)
+
+
+def parse_page_args(source, default_limit=DEFAULT_PAGE_SIZE):
+    """limit, after and include_total from a JSON body or query string.
+
+    A missing or zero limit means default_limit; None leaves the result
+    unbounded, for streamed responses whose memory doesn't grow with it.
+    Raises ValueError for a bad limit or token so endpoints can answer 400.
+    """
+    limit = source.get('limit')
+    limit = min(max(1, int(limit)), MAX_PAGE_SIZE) if limit and int(limit) else default_limit
+    after = source.get('after') or None
+    if after is not None:
+        decode_after(after)
+    include_total = str(source.get('include_total', 'false')).lower() == 'true'
+    return limit, after, include_total
@@ -0,0 +1,57 @@
+from collections import defaultdict
+import numpy as np
+
+# Shorter search strings have no trigram to look up and fall back to a scan
+MIN_INDEXED_LENGTH = 3
+
+
+def trigrams(text):
+    """Distinct lowercase 3-character substrings of text"""
+    text = text.lower()
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+class TrigramIndex:
+    """Inverted index from lowercase trigrams to the strings containing them.
+
+    A substring search intersects the posting lists of the needle's trigrams,
+    smallest first, then confirms each surviving candidate with a plain
+    substring check, since sharing all trigrams doesn't imply containment.
+    Strings are identified by their position in the list the index was built
+    from, e.g. the snapshot's place dictionary codes.
+    """
+
+    def __init__(self, strings):
+        self._lower = [text.lower() for text in strings]
+        postings = defaultdict(list)
+        for code, text in enumerate(self._lower):
+            for gram in trigrams(text):
+                postings[gram].append(code)
+        # Codes were appended in ascending order, so every list is sorted
+        self._postings = {gram: np.array(codes, dtype=np.int64) for gram, codes in postings.items()}
+
+    def __len__(self):
+        return len(self._lower)
+
+    def _candidates(self, needle):
+        if len(needle) < MIN_INDEXED_LENGTH:
+            return range(len(self._lower))
+        lists = []
+        for gram in trigrams(needle):
+            codes = self._postings.get(gram)
+            if codes is None:
+                return ()
+            lists.append(codes)
+        lists.sort(key=len)
+        candidates = lists[0]
+        for codes in lists[1:]:
+            candidates = np.intersect1d(candidates, codes, assume_unique=True)
+            if len(candidates) == 0:
+                break
+        return candidates
+
+    def search(self, needle):
+        """Codes of the strings containing needle, case-insensitively, ascending"""
+        needle = needle.lower()
+        return np.array([code for code in self._candidates(needle) if needle in self._lower[code]],
+                        dtype=np.int64)
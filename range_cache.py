@@ -0,0 +1,170 @@
+import os
+import threading
+from collections import OrderedDict
+import numpy as np
+import pandas as pd
+from pagination import SORT_FIELDS, decode_after, make_page
+from spatial_index import haversine_km
+
+# Largest result kept as a superset for narrower requests; filtering it has to
+# stay cheaper than asking the database
+RANGE_CACHE_MAX_ROWS = int(os.getenv('RANGE_CACHE_MAX_ROWS', 50000))
+# Ranges remembered per loader; the least recently cached is dropped first
+RANGE_CACHE_MAX_RANGES = int(os.getenv('RANGE_CACHE_MAX_RANGES', 64))
+
+
+def _timestamp(value):
+    """Naive UTC timestamp, compared the way both readers compare times"""
+    return pd.to_datetime(value, utc=True).tz_localize(None)
+
+
+def _page_args(args):
+    """limit, after and include_total following a loader's two range arguments"""
+    return (*args[2:], None, None, False)[:3]
+
+
+def _first(rows, lo, hi, passed):
+    """First index in [lo, hi) whose row satisfies passed, a predicate that
+    is false up to some row and true from there on"""
+    while lo < hi:
+        mid = (lo + hi) // 2
+        if passed(rows[mid]):
+            hi = mid
+        else:
+            lo = mid + 1
+    return lo
+
+
+class SortedRange:
+    """Searches for low <= key <= high with rows sorted by (key DESC, id DESC).
+
+    A complete result for a range holds any narrower range as one contiguous
+    slice, found by bisection, and an `after` token resumes inside that slice
+    just as the readers' keyset predicate does.
+    """
+
+    def __init__(self, order, parse=float):
+        self.order = order
+        self.field = SORT_FIELDS[order]
+        self.parse = parse
+
+    def bounds(self, args):
+        return self.parse(args[0]), self.parse(args[1])
+
+    def contains(self, outer, inner):
+        return outer[0] <= inner[0] and inner[1] <= outer[1]
+
+    def is_complete(self, args, value):
+        """Whether value holds every matching row rather than one page of them"""
+        _, after, _ = _page_args(args)
+        return after is None and getattr(value, 'next_after', None) is None
+
+    def select(self, rows, args):
+        low, high = self.bounds(args)
+        limit, after, include_total = _page_args(args)
+
+        def key(row):
+            return self.parse(row[self.field])
+
+        start = _first(rows, 0, len(rows), lambda row: key(row) <= high)
+        end = _first(rows, start, len(rows), lambda row: key(row) < low)
+        total = end - start if include_total else None
+        if after is not None:
+            after_key, after_id = decode_after(after)
+            after_key = self.parse(after_key)
+            start = _first(rows, start, end, lambda row: (key(row), row['id']) < (after_key, after_id))
+        stop = min(end, start + limit + 1) if limit else end
+        return make_page(rows[start:stop], limit, self.order, total)
+
+
+class RadiusRange:
+    """Location searches: every row within radius_km of a point, nearest first.
+
+    One circle holds another when the distance between their centres plus the
+    inner radius fits inside the outer radius. Its rows are then measured
+    again from the new centre, trimmed and re-sorted.
+    """
+
+    def bounds(self, args):
+        lat, lon, radius_km = args[:3]
+        return float(lat), float(lon), float(radius_km)
+
+    def contains(self, outer, inner):
+        offset = float(haversine_km(outer[0], outer[1], inner[0], inner[1]))
+        return offset + inner[2] <= outer[2]
+
+    def is_complete(self, args, value):
+        return True
+
+    def select(self, rows, args):
+        lat, lon, radius_km = self.bounds(args)
+        if not rows:
+            return []
+        distances = haversine_km(lat, lon, np.array([row['latitude'] for row in rows]),
+                                 np.array([row['longitude'] for row in rows]))
+        keep = np.flatnonzero(distances <= radius_km)
+        keep = keep[np.argsort(distances[keep], kind='stable')]
+        # Cached rows are shared, so copy them rather than overwrite their distance
+        return [{**rows[i], 'distance_km': round(float(distances[i]), 2)} for i in keep]
+
+
+MAGNITUDE_RANGES = SortedRange('mag')
+TIME_RANGES = SortedRange('time', parse=_timestamp)
+RADIUS_RANGES = RadiusRange()
+
+
+class RangeIndex:
+    """Keys of one loader's cached results, by the range each one covers.
+
+    Only complete results of at most max_rows rows are remembered, so a
+    narrower request can be answered by filtering one of them in memory. The
+    index is per process and only holds keys; the values stay in the cache
+    tiers and a key whose value has expired is forgotten when found missing.
+    """
+
+    def __init__(self, kind, max_ranges=None, max_rows=None):
+        self.kind = kind
+        self.max_ranges = max_ranges or RANGE_CACHE_MAX_RANGES
+        self.max_rows = max_rows or RANGE_CACHE_MAX_ROWS
+        self._ranges = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._ranges)
+
+    def _bounds(self, args):
+        # Unparseable arguments match nothing; the loader reports the error
+        try:
+            return self.kind.bounds(args)
+        except Exception:
+            return None
+
+    def remember(self, key, args, value):
+        if not value or len(value) > self.max_rows or not self.kind.is_complete(args, value):
+            return
+        bounds = self._bounds(args)
+        if bounds is None:
+            return
+        with self._lock:
+            self._ranges[key] = (bounds, len(value))
+            self._ranges.move_to_end(key)
+            while len(self._ranges) > self.max_ranges:
+                self._ranges.popitem(last=False)
+
+    def covering(self, key, args, namespace=''):
+        """Other remembered keys in namespace whose range contains args', smallest first"""
+        bounds = self._bounds(args)
+        if bounds is None:
+            return []
+        with self._lock:
+            matches = [(size, other) for other, (outer, size) in self._ranges.items()
+                       if other != key and other.startswith(namespace) and self.kind.contains(outer, bounds)]
+        return [other for _, other in sorted(matches)]
+
+    def forget(self, key):
+        with self._lock:
+            self._ranges.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._ranges.clear()
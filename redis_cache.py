@@ -1,30 +1,67 @@
 import redis
 import json
 import os
+import uuid
 from datetime import timedelta
+from cache_codec import CacheCodec
+
+# Deletes a lock only if it still holds our token, so a lock that expired and
+# was taken by someone else isn't released by mistake
+RELEASE_LOCK_SCRIPT = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('del', KEYS[1])
+end
+return 0
+"""
+
+# Raises an integer counter to ARGV[1] but never lowers it, so a slower
+# writer can't replace a newer value with an older one
+SET_MAX_SCRIPT = """
+local current = tonumber(redis.call('get', KEYS[1]))
+if current == nil or tonumber(ARGV[1]) > current then
+    redis.call('set', KEYS[1], ARGV[1])
+    return 1
+end
+return 0
+"""
 
 class RedisCache:
-    def __init__(self):
+    def __init__(self, connect=True):
         # Azure Redis Cache connection
         
+        # Values are stored as bytes from the codec, see cache_codec.py
+        self.codec = CacheCodec()
         self.redis_host = os.getenv('REDIS_HOST')
         self.redis_port = 6380
         self.redis_password = os.getenv('REDIS_PASSWORD')
-
+        # Until connect() succeeds every call misses, as with Redis down
+        self.pool = None
+        self.redis_client = None
+        if connect:
+            self.connect()
+    
+    def connect(self):
+        """Open the connection pool and check that Redis answers"""
         try:
-            self.redis_client = redis.Redis(
+            # Shared by all request threads; a request waits for a free
+            # connection instead of opening a new TLS session
+            self.pool = redis.BlockingConnectionPool(
+                connection_class=redis.SSLConnection,
+                max_connections=int(os.getenv('REDIS_MAX_CONNECTIONS', 20)),
+                timeout=float(os.getenv('REDIS_POOL_TIMEOUT', 5)),
                 host=self.redis_host,
                 port=self.redis_port,
                 password=self.redis_password,
-                ssl=True,
-                decode_responses=True
+                health_check_interval=30,
             )
+            self.redis_client = redis.Redis(connection_pool=self.pool)
 
             # Test connection
             self.redis_client.ping()
             print("Redis connection successful")
         except Exception as e:
             print(f"Redis connection failed: {e}")
+            self.pool = None
             self.redis_client = None
     
     # def set(self, key, value, expire_time=300):
@@ -62,7 +99,7 @@ class RedisCache:
             value = self.redis_client.get(key)
             if value:
                 print(f"Cache HIT for key: {key}")
-                return json.loads(value)
+                return self.codec.decode(value)
             else:
                 print(f"Cache MISS for key: {key}")
             return None
@@ -70,20 +107,74 @@ class RedisCache:
             print(f"Redis get error: {e}")
             return None
 
-    def set(self, key, value, expire_time=300):
+    def set(self, key, value, expire_time=300, only_if_missing=False):
+        """Store value through the codec; expire_time None keeps it until deleted"""
         if not self.redis_client:
             print("Redis client not available")
             return False
         
         try:
-            serialized_value = json.dumps(value)
-            result = self.redis_client.setex(key, expire_time, serialized_value)
+            serialized_value = self.codec.encode(value)
+            if expire_time is None or only_if_missing:
+                result = self.redis_client.set(key, serialized_value, ex=expire_time, nx=only_if_missing)
+            else:
+                result = self.redis_client.setex(key, expire_time, serialized_value)
             print(f"Cache SET for key: {key}, success: {result}")
             return result
         except Exception as e:
             print(f"Redis set error: {e}")
             return False
 
+    def set_max(self, key, value):
+        """Store the integer value unless the key already holds a larger one.
+
+        The value is kept as plain digits, which get() reads back as a number.
+        """
+        if not self.redis_client:
+            return False
+        
+        try:
+            return bool(self.redis_client.eval(SET_MAX_SCRIPT, 1, key, int(value)))
+        except Exception as e:
+            print(f"Redis set max error: {e}")
+            return False
+
+    def get_many(self, keys):
+        """Values of several keys in one MGET round trip, None where missing"""
+        if not self.redis_client or not keys:
+            return [None] * len(keys)
+        
+        try:
+            values = self.redis_client.mget(keys)
+        except Exception as e:
+            print(f"Redis mget error: {e}")
+            return [None] * len(keys)
+        results = []
+        for value in values:
+            try:
+                results.append(self.codec.decode(value) if value else None)
+            except Exception as e:
+                print(f"Redis decode error: {e}")
+                results.append(None)
+        print(f"Cache MGET: {sum(value is not None for value in results)}/{len(keys)} hits")
+        return results
+    
+    def set_many(self, items, expire_time=300):
+        """Store (key, value) pairs with one pipelined batch of SETEX commands"""
+        if not self.redis_client or not items:
+            return False
+        
+        try:
+            pipe = self.redis_client.pipeline(transaction=False)
+            for key, value in items:
+                pipe.setex(key, expire_time, self.codec.encode(value))
+            results = pipe.execute()
+            print(f"Cache SET many: {len(items)} keys")
+            return all(results)
+        except Exception as e:
+            print(f"Redis set_many error: {e}")
+            return False
+    
     def delete(self, key):
         """Delete key from cache"""
         if not self.redis_client:
@@ -95,6 +186,77 @@ class RedisCache:
             print(f"Redis delete error: {e}")
             return False
     
+    def acquire_lock(self, name, timeout):
+        """Try to take a lock that expires after timeout seconds.
+
+        Returns (acquired, token). Without Redis there is nobody to coordinate
+        with, so the lock is always granted.
+        """
+        if not self.redis_client:
+            return True, None
+        
+        token = uuid.uuid4().hex
+        try:
+            return bool(self.redis_client.set(name, token, nx=True, px=int(timeout * 1000))), token
+        except Exception as e:
+            print(f"Redis lock error: {e}")
+            return True, None
+    
+    def lock_held(self, name):
+        if not self.redis_client:
+            return False
+        
+        try:
+            return self.redis_client.get(name) is not None
+        except Exception as e:
+            print(f"Redis lock error: {e}")
+            return False
+    
+    def release_lock(self, name, token):
+        if not self.redis_client or token is None:
+            return False
+        
+        try:
+            return bool(self.redis_client.eval(RELEASE_LOCK_SCRIPT, 1, name, token))
+        except Exception as e:
+            print(f"Redis unlock error: {e}")
+            return False
+    
+    def scan_delete(self, pattern, should_delete=None, batch_size=500):
+        """Delete keys matching a glob pattern, walking them with SCAN.
+
+        Unlike FLUSHALL this never blocks the server for long and leaves other
+        keys alone. should_delete can spare some of the matching keys.
+        """
+        if not self.redis_client:
+            return 0
+        
+        deleted = 0
+        batch = []
+        try:
+            for key in self.redis_client.scan_iter(match=pattern, count=batch_size):
+                if should_delete is None or should_delete(key.decode() if isinstance(key, bytes) else key):
+                    batch.append(key)
+                if len(batch) >= batch_size:
+                    deleted += self.redis_client.delete(*batch)
+                    batch = []
+            if batch:
+                deleted += self.redis_client.delete(*batch)
+        except Exception as e:
+            print(f"Redis scan delete error: {e}")
+        return deleted
+    
+    def get_stats(self):
+        pool = self.pool
+        return {
+            'connected': self.redis_client is not None,
+            'pool': {
+                'max_connections': pool.max_connections,
+                'open_connections': len(getattr(pool, '_connections', [])),
+            } if pool is not None else None,
+            'codec': self.codec.get_stats(),
+        }
+    
     def clear_all(self):
         """Clear all cache"""
         if not self.redis_client:
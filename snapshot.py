@@ -0,0 +1,391 @@
+import os
+import threading
+import time
+import numpy as np
+import pandas as pd
+from spatial_index import GeoGridIndex
+from place_index import TrigramIndex
+from histogram import MAGNITUDE_BINS, DEPTH_BINS, HISTOGRAM_COLUMNS, bin_labels, validate_bins
+from summary_cube import SummaryCube
+from pagination import decode_after, make_page
+from tiles import ClusterIndex, MAX_TILE_POINTS, MAX_TILE_INDEXES
+
+
+def region_of(place):
+    """Text after the first comma, like the top locations SQL"""
+    if ',' in place:
+        return place.split(',', 1)[1].strip(' ')
+    return place
+
+
+class TileSource:
+    """Event positions and magnitudes clustered into map tiles.
+
+    Only id, latitude, longitude and mag are loaded, so tiles can be served
+    while full snapshots are disabled. The few events of a tile zoomed past
+    the cluster levels are fetched from the database by id.
+    """
+
+    COLUMNS = ('id', 'latitude', 'longitude', 'mag')
+
+    def __init__(self, columns, version=None, db_manager=None):
+        self.version = version
+        self.db_manager = db_manager
+        self.ids = np.array(columns['id'], dtype=object)
+        self.latitude = np.array(columns['latitude'], dtype=np.float64)
+        self.longitude = np.array(columns['longitude'], dtype=np.float64)
+        self.mag = np.array(columns['mag'], dtype=np.float64)
+
+        # Map tile clusters per min_magnitude, built on first request
+        self._tile_indexes = {}
+        self._tile_lock = threading.Lock()
+        self.built_at = time.time()
+
+    def __len__(self):
+        return len(self.ids)
+
+    @classmethod
+    def build(cls, db_manager):
+        """Load from the database, None if it can't be read"""
+        # Read first, so an upload landing during the load makes it stale
+        version = db_manager.get_dataset_version()
+        columns = db_manager.fetch_all_columns(cls.COLUMNS)
+        if columns is None:
+            return None
+        return cls(columns, version, db_manager)
+
+    def _rows(self, index):
+        return self.db_manager.get_earthquakes_by_id(list(self.ids[np.asarray(index, dtype=np.int64)]))
+
+    def tile_index(self, min_magnitude=None):
+        """Positions of the events at least min_magnitude and their ClusterIndex"""
+        with self._tile_lock:
+            if min_magnitude not in self._tile_indexes:
+                if len(self._tile_indexes) >= MAX_TILE_INDEXES:
+                    self._tile_indexes.pop(next(iter(self._tile_indexes)))
+                subset = np.arange(len(self)) if min_magnitude is None else np.flatnonzero(self.mag >= min_magnitude)
+                self._tile_indexes[min_magnitude] = (
+                    subset, ClusterIndex(self.latitude[subset], self.longitude[subset], self.mag[subset]))
+            return self._tile_indexes[min_magnitude]
+
+    def get_tile(self, zoom, tile_x, tile_y, min_magnitude=None):
+        """Clusters in a map tile, or its events once zoomed past the cluster levels"""
+        subset, index = self.tile_index(min_magnitude)
+        clusters = index.clusters(zoom, tile_x, tile_y)
+        if clusters is not None:
+            return {'clusters': clusters, 'points': [], 'truncated': False}
+        positions = subset[index.points(zoom, tile_x, tile_y)]
+        # Strongest first when a tile holds more than can be drawn
+        positions = positions[np.argsort(-self.mag[positions], kind='stable')]
+        return {
+            'clusters': [],
+            'points': self._rows(positions[:MAX_TILE_POINTS]),
+            'truncated': len(positions) > MAX_TILE_POINTS,
+        }
+
+
+class EarthquakeSnapshot(TileSource):
+    """Read-only columnar copy of earthquakes_511610.
+
+    Numeric columns are NumPy arrays and place is dictionary encoded. The
+    query methods mirror DatabaseManager and return the same shapes, so an
+    endpoint can use either one.
+    """
+
+    def __init__(self, columns, version=None):
+        super().__init__(columns, version)
+        self.time = np.array(columns['time'], dtype='datetime64[us]')
+        self.depth = np.array(columns['depth'], dtype=np.float64)
+        self.hour = np.array([-1 if h is None else h for h in columns['hour_of_day']], dtype=np.int16)
+        codes, places = pd.factorize(pd.Series(columns['place'], dtype=object))
+        self.place_codes = codes.astype(np.int32)
+        self.places = np.asarray(places, dtype=object)
+
+        self.spatial_index = GeoGridIndex(self.latitude, self.longitude)
+        # Newest first, the order most endpoints return; ties break on id
+        # descending like the SQL keyset order
+        self._id_rank = np.argsort(np.argsort(self.ids, kind='stable'), kind='stable')
+        self._by_time_desc = np.lexsort((-self._id_rank, -self.time.astype(np.int64)))
+
+        # Rows of each place as positions in _by_time_desc, grouped by place code
+        self.place_index = TrigramIndex(self.places)
+        time_rank = np.empty(len(self.ids), dtype=np.int64)
+        time_rank[self._by_time_desc] = np.arange(len(self.ids))
+        by_place = np.lexsort((time_rank, self.place_codes))
+        self._place_ranks = time_rank[by_place]
+        self._place_start = np.searchsorted(self.place_codes[by_place], np.arange(len(self.places) + 1))
+
+        # Dashboard aggregates are answered from the cube's cells
+        regions = np.array([region_of(place) for place in self.places], dtype=object)
+        self.cube = SummaryCube.from_columns(self.hour, self.mag, self.depth, regions[self.place_codes])
+        self.built_at = time.time()
+
+    @classmethod
+    def build(cls, db_manager):
+        """Load a snapshot from the database, None if it can't be read"""
+        # Read first, so an upload landing during the load makes the snapshot stale
+        version = db_manager.get_dataset_version()
+        columns = db_manager.fetch_all_columns()
+        if columns is None:
+            return None
+        return cls(columns, version)
+
+    # Row formatting, matching DatabaseManager output
+    def _times_iso(self, index):
+        return [t.isoformat() for t in pd.DatetimeIndex(self.time[index]).to_pydatetime()]
+
+    def _rows(self, index):
+        index = np.asarray(index, dtype=np.int64)
+        return [
+            {
+                'id': id_,
+                'time': t,
+                'latitude': float(lat),
+                'longitude': float(lon),
+                'depth': float(depth),
+                'magnitude': float(mag),
+                'place': self.places[code],
+            }
+            for id_, t, lat, lon, depth, mag, code in zip(
+                self.ids[index], self._times_iso(index), self.latitude[index],
+                self.longitude[index], self.depth[index], self.mag[index],
+                self.place_codes[index])
+        ]
+
+    def _time_ordered(self, mask):
+        """Indices matching mask, newest first"""
+        return self._by_time_desc[mask[self._by_time_desc]]
+
+    def _after(self, index, order, after):
+        """Drop the rows of a sorted index up to and including the token's row"""
+        if after is None:
+            return index
+        key, last_id = decode_after(after)
+        if order == 'time':
+            keys = self.time[index]
+            key = np.datetime64(pd.to_datetime(key, utc=True).tz_localize(None), 'us')
+        else:
+            keys = self.mag[index]
+        return index[(keys < key) | ((keys == key) & (self.ids[index] < last_id))]
+
+    def _page(self, index, order, limit=None, after=None, include_total=False, stream=False):
+        """Rows of an index already sorted by (order DESC, id DESC), as a Page.
+
+        With stream, a generator formatting the rows a chunk at a time instead.
+        """
+        total = len(index) if include_total else None
+        index = self._after(index, order, after)
+        if stream:
+            return self._iter_rows(index[:limit] if limit else index)
+        rows = self._rows(index[:limit + 1] if limit else index)
+        return make_page(rows, limit, order, total)
+
+    def _iter_rows(self, index, batch_size=1000):
+        for start in range(0, len(index), batch_size):
+            yield from self._rows(index[start:start + batch_size])
+
+    # Searches
+    def get_random_earthquakes(self, n, seed=None):
+        if len(self) == 0:
+            return []
+        return self._rows(np.random.default_rng(seed).integers(0, len(self), n))
+
+    def search_by_place(self, place_substring, limit=None, after=None, include_total=False, stream=False):
+        codes = self.place_index.search(place_substring)
+        if len(codes) == 0:
+            return iter(()) if stream else make_page([], limit, 'time', 0 if include_total else None)
+        ranks = np.sort(np.concatenate([
+            self._place_ranks[self._place_start[code]:self._place_start[code + 1]] for code in codes]))
+        return self._page(self._by_time_desc[ranks], 'time', limit, after, include_total, stream)
+
+    def _rows_with_distance(self, index, distances):
+        results = self._rows(index)
+        for row, distance in zip(results, distances):
+            row['distance_km'] = round(float(distance), 2)
+        return results
+
+    def search_by_location(self, lat, lon, radius_km):
+        return self._rows_with_distance(*self.spatial_index.query_radius(lat, lon, radius_km))
+
+    def search_nearest(self, lat, lon, k=10):
+        return self._rows_with_distance(*self.spatial_index.nearest(lat, lon, k))
+
+    def search_by_time_range(self, start_date, end_date, limit=None, after=None, include_total=False,
+                             stream=False):
+        try:
+            start = np.datetime64(pd.to_datetime(start_date, utc=True).tz_localize(None), 'us')
+            end = np.datetime64(pd.to_datetime(end_date, utc=True).tz_localize(None), 'us')
+        except Exception as e:
+            print(f"Error searching by time range: {e}")
+            return []
+        return self._page(self._time_ordered((self.time >= start) & (self.time <= end)),
+                          'time', limit, after, include_total, stream)
+
+    def search_by_magnitude(self, min_mag, max_mag, limit=None, after=None, include_total=False,
+                            stream=False):
+        index = np.flatnonzero((self.mag >= min_mag) & (self.mag <= max_mag))
+        index = index[np.lexsort((-self._id_rank[index], -self.mag[index]))]
+        return self._page(index, 'mag', limit, after, include_total, stream)
+
+    def get_earthquakes_past_30_days(self, min_magnitude=None, limit=None, after=None, include_total=False,
+                                    stream=False):
+        if min_magnitude is None:
+            return self._page(self._by_time_desc, 'time', limit, after, include_total, stream)
+        return self._page(self._time_ordered(self.mag >= min_magnitude), 'time', limit, after, include_total,
+                          stream)
+
+    # Aggregates
+    def _histogram_values(self, column):
+        if column not in HISTOGRAM_COLUMNS:
+            raise ValueError(f"Unsupported histogram column: {column}")
+        if column == 'hour_of_day':
+            return np.where(self.hour >= 0, self.hour, np.nan)
+        return self.mag if column == 'mag' else self.depth
+
+    def get_histogram(self, column, edges, unit=''):
+        edges = validate_bins(edges)
+        # Bin i holds values in [edges[i], edges[i+1]); NaN sorts past every edge
+        buckets = np.searchsorted(np.asarray(edges, dtype=np.float64),
+                                  self._histogram_values(column), side='right') - 1
+        counts = np.bincount(buckets[(buckets >= 0) & (buckets < len(edges) - 1)],
+                             minlength=len(edges) - 1)
+        return {label: int(count) for label, count in zip(bin_labels(edges, unit), counts)}
+
+    def get_magnitude_distribution(self, edges=MAGNITUDE_BINS):
+        results = self.cube.magnitude_distribution(edges)
+        return results if results is not None else self.get_histogram('mag', edges)
+
+    def get_depth_distribution(self, edges=DEPTH_BINS):
+        results = self.cube.depth_distribution(edges)
+        return results if results is not None else self.get_histogram('depth', edges, unit='km')
+
+    def get_recent_magnitude_depth(self, limit=100):
+        index = self._by_time_desc[:limit]
+        return [
+            {'magnitude': float(mag), 'depth': float(depth), 'time': t, 'place': self.places[code]}
+            for mag, depth, t, code in zip(self.mag[index], self.depth[index],
+                                           self._times_iso(index), self.place_codes[index])
+        ]
+
+    def get_hourly_distribution(self):
+        return self.cube.hourly_distribution()
+
+    def get_hourly_distribution_filtered(self, min_magnitude=0):
+        results = self.cube.hourly_distribution_filtered(min_magnitude)
+        if results is not None:
+            return results
+        hours = self.hour[self.mag >= min_magnitude]
+        counts = np.bincount(hours[hours >= 0], minlength=24)
+        return {str(hour): int(counts[hour]) for hour in range(24)}
+
+    def get_top_locations(self, limit=10):
+        return self.cube.top_locations(limit)
+
+
+class SnapshotStore:
+    """Holds the current snapshot and swaps in rebuilt ones atomically.
+
+    version is a callable giving the current dataset version; a snapshot
+    built from an older one is not served, and a rebuild is started.
+    """
+
+    def __init__(self, db_manager, enabled=None, version=None):
+        self.db_manager = db_manager
+        self.version = version
+        if enabled is None:
+            enabled = os.getenv('SNAPSHOT_ENABLED', 'false').lower() == 'true'
+        self.enabled = enabled
+        self._snapshot = None
+        # TileSource loaded only to serve map tiles while snapshots are disabled
+        self._tile_snapshot = None
+        self._build_lock = threading.Lock()
+
+    def _is_current(self, snapshot):
+        return self.version is None or snapshot.version is None or snapshot.version >= self.version()
+
+    def current(self):
+        """The loaded snapshot, or None when disabled, not built yet or stale"""
+        snapshot = self._snapshot if self.enabled else None
+        if snapshot is not None and not self._is_current(snapshot):
+            # Another worker uploaded; the database serves until the rebuild lands
+            self.rebuild_async()
+            return None
+        return snapshot
+
+    def reader(self):
+        """Object to run read queries against: the snapshot if loaded, else the database"""
+        return self.current() or self.db_manager
+
+    def tile_source(self):
+        """Snapshot to cut map tiles from, None until one of the current version is loaded.
+
+        Tiles need the events in memory, so with snapshots disabled a
+        TileSource of just their positions is loaded on a background thread
+        at first use and again after each upload.
+        """
+        if self.enabled:
+            return self.current()
+        snapshot = self._tile_snapshot
+        if snapshot is not None and self._is_current(snapshot):
+            return snapshot
+        self._start(self._load_tiles)
+        return None
+
+    def _start(self, target):
+        # A build already running publishes what this one would
+        if not self._build_lock.locked():
+            threading.Thread(target=target, daemon=True).start()
+
+    def _load_tiles(self):
+        with self._build_lock:
+            if self._tile_snapshot is not None and self._is_current(self._tile_snapshot):
+                return
+            start_time = time.time()
+            snapshot = TileSource.build(self.db_manager)
+            if snapshot is None:
+                print("❌ Map tile source load failed")
+                return
+            self._tile_snapshot = snapshot
+            print(f"✅ Map tile source loaded: {len(snapshot)} records in {time.time() - start_time:.2f}s")
+
+    def rebuild(self):
+        """Load a fresh snapshot and publish it; readers keep the old one meanwhile.
+
+        An upload landing during the load makes the new snapshot stale at
+        once, so loading repeats until the snapshot is of the current version
+        or a load brings no newer version than the last.
+        """
+        if not self.enabled:
+            return False
+        with self._build_lock:
+            while self._snapshot is None or not self._is_current(self._snapshot):
+                start_time = time.time()
+                snapshot = EarthquakeSnapshot.build(self.db_manager)
+                if snapshot is None:
+                    print("❌ Snapshot rebuild failed, keeping previous snapshot")
+                    return False
+                previous, self._snapshot = self._snapshot, snapshot
+                print(f"✅ Snapshot loaded: {len(snapshot)} records in {time.time() - start_time:.2f}s")
+                if previous is not None and snapshot.version == previous.version:
+                    break
+            return True
+
+    def rebuild_async(self):
+        """Rebuild in a background thread"""
+        if self.enabled:
+            # A rebuild already running loads again if its snapshot is stale
+            self._start(self.rebuild)
+        else:
+            # Tiles reload from the new data on next use
+            self._tile_snapshot = None
+
+    def get_stats(self):
+        snapshot = self._snapshot
+        return {
+            'enabled': self.enabled,
+            'loaded': snapshot is not None,
+            'records': len(snapshot) if snapshot is not None else 0,
+            'distinct_places': len(snapshot.places) if snapshot is not None else 0,
+            'built_at': snapshot.built_at if snapshot is not None else None,
+            'version': snapshot.version if snapshot is not None else None,
+        }
@@ -0,0 +1,106 @@
+import math
+import numpy as np
+
+EARTH_RADIUS_KM = 6371
+# Farthest two points on the sphere can be apart
+MAX_DISTANCE_KM = math.pi * EARTH_RADIUS_KM
+
+
+def bounding_box(lat, lon, radius_km):
+    """Latitude range and longitude ranges enclosing a search circle.
+
+    Returns (min_lat, max_lat, lon_ranges). lon_ranges is a list of (low, high)
+    pairs, two when the circle crosses the antimeridian, or None when it
+    covers a pole and every longitude has to be considered.
+    """
+    angular = radius_km / EARTH_RADIUS_KM
+    # A hair of slack so boundary points survive floating point error
+    delta_lat = math.degrees(angular) + 1e-9
+    min_lat, max_lat = lat - delta_lat, lat + delta_lat
+    if min_lat <= -90 or max_lat >= 90:
+        return max(min_lat, -90.0), min(max_lat, 90.0), None
+
+    delta_lon = math.degrees(math.asin(min(1.0, math.sin(angular) / math.cos(math.radians(lat))))) + 1e-9
+    low, high = lon - delta_lon, lon + delta_lon
+    if high - low >= 360:
+        return min_lat, max_lat, None
+    if low < -180:
+        return min_lat, max_lat, [(low + 360, 180.0), (-180.0, high)]
+    if high > 180:
+        return min_lat, max_lat, [(low, 180.0), (-180.0, high - 360)]
+    return min_lat, max_lat, [(low, high)]
+
+
+def haversine_km(lat, lon, latitudes, longitudes):
+    """Great-circle distance from one point to arrays of points"""
+    lat0, lon0 = np.radians(lat), np.radians(lon)
+    lat_rad, lon_rad = np.radians(latitudes), np.radians(longitudes)
+    a = (np.sin((lat_rad - lat0) / 2) ** 2
+         + np.cos(lat0) * np.cos(lat_rad) * np.sin((lon_rad - lon0) / 2) ** 2)
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0, 1)))
+
+
+class GeoGridIndex:
+    """Fixed lat/lon grid over a set of points.
+
+    Point indices are sorted by cell, row-major, with an offset table per cell,
+    so a longitude range within one grid row is a single contiguous slice. A
+    radius query only touches the cells overlapping the circle's bounding box
+    and refines those candidates with a vectorized haversine.
+    """
+
+    def __init__(self, latitudes, longitudes, cell_degrees=1.0):
+        self.latitudes = np.asarray(latitudes, dtype=np.float64)
+        self.longitudes = np.asarray(longitudes, dtype=np.float64)
+        self.cell_degrees = cell_degrees
+        self.n_rows = int(math.ceil(180 / cell_degrees))
+        self.n_cols = int(math.ceil(360 / cell_degrees))
+
+        cell_ids = self._row(self.latitudes) * self.n_cols + self._col(self.longitudes)
+        self._order = np.argsort(cell_ids, kind='stable')
+        self._cell_start = np.searchsorted(cell_ids[self._order],
+                                           np.arange(self.n_rows * self.n_cols + 1))
+
+    def __len__(self):
+        return len(self.latitudes)
+
+    def _row(self, lat):
+        return np.clip(np.floor((np.asarray(lat) + 90) / self.cell_degrees), 0, self.n_rows - 1).astype(np.int64)
+
+    def _col(self, lon):
+        return np.clip(np.floor((np.asarray(lon) + 180) / self.cell_degrees), 0, self.n_cols - 1).astype(np.int64)
+
+    def _candidates(self, lat, lon, radius_km):
+        min_lat, max_lat, lon_ranges = bounding_box(lat, lon, radius_km)
+        if lon_ranges is None:
+            lon_ranges = [(-180.0, 180.0)]
+        slices = []
+        for row in range(int(self._row(min_lat)), int(self._row(max_lat)) + 1):
+            for low, high in lon_ranges:
+                first = row * self.n_cols + int(self._col(low))
+                last = row * self.n_cols + int(self._col(high))
+                slices.append(self._order[self._cell_start[first]:self._cell_start[last + 1]])
+        return np.concatenate(slices) if slices else np.empty(0, dtype=np.int64)
+
+    def query_radius(self, lat, lon, radius_km):
+        """Indices of points within radius_km and their distances, nearest first"""
+        candidates = self._candidates(lat, lon, radius_km)
+        distances = haversine_km(lat, lon, self.latitudes[candidates], self.longitudes[candidates])
+        keep = distances <= radius_km
+        candidates, distances = candidates[keep], distances[keep]
+        order = np.argsort(distances, kind='stable')
+        return candidates[order], distances[order]
+
+    def nearest(self, lat, lon, k):
+        """The k nearest points and their distances, nearest first"""
+        k = min(k, len(self))
+        if k <= 0:
+            return np.empty(0, dtype=np.int64), np.empty(0)
+        # Grow the search circle until it holds k points; everything inside a
+        # circle is enumerated, so its k closest are the global k nearest
+        radius_km = self.cell_degrees * EARTH_RADIUS_KM * math.pi / 180
+        while True:
+            index, distances = self.query_radius(lat, lon, radius_km)
+            if len(index) >= k or radius_km >= MAX_DISTANCE_KM:
+                return index[:k], distances[:k]
+            radius_km = min(radius_km * 2, MAX_DISTANCE_KM)
@@ -0,0 +1,132 @@
+import math
+import os
+import sqlite3
+from datetime import datetime
+import pandas as pd
+from database import DatabaseManager
+
+
+def _adapt_datetime(value):
+    # Fixed-width ISO text keeps string comparison and ordering chronological
+    return value.isoformat(sep=' ', timespec='microseconds')
+
+
+def _convert_datetime(value):
+    return datetime.fromisoformat(value.decode())
+
+
+sqlite3.register_adapter(datetime, _adapt_datetime)
+sqlite3.register_adapter(pd.Timestamp, _adapt_datetime)
+sqlite3.register_converter('DATETIME2', _convert_datetime)
+
+
+def _charindex(substring, text):
+    """T-SQL CHARINDEX: 1-based position, 0 when not found"""
+    if substring is None or text is None:
+        return None
+    return text.find(substring) + 1
+
+
+def _len(text):
+    """T-SQL LEN ignores trailing spaces"""
+    return None if text is None else len(text.rstrip(' '))
+
+
+def _params(params):
+    # Accept pyodbc style execute(sql, a, b) as well as execute(sql, (a, b))
+    if len(params) == 1 and isinstance(params[0], (list, tuple)):
+        return params[0]
+    return params
+
+
+class _SQLiteCursor(sqlite3.Cursor):
+    def execute(self, sql, *params):
+        return super().execute(sql, _params(params))
+
+
+class _SQLiteConnection(sqlite3.Connection):
+    def cursor(self, factory=_SQLiteCursor):
+        return super().cursor(factory)
+
+
+class SQLiteDatabaseManager(DatabaseManager):
+    """DatabaseManager backed by an embedded SQLite file.
+
+    Shares all query code with the SQL Server manager; only the connection and
+    the few T-SQL specific statements are overridden. Useful for offline runs,
+    single-node deployments and local performance tests.
+    """
+
+    def __init__(self, path=None):
+        self.path = path or os.getenv('SQLITE_PATH', 'earthquakes.db')
+        super().__init__()
+        print(f"✅ SQLite backend using {self.path}")
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, detect_types=sqlite3.PARSE_DECLTYPES,
+                               check_same_thread=False, timeout=30, factory=_SQLiteConnection)
+        # WAL lets readers run while an upload writes
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=NORMAL')
+        conn.create_function('CHARINDEX', 2, _charindex, deterministic=True)
+        conn.create_function('LEN', 1, _len, deterministic=True)
+        # Math functions are optional in SQLite builds
+        try:
+            conn.execute('SELECT ASIN(1), SQRT(1), POWER(1, 2), RADIANS(1), FLOOR(1.5)')
+        except sqlite3.OperationalError:
+            for name, func in (('ASIN', math.asin), ('SQRT', math.sqrt), ('COS', math.cos),
+                               ('SIN', math.sin), ('RADIANS', math.radians),
+                               ('FLOOR', math.floor)):
+                conn.create_function(name, 1, func, deterministic=True)
+            conn.create_function('POWER', 2, math.pow, deterministic=True)
+        return conn
+
+    def _limit_clause(self, limit):
+        return f"LIMIT {int(limit)}"
+
+    def _enable_bulk_insert(self, cursor):
+        # sqlite3 executemany is already a single prepared statement
+        pass
+
+    def _begin_transaction(self, cursor):
+        # sqlite3 only opens transactions implicitly before DML, so DDL would autocommit
+        cursor.execute("BEGIN")
+
+    def _rename_table(self, cursor, old, new):
+        cursor.execute(f"ALTER TABLE {old} RENAME TO {new}")
+
+    def _table_exists(self, cursor, table):
+        cursor.execute("SELECT name FROM sqlite_master WHERE type = 'table' AND name = ?", (table,))
+        return cursor.fetchone() is not None
+
+    def _staging_table_sql(self, staging):
+        return f"""
+            CREATE TABLE {staging} (
+                id NVARCHAR(50) PRIMARY KEY ON CONFLICT IGNORE,
+                time DATETIME2 NOT NULL,
+                latitude FLOAT NOT NULL,
+                longitude FLOAT NOT NULL,
+                depth FLOAT NOT NULL,
+                mag FLOAT NOT NULL,
+                place NVARCHAR(500) NOT NULL,
+                local_time DATETIME2,
+                hour_of_day INT,
+                day_of_week INT
+            )
+        """
+
+    def _merge_staging(self, cursor, staging):
+        # ON CONFLICT names the existing row by table name and the new one as excluded
+        predicate = self._changed_predicate('earthquakes_511610', 'excluded')
+        cursor.execute(f"""
+            INSERT INTO earthquakes_511610
+                (id, time, latitude, longitude, depth, mag, place, local_time, hour_of_day, day_of_week)
+            SELECT id, time, latitude, longitude, depth, mag, place, local_time, hour_of_day, day_of_week
+            FROM {staging} WHERE true
+            ON CONFLICT(id) DO UPDATE SET
+                time = excluded.time, latitude = excluded.latitude, longitude = excluded.longitude,
+                depth = excluded.depth, mag = excluded.mag, place = excluded.place,
+                local_time = excluded.local_time, hour_of_day = excluded.hour_of_day,
+                day_of_week = excluded.day_of_week
+            WHERE {predicate}
+        """)
@@ -0,0 +1,13 @@
+import os
+from database import DatabaseManager
+
+
+def create_database_manager(backend=None):
+    """Build the DatabaseManager for the configured DB_BACKEND (sqlserver or sqlite)"""
+    backend = (backend or os.getenv('DB_BACKEND', 'sqlserver')).lower()
+    if backend == 'sqlite':
+        from sqlite_database import SQLiteDatabaseManager
+        return SQLiteDatabaseManager()
+    if backend != 'sqlserver':
+        print(f"⚠️ Unknown DB_BACKEND '{backend}', using SQL Server")
+    return DatabaseManager()
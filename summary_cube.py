@@ -0,0 +1,96 @@
+import math
+import numpy as np
+import pandas as pd
+from histogram import DEPTH_BINS, bin_labels, validate_bins
+
+# Depth cells of the cube; the extra first cell keeps negative depths apart
+CUBE_DEPTH_BINS = [-math.inf] + DEPTH_BINS
+# No hour_of_day (timezone lookup failed)
+NO_HOUR = -1
+DIMENSIONS = ('hour_of_day', 'mag_bin', 'depth_bin', 'region')
+
+
+def fold_cells(low, high, count, edges, unit=''):
+    """Sum cells [low, high) into bins, None if any cell straddles a bin edge"""
+    edges = validate_bins(edges)
+    edge_array = np.asarray(edges, dtype=np.float64)
+    n_bins = len(edges) - 1
+    index = np.searchsorted(edge_array, low, side='right') - 1
+    inside = (index >= 0) & (index < n_bins)
+    within = inside & (high <= edge_array[np.clip(index + 1, 0, n_bins)])
+    outside = (high <= edge_array[0]) | (low >= edge_array[-1])
+    if not np.all(within | outside | (count == 0)):
+        return None
+    totals = np.bincount(index[within], weights=count[within], minlength=n_bins)
+    return {label: int(total) for label, total in zip(bin_labels(edges, unit), totals)}
+
+
+class SummaryCube:
+    """Event counts per hour_of_day x floor(mag) x depth cell x region.
+
+    The dashboard aggregates only change on upload, so they are answered by
+    summing these cells instead of scanning events. Magnitude cells are one
+    unit wide and depth cells follow CUBE_DEPTH_BINS; a request whose bins
+    would split a cell returns None so the caller can fall back to a scan.
+
+    A cube can also be a roll-up holding only some dimensions, as long as it
+    has the ones the called method needs.
+    """
+
+    def __init__(self, count, hour_of_day=None, mag_bin=None, depth_bin=None, region=None):
+        self.count = np.asarray(count, dtype=np.int64)
+        self.hour_of_day = None if hour_of_day is None else np.asarray(hour_of_day, dtype=np.int64)
+        self.mag_bin = None if mag_bin is None else np.asarray(mag_bin, dtype=np.int64)
+        self.depth_bin = None if depth_bin is None else np.asarray(depth_bin, dtype=np.int64)
+        self.region = None if region is None else np.asarray(region, dtype=object)
+
+    def __len__(self):
+        return len(self.count)
+
+    @classmethod
+    def from_rows(cls, rows, dimensions=DIMENSIONS):
+        """Build from rows of the dimension values followed by the event count"""
+        columns = list(zip(*rows)) or [()] * (len(dimensions) + 1)
+        return cls(columns[-1], **dict(zip(dimensions, columns)))
+
+    @classmethod
+    def from_columns(cls, hour, mag, depth, regions):
+        """Aggregate per-event arrays; hour uses NO_HOUR for missing values"""
+        frame = pd.DataFrame({
+            'hour_of_day': np.asarray(hour, dtype=np.int64),
+            'mag_bin': np.floor(mag).astype(np.int64),
+            'depth_bin': np.searchsorted(np.asarray(CUBE_DEPTH_BINS), depth, side='right') - 1,
+            'region': regions,
+        })
+        cells = frame.groupby(list(DIMENSIONS), sort=False).size()
+        keys = cells.index.to_frame(index=False)
+        return cls(cells.to_numpy(), **{dimension: keys[dimension] for dimension in DIMENSIONS})
+
+    def magnitude_distribution(self, edges):
+        return fold_cells(self.mag_bin, self.mag_bin + 1, self.count, edges)
+
+    def depth_distribution(self, edges):
+        cell_edges = np.asarray(CUBE_DEPTH_BINS, dtype=np.float64)
+        return fold_cells(cell_edges[self.depth_bin], cell_edges[self.depth_bin + 1],
+                          self.count, edges, unit='km')
+
+    def _hour_counts(self, mask):
+        mask = mask & (self.hour_of_day != NO_HOUR)
+        return np.bincount(self.hour_of_day[mask], weights=self.count[mask], minlength=24).astype(np.int64)
+
+    def hourly_distribution(self):
+        counts = self._hour_counts(np.ones(len(self), dtype=bool))
+        return {str(hour): int(count) for hour, count in enumerate(counts) if count}
+
+    def hourly_distribution_filtered(self, min_magnitude=0):
+        keep = self.mag_bin >= min_magnitude
+        drop = self.mag_bin + 1 <= min_magnitude
+        if not np.all(keep | drop):
+            return None
+        counts = self._hour_counts(keep)
+        return {str(hour): int(counts[hour]) for hour in range(24)}
+
+    def top_locations(self, limit=10):
+        totals = pd.Series(self.count).groupby(self.region).sum()
+        top = totals.sort_values(ascending=False, kind='stable').head(limit)
+        return [{'location': location, 'count': int(count)} for location, count in top.items()]
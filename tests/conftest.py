@@ -0,0 +1,80 @@
+import io
+import os
+import sys
+import numpy as np
+import pandas as pd
+import pytest
+
+# The suite runs on the embedded SQLite backend; no SQL Server or Redis needed
+os.environ.setdefault('DB_BACKEND', 'sqlite')
+os.environ.setdefault('SNAPSHOT_ENABLED', 'false')
+os.environ.setdefault('CACHE_WARMUP_ENABLED', 'false')
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from storage import create_database_manager
+from ingest import CsvIngestStream
+from snapshot import EarthquakeSnapshot
+
+TOWNS = ['Volcano, Alaska', 'Ferndale, California', 'Hilo, Hawaii', 'Ridgecrest, CA',
+         'Tokyo, Japan', 'Lima, Peru', 'Santiago, Chile', 'Fiji region']
+
+
+def make_events(n, seed=0, first_id=0):
+    """n reproducible catalog rows with the columns of a USGS CSV"""
+    rng = np.random.default_rng(seed)
+    start = pd.Timestamp('2025-01-01', tz='UTC')
+    return pd.DataFrame({
+        'id': [f'ev{i:05d}' for i in range(first_id, first_id + n)],
+        'time': (start + pd.to_timedelta(rng.integers(0, 30 * 86400, n), unit='s'))
+        .strftime('%Y-%m-%dT%H:%M:%S.000Z'),
+        'latitude': np.round(rng.uniform(-60, 60, n), 4),
+        'longitude': np.round(rng.uniform(-180, 180, n), 4),
+        'depth': np.round(rng.uniform(-2, 400, n), 2),
+        # A few repeated magnitudes exercise the id tie-break of the sort order
+        'mag': np.round(rng.choice(np.arange(0, 9, 0.5), n) + rng.choice([0, 0.25], n), 2),
+        'place': [f"{rng.integers(1, 90)} km N of {TOWNS[i % len(TOWNS)]}" for i in range(n)],
+    })
+
+
+def csv_stream(frame, chunk_size=None):
+    """frame as the chunk stream an uploaded CSV produces"""
+    return CsvIngestStream(io.BytesIO(frame.to_csv(index=False).encode()), chunk_size=chunk_size)
+
+
+def new_database(path):
+    os.environ['SQLITE_PATH'] = str(path)
+    return create_database_manager()
+
+
+@pytest.fixture(scope='session')
+def events():
+    return make_events(400)
+
+
+@pytest.fixture(scope='session')
+def db(tmp_path_factory, events):
+    """A database loaded with events; tests must not change it"""
+    manager = new_database(tmp_path_factory.mktemp('db') / 'earthquakes.db')
+    ok, message = manager.create_table_and_upload_data(csv_stream(events, chunk_size=150))
+    assert ok, message
+    return manager
+
+
+@pytest.fixture(scope='session')
+def snapshot(db):
+    return EarthquakeSnapshot.build(db)
+
+
+@pytest.fixture
+def empty_db(tmp_path):
+    return new_database(tmp_path / 'earthquakes.db')
+
+
+@pytest.fixture(scope='session')
+def web(tmp_path_factory, events):
+    """The app module, serving its own database loaded with events"""
+    os.environ['SQLITE_PATH'] = str(tmp_path_factory.mktemp('web') / 'earthquakes.db')
+    import app
+    ok, message = app.db_manager.create_table_and_upload_data(csv_stream(events, chunk_size=150))
+    assert ok, message
+    return app
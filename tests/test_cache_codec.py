@@ -0,0 +1,84 @@
+import json
+import pytest
+from cache_codec import COMPRESSORS, MAGIC, SERIALIZERS, CacheCodec
+from pagination import Page
+from redis_cache import RedisCache
+from tiered_cache import _dump, _load
+
+VALUE = {
+    'data': [{'id': f'ev{i}', 'magnitude': i / 4, 'place': 'Hilo, Hawaii', 'time': None} for i in range(200)],
+    'nested': {'0-1': 3, '1-2': 0},
+    'empty': [],
+}
+
+
+@pytest.mark.parametrize('serializer', sorted(SERIALIZERS))
+@pytest.mark.parametrize('compression', sorted(COMPRESSORS))
+def test_round_trip(serializer, compression):
+    codec = CacheCodec(serializer, compression, min_bytes=0)
+    data = codec.encode(VALUE)
+    assert data.startswith(MAGIC)
+    assert codec.decode(data) == VALUE
+
+
+def test_any_writer_format_can_be_read():
+    reader = CacheCodec('json', 'none')
+    for serializer in SERIALIZERS:
+        for compression in COMPRESSORS:
+            assert reader.decode(CacheCodec(serializer, compression, min_bytes=0).encode(VALUE)) == VALUE
+
+
+def test_small_values_stay_uncompressed():
+    codec = CacheCodec('json', 'zlib', min_bytes=1024)
+    assert codec.encode({'a': 1})[len(MAGIC) + 1:len(MAGIC) + 2] == b'n'
+    assert codec.encode(VALUE)[len(MAGIC) + 1:len(MAGIC) + 2] == b'z'
+
+
+def test_legacy_json_is_read():
+    codec = CacheCodec()
+    assert codec.decode(json.dumps(VALUE).encode()) == VALUE
+    assert codec.decode(json.dumps(VALUE)) == VALUE
+    assert codec.get_stats()['legacy_decoded'] == 2
+
+
+def test_unknown_format_is_an_error():
+    with pytest.raises(ValueError):
+        CacheCodec().decode(MAGIC + b'?n{}')
+    with pytest.raises(ValueError):
+        CacheCodec('pickle')
+
+
+def test_page_survives_a_redis_round_trip():
+    page = Page([{'id': 'ev1'}], next_after='token', total=7)
+    stored = CacheCodec(min_bytes=0).decode(CacheCodec(min_bytes=0).encode(_dump(page, 123.0)))
+    loaded = _load(stored)
+    assert isinstance(loaded, Page)
+    assert (loaded, loaded.next_after, loaded.total) == (page, 'token', 7)
+
+
+class _DictRedis:
+    """Just enough of a redis client to hold bytes"""
+
+    def __init__(self):
+        self.values = {}
+
+    def setex(self, key, expire_time, value):
+        self.values[key] = value
+        return True
+
+    def get(self, key):
+        return self.values.get(key)
+
+    def mget(self, keys):
+        return [self.values.get(key) for key in keys]
+
+
+def test_redis_cache_stores_codec_bytes(monkeypatch):
+    monkeypatch.setattr(RedisCache, '__init__', lambda self: None)
+    cache = RedisCache()
+    cache.codec = CacheCodec(min_bytes=0)
+    cache.redis_client = _DictRedis()
+    assert cache.set('key', VALUE)
+    assert cache.redis_client.values['key'].startswith(MAGIC)
+    assert cache.get('key') == VALUE
+    assert cache.get_many(['key', 'missing']) == [VALUE, None]
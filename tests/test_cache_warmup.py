@@ -0,0 +1,53 @@
+from cache_warmup import LOCK_PREFIX, CacheWarmer
+from memory_cache import MemoryCache
+from tiered_cache import MEMORY, TieredCache
+from test_single_flight import _LockingRedis
+
+WIDGETS = [{'widget': 'square', 'params': {'n': n}} for n in (2, 3, 4)]
+
+
+def _warmer(budget=60, redis=None):
+    redis = redis or _LockingRedis()
+    cache = TieredCache(MemoryCache(), redis, version=lambda: 1)
+
+    @cache.loader('square', ttl=60)
+    def square(n):
+        return {'square': n * n}
+
+    def resolve(widget):
+        if widget['widget'] != 'square':
+            raise ValueError(f"Unknown widget: {widget['widget']}")
+        return square, (widget['params']['n'],)
+
+    widgets = WIDGETS + [{'widget': 'broken'}]
+    return CacheWarmer(resolve, widgets, budget, enabled=True, lock=redis, version=lambda: 1), square
+
+
+def test_run_precomputes_every_widget():
+    warmer, square = _warmer()
+    warmer.run('startup', exclusive=True)
+    progress = warmer.get_progress()
+    assert (progress['state'], progress['total'], progress['computed'], progress['failed']) == ('done', 4, 3, 1)
+    assert all(square.load(n).served_by == MEMORY for n in (2, 3, 4))
+
+
+def test_one_worker_warms_each_version():
+    redis = _LockingRedis()
+    first, _ = _warmer(redis=redis)
+    second, square = _warmer(redis=redis)
+    first.run('startup', exclusive=True)
+    assert LOCK_PREFIX + '1' in redis.values
+    second.run('startup', exclusive=True)
+    assert second.get_progress()['state'] == 'elsewhere'
+    # A manual run isn't exclusive, and finds the first worker's results in Redis
+    second.run('manual')
+    assert (second.get_progress()['state'], second.get_progress()['computed']) == ('done', 0)
+    assert square.load(2).served_by == MEMORY
+
+
+def test_budget_ends_the_run():
+    warmer, _ = _warmer(budget=0)
+    warmer.run('startup')
+    progress = warmer.get_progress()
+    assert progress['state'] == 'budget_exhausted'
+    assert progress['skipped'] == progress['total'] == 4
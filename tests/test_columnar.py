@@ -0,0 +1,47 @@
+import json
+import struct
+import numpy as np
+import pandas as pd
+from columnar import MAGIC, MEDIA_TYPE
+
+DTYPES = {'f4': '<f4', 'f8': '<f8', 'u4': '<u4'}
+
+
+def _decode(body):
+    """The columns of an encoded map, read the way visualize.html reads them"""
+    assert body[:len(MAGIC)] == MAGIC
+    (header_length,) = struct.unpack_from('<I', body, len(MAGIC))
+    header = json.loads(body[len(MAGIC) + 4:len(MAGIC) + 4 + header_length])
+    data_start = (len(MAGIC) + 4 + header_length + 7) // 8 * 8
+    columns = {}
+    for column in header['columns']:
+        # Typed arrays need their offset aligned to the element size
+        assert (data_start + column['offset']) % 8 == 0
+        columns[column['name']] = np.frombuffer(body, DTYPES[column['type']], header['count'],
+                                                data_start + column['offset'])
+    return header, columns
+
+
+def test_columnar_map_holds_the_json_rows(web):
+    client = web.app.test_client()
+    params = {'min_magnitude': 4, 'limit': 50}
+    rows = client.get('/api/earthquakes_map', query_string=params).get_json()['data']
+    response = client.get('/api/earthquakes_map', query_string={**params, 'format': 'columnar'})
+    assert response.mimetype == MEDIA_TYPE
+
+    header, columns = _decode(response.get_data())
+    assert header['count'] == len(rows) == 50
+    assert header['ids'] == [row['id'] for row in rows]
+    assert 'next_after' in header and 'served_by' in header
+    assert [header['places'][code] for code in columns['place']] == [row['place'] for row in rows]
+    for name in ('latitude', 'longitude', 'depth', 'magnitude'):
+        assert np.array_equal(columns[name], np.array([row[name] for row in rows], dtype=np.float32))
+    times = pd.to_datetime([row['time'] for row in rows])
+    assert np.array_equal(columns['time'], times.values.astype('datetime64[ms]').astype(np.int64).astype(float))
+
+
+def test_accept_header_selects_the_columnar_format(web):
+    response = web.app.test_client().get('/api/earthquakes_map', query_string={'limit': 5},
+                                         headers={'Accept': MEDIA_TYPE})
+    assert response.mimetype == MEDIA_TYPE
+    assert _decode(response.get_data())[0]['count'] == 5
@@ -0,0 +1,51 @@
+import sqlite3
+import pytest
+from connection_pool import ConnectionPool
+
+
+def _pool(**options):
+    return ConnectionPool(lambda: sqlite3.connect(':memory:', check_same_thread=False), **options)
+
+
+def test_fill_opens_min_size_connections():
+    pool = _pool(min_size=3, max_size=5)
+    assert pool.fill() == 3
+    assert pool.fill() == 0
+    stats = pool.get_stats()
+    assert (stats['size'], stats['idle'], stats['created']) == (3, 3, 3)
+
+
+def test_cursor_is_retired_with_its_checkout():
+    pool = _pool(min_size=1, max_size=1)
+    conn = pool.acquire()
+    cursor = conn.cursor()
+    cursor.execute("SELECT 1")
+    conn.close()
+    with pytest.raises(RuntimeError):
+        cursor.fetchall()
+    closed = pool.acquire().cursor()
+    closed.close()
+    with pytest.raises(RuntimeError):
+        closed.execute("SELECT 1")
+
+
+def test_cursor_settings_do_not_reach_the_next_checkout():
+    pool = _pool(min_size=1, max_size=1)
+    conn = pool.acquire()
+    conn.cursor().arraysize = 50
+    conn.close()
+    assert pool.acquire().cursor().arraysize == 1
+
+
+def test_closing_twice_does_not_release_the_next_checkout():
+    pool = _pool(min_size=1, max_size=1, checkout_timeout=0.1)
+    first = pool.acquire()
+    first.close()
+    second = pool.acquire()
+    first.close()
+    assert pool.get_stats()['in_use'] == 1
+    with pytest.raises(TimeoutError):
+        pool.acquire()
+    with pytest.raises(RuntimeError):
+        first.cursor()
+    assert second.cursor().execute("SELECT 1").fetchall() == [(1,)]
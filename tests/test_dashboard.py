@@ -0,0 +1,46 @@
+def test_widgets_match_their_endpoints(web):
+    client = web.app.test_client()
+    response = client.post('/api/dashboard', json={'widgets': [
+        'hourly_distribution',
+        {'widget': 'top_locations', 'params': {'limit': 5}},
+        {'id': 'strong', 'widget': 'earthquakes_map', 'params': {'min_magnitude': 6, 'limit': 20}},
+        {'id': 'depths', 'widget': 'histogram', 'params': {'column': 'depth'}},
+    ]})
+    assert response.status_code == 200
+    widgets = response.get_json()['widgets']
+    assert set(widgets) == {'hourly_distribution', 'top_locations', 'strong', 'depths'}
+
+    def data(url, **params):
+        return client.get(url, query_string=params).get_json()['data']
+    assert widgets['hourly_distribution']['data'] == data('/api/hourly_distribution')
+    assert widgets['top_locations']['data'] == data('/api/top_locations', limit=5)
+    assert widgets['strong']['data'] == data('/api/earthquakes_map', min_magnitude=6, limit=20)
+    assert widgets['strong']['count'] == len(widgets['strong']['data'])
+    assert widgets['depths']['data'] == data('/api/histogram', column='depth')
+
+
+def test_invalid_widget_lists_are_rejected(web):
+    client = web.app.test_client()
+    for widgets in (['hourly_distribution', 'hourly_distribution'], ['no_such_widget'],
+                    ['hourly_distribution'] * (web.MAX_DASHBOARD_WIDGETS + 1), 'top_locations'):
+        response = client.post('/api/dashboard', json={'widgets': widgets})
+        assert response.status_code == 400
+        assert response.get_json()['error']
+
+
+def test_malformed_bodies_get_explicit_errors(web):
+    client = web.app.test_client()
+    for body in ('not json', '[1, 2]'):
+        response = client.post('/api/dashboard', data=body, content_type='application/json')
+        assert response.status_code == 400
+        assert 'JSON object' in response.get_json()['error']
+    response = client.post('/api/dashboard', data='widgets=x')
+    assert response.status_code == 400
+
+    for widgets, message in (([5], 'must be a name or an object'), ([[5]], 'must be a name or an object'),
+                             ([{'widget': ['top_locations']}], 'Unknown widget'),
+                             ([{'widget': 'top_locations', 'params': [5]}], 'must be an object'),
+                             ([{'widget': 'top_locations', 'params': {'limit': [5]}}], 'Invalid params')):
+        response = client.post('/api/dashboard', json={'widgets': widgets})
+        assert response.status_code == 400
+        assert message in response.get_json()['error']
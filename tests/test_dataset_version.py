@@ -0,0 +1,76 @@
+from dataset_version import REDIS_KEY, DatasetVersion
+from memory_cache import MemoryCache
+from tiered_cache import MEMORY, ORIGIN, TieredCache
+from test_tiered_cache import _DictRedis
+
+
+class _VersionRedis(_DictRedis):
+    """_DictRedis with the counter and sweep calls DatasetVersion makes"""
+
+    def set_max(self, key, value):
+        if self.values.get(key) is None or value > self.values[key]:
+            self.values[key] = value
+            return True
+        return False
+
+    def scan_delete(self, pattern, should_delete=None, batch_size=500):
+        return 0
+
+
+class _Meta:
+    """dataset_meta holding a version another worker may have bumped"""
+
+    def __init__(self, version):
+        self.version = version
+
+    def get_dataset_version(self):
+        return self.version
+
+
+def test_mirror_that_fell_behind_is_repaired_from_dataset_meta():
+    redis, meta = _VersionRedis(), _Meta(3)
+    version = DatasetVersion(meta, redis, check_interval=0, meta_check_interval=3600)
+    changes = []
+    version.on_change(lambda old, new: changes.append((old, new)))
+
+    # No mirror yet: dataset_meta is read and copied to Redis
+    assert version.current() == 3
+    assert redis.values[REDIS_KEY] == 3
+
+    # A publish another worker made reaches this one through the mirror
+    redis.set_max(REDIS_KEY, 4)
+    assert version.current() == 4
+    assert changes == [(3, 4)]
+
+    # A publish to Redis was lost; the next dataset_meta check repairs it
+    meta.version = 5
+    assert version.current() == 4
+    version._meta_checked_at = 0
+    assert version.current() == 5
+    assert redis.values[REDIS_KEY] == 5
+    assert changes == [(3, 4), (4, 5)]
+
+
+def test_older_versions_never_lower_the_mirror():
+    redis = _VersionRedis()
+    redis.set_max(REDIS_KEY, 7)
+    version = DatasetVersion(_Meta(6), redis, check_interval=0, meta_check_interval=0)
+    assert version.current() == 7
+    version.publish(6)
+    assert redis.values[REDIS_KEY] == 7
+
+
+def test_cache_keys_follow_the_version():
+    redis, meta = _VersionRedis(), _Meta(1)
+    version = DatasetVersion(meta, redis, check_interval=0, meta_check_interval=0)
+    cache = TieredCache(MemoryCache(), redis, version=version.current)
+
+    @cache.loader('total', ttl=60)
+    def total():
+        return {'version': meta.version}
+
+    assert total.load() == ({'version': 1}, ORIGIN)
+    assert total.load().served_by == MEMORY
+    meta.version = 2
+    # Entries of version 1 can no longer be reached
+    assert total.load() == ({'version': 2}, ORIGIN)
@@ -0,0 +1,30 @@
+import json
+
+NDJSON = {'Accept': 'application/x-ndjson'}
+
+
+def _lines(response):
+    return [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+
+
+def test_stream_holds_the_same_rows_as_the_json_response(web):
+    client = web.app.test_client()
+    body = {'min_magnitude': 3, 'max_magnitude': 6}
+    streamed = client.post('/api/magnitude_search', json=body, headers=NDJSON)
+    assert streamed.mimetype == 'application/x-ndjson'
+    assert _lines(streamed) == client.post('/api/magnitude_search', json=body).get_json()['results']
+
+    limited = client.post('/api/place_search', json={'place_substring': 'alaska', 'limit': 3}, headers=NDJSON)
+    assert [row['place'] for row in _lines(limited)] == \
+        [row['place'] for row in web.db_manager.search_by_place('alaska', 3)]
+
+
+def test_failed_stream_ends_with_an_error_line(web):
+    def rows():
+        yield {'id': 'ev1'}
+        raise RuntimeError('connection lost')
+
+    with web.app.test_request_context():
+        response = web._ndjson_response(rows())
+        lines = [json.loads(line) for line in ''.join(response.response).splitlines()]
+    assert lines == [{'id': 'ev1'}, {'error': 'connection lost'}]
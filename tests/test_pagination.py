@@ -0,0 +1,76 @@
+import pytest
+from pagination import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE, decode_after, encode_after, make_page, parse_page_args
+
+
+def test_token_round_trip():
+    token = encode_after('2025-01-03T04:05:06', 'ev00042')
+    assert decode_after(token) == ('2025-01-03T04:05:06', 'ev00042')
+    assert decode_after(encode_after(4.5, 'ev1')) == (4.5, 'ev1')
+
+
+@pytest.mark.parametrize('token', ['not a token', encode_after(1, 2), 'W10', ''])
+def test_malformed_token_is_rejected(token):
+    with pytest.raises(ValueError):
+        decode_after(token)
+
+
+def test_make_page_trims_extra_row_into_token():
+    rows = [{'id': f'ev{i}', 'magnitude': 5 - i} for i in range(4)]
+    page = make_page(rows, 3, 'mag', total=10)
+    assert page == rows[:3]
+    assert decode_after(page.next_after) == (3, 'ev2')
+    assert page.total == 10
+    assert make_page(rows, 4, 'mag').next_after is None
+
+
+def test_parse_page_args():
+    token = encode_after(1.5, 'ev1')
+    assert parse_page_args({'limit': '10', 'after': token, 'include_total': 'true'}) == (10, token, True)
+    assert parse_page_args({}) == (DEFAULT_PAGE_SIZE, None, False)
+    assert parse_page_args({'limit': '0'})[0] == DEFAULT_PAGE_SIZE
+    assert parse_page_args({}, default_limit=None)[0] is None
+    assert parse_page_args({'limit': 10 ** 9})[0] == MAX_PAGE_SIZE
+    with pytest.raises(ValueError):
+        parse_page_args({'after': 'bogus'})
+    with pytest.raises(ValueError):
+        parse_page_args({'limit': 'ten'})
+
+
+def _all_pages(search, limit):
+    rows, after = [], None
+    while True:
+        page = search(limit, after)
+        rows.extend(page)
+        if page.next_after is None:
+            return rows
+        after = page.next_after
+
+
+@pytest.mark.parametrize('reader', ['db', 'snapshot'])
+@pytest.mark.parametrize('search', [
+    lambda reader, limit, after: reader.search_by_magnitude(2, 6, limit, after),
+    lambda reader, limit, after: reader.search_by_time_range('2025-01-05', '2025-01-20', limit, after),
+    lambda reader, limit, after: reader.search_by_place('alaska', limit, after),
+    lambda reader, limit, after: reader.get_earthquakes_past_30_days(4, limit, after),
+], ids=['magnitude', 'time', 'place', 'map'])
+def test_pages_add_up_to_the_full_result(request, reader, search):
+    reader = request.getfixturevalue(reader)
+    full = search(reader, None, None)
+    assert len(full) > 7
+    paged = _all_pages(lambda limit, after: search(reader, limit, after), 7)
+    assert paged == full
+
+
+def test_total_counts_every_match(db):
+    page = db.search_by_magnitude(2, 6, 5, None, True)
+    assert len(page) == 5
+    assert page.total == len(db.search_by_magnitude(2, 6))
+
+
+def test_total_is_counted_once_per_dataset(db):
+    first = db.search_by_magnitude(2, 6, 5, None, True)
+    assert db.search_by_magnitude(2, 6, 5, first.next_after, True).total == first.total
+    assert len(db._totals) == 1
+    db.clear_dataset_caches()
+    assert db._totals == {}
+
@@ -0,0 +1,22 @@
+from conftest import csv_stream, make_events
+
+
+def test_sample_is_reproducible_and_drawn_from_the_table(db, events):
+    sample = db.get_random_earthquakes(50, seed=11)
+    assert len(sample) == 50
+    assert db.get_random_earthquakes(50, seed=11) == sample
+    assert db.get_random_earthquakes(50, seed=12) != sample
+    assert {row['id'] for row in sample} <= set(events['id'])
+    # One batch per id list still returns every draw, repeats included
+    assert db.get_random_earthquakes(50, seed=11, batch_size=7) == sample
+
+
+def test_sample_sees_rows_replaced_after_the_ids_were_cached(empty_db):
+    ok, message = empty_db.create_table_and_upload_data(csv_stream(make_events(20)))
+    assert ok, message
+    assert len(empty_db.get_random_earthquakes(10, seed=1)) == 10
+    # A full reload replaces every id behind the cached id array
+    ok, message = empty_db.create_table_and_upload_data(csv_stream(make_events(20, first_id=100)))
+    assert ok, message
+    assert {row['id'] for row in empty_db.get_random_earthquakes(30, seed=1)} <= \
+        set(make_events(20, first_id=100)['id'])
@@ -0,0 +1,82 @@
+import pytest
+from memory_cache import MemoryCache
+from pagination import Page
+from range_cache import MAGNITUDE_RANGES, RADIUS_RANGES, TIME_RANGES, RangeIndex
+from tiered_cache import ORIGIN, SUBSUMED, TieredCache
+
+
+class _NoRedis:
+    """Redis tier that is down: every read misses and locks are granted"""
+
+    def get(self, key):
+        return None
+
+    def set(self, key, value, expire_time=300, only_if_missing=False):
+        return False
+
+    def acquire_lock(self, name, timeout):
+        return True, None
+
+    def release_lock(self, name, token):
+        return False
+
+
+def test_index_finds_covering_ranges_smallest_first():
+    index = RangeIndex(MAGNITUDE_RANGES)
+    index.remember('wide', (0, 10), Page([{}] * 5))
+    index.remember('narrow', (2, 6), Page([{}] * 3))
+    index.remember('paged', (0, 10, 2), Page([{}] * 2, next_after='token'))
+    assert index.covering('new', (3, 5)) == ['narrow', 'wide']
+    assert index.covering('new', (1, 5)) == ['wide']
+    assert index.covering('new', (5, 11)) == []
+    index.forget('wide')
+    assert index.covering('new', (1, 5)) == []
+
+
+def test_radius_containment():
+    assert RADIUS_RANGES.contains((35.0, -118.0, 500.0), (35.5, -118.0, 100.0))
+    assert not RADIUS_RANGES.contains((35.0, -118.0, 100.0), (36.0, -118.0, 100.0))
+
+
+@pytest.mark.parametrize('kind, search, wide, narrow', [
+    (MAGNITUDE_RANGES, 'search_by_magnitude', (0, 10), (3, 5.25)),
+    (MAGNITUDE_RANGES, 'search_by_magnitude', (0, 10), (3, 5.25, 4, None, True)),
+    (TIME_RANGES, 'search_by_time_range', ('2025-01-01', '2025-02-01'),
+     ('2025-01-04T06:00:00Z', '2025-01-09', 5, None, True)),
+])
+def test_select_matches_a_direct_query(snapshot, kind, search, wide, narrow):
+    rows = getattr(snapshot, search)(*wide)
+    expected = getattr(snapshot, search)(*narrow)
+    selected = kind.select(rows, narrow)
+    assert selected == expected
+    assert selected.next_after == expected.next_after
+    assert selected.total == expected.total
+
+    # The token of a subsumed page resumes like one from the reader
+    if expected.next_after:
+        resumed = (*narrow[:3], expected.next_after, False)
+        assert kind.select(rows, resumed) == getattr(snapshot, search)(*resumed)
+
+
+def test_radius_select_matches_a_direct_query(snapshot):
+    rows = snapshot.search_by_location(20.0, 140.0, 3000)
+    assert RADIUS_RANGES.select(rows, (21.0, 141.0, 1000)) == snapshot.search_by_location(21.0, 141.0, 1000)
+
+
+def test_loader_answers_narrower_ranges_from_a_cached_one(snapshot):
+    cache = TieredCache(MemoryCache(), _NoRedis())
+    calls = []
+
+    @cache.loader('magnitude', ttl=600, ranges=MAGNITUDE_RANGES)
+    def load_magnitude(min_mag, max_mag, limit=None, after=None, include_total=False):
+        calls.append((min_mag, max_mag))
+        return snapshot.search_by_magnitude(min_mag, max_mag, limit, after, include_total)
+
+    assert load_magnitude.load(1, 8).served_by == ORIGIN
+    narrow = load_magnitude.load(2, 4.5, 3, None, True)
+    assert narrow.served_by == SUBSUMED
+    assert narrow.value == snapshot.search_by_magnitude(2, 4.5, 3)
+    assert narrow.value.total == len(snapshot.search_by_magnitude(2, 4.5))
+    # Wider than anything cached goes to the loader
+    assert load_magnitude.load(0, 9).served_by == ORIGIN
+    assert calls == [(1, 8), (0, 9)]
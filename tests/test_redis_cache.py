@@ -0,0 +1,70 @@
+from redis_cache import RedisCache
+
+
+class _CountingClient:
+    """redis client holding bytes in a dict and counting round trips"""
+
+    def __init__(self):
+        self.values = {}
+        self.round_trips = 0
+
+    def mget(self, keys):
+        self.round_trips += 1
+        return [self.values.get(key) for key in keys]
+
+    def setex(self, key, expire_time, value):
+        self.round_trips += 1
+        self.values[key] = value
+        return True
+
+    def pipeline(self, transaction=True):
+        return _Pipeline(self)
+
+
+class _Pipeline:
+    def __init__(self, client):
+        self.client = client
+        self.commands = []
+
+    def setex(self, key, expire_time, value):
+        self.commands.append((key, value))
+
+    def execute(self):
+        self.client.round_trips += 1
+        self.client.values.update(self.commands)
+        return [True] * len(self.commands)
+
+
+def _cache():
+    cache = RedisCache(connect=False)
+    cache.redis_client = _CountingClient()
+    return cache
+
+
+def test_many_keys_take_one_round_trip_each_way():
+    cache = _cache()
+    items = [(f'key{i}', {'id': f'ev{i}', 'magnitude': i / 2}) for i in range(50)]
+    assert cache.set_many(items, 60)
+    assert cache.redis_client.round_trips == 1
+
+    keys = [key for key, _ in items] + ['missing']
+    assert cache.get_many(keys) == [value for _, value in items] + [None]
+    assert cache.redis_client.round_trips == 2
+
+
+def test_nothing_to_do_and_no_redis_need_no_round_trip():
+    cache = _cache()
+    assert cache.get_many([]) == []
+    assert not cache.set_many([])
+    assert cache.redis_client.round_trips == 0
+
+    offline = RedisCache(connect=False)
+    assert offline.get_many(['a', 'b']) == [None, None]
+    assert not offline.set_many([('a', 1)])
+
+
+def test_undecodable_value_reads_as_a_miss():
+    cache = _cache()
+    cache.set_many([('good', [1, 2])], 60)
+    cache.redis_client.values['bad'] = b'\x00garbage'
+    assert cache.get_many(['good', 'bad']) == [[1, 2], None]
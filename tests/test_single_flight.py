@@ -0,0 +1,76 @@
+import threading
+import time
+from memory_cache import MemoryCache
+from tiered_cache import COALESCED, LOCK_PREFIX, MEMORY, ORIGIN, REDIS, TieredCache, _dump
+from test_tiered_cache import _DictRedis
+
+
+class _LockingRedis(_DictRedis):
+    """_DictRedis whose locks are held until released, as across workers"""
+
+    def acquire_lock(self, name, timeout):
+        if name in self.values:
+            return False, None
+        self.values[name] = 'token'
+        return True, 'token'
+
+    def lock_held(self, name):
+        return name in self.values
+
+    def release_lock(self, name, token):
+        return self.values.pop(name, None) is not None
+
+
+def test_concurrent_misses_compute_once():
+    cache = TieredCache(MemoryCache(), _LockingRedis())
+    entered, release = threading.Event(), threading.Event()
+    calls = []
+
+    @cache.loader('slow', ttl=60)
+    def slow():
+        calls.append(1)
+        entered.set()
+        release.wait(5)
+        return {'answer': 42}
+
+    results = []
+
+    def load():
+        results.append(slow.load())
+
+    leader = threading.Thread(target=load)
+    leader.start()
+    assert entered.wait(5)
+    followers = [threading.Thread(target=load) for _ in range(5)]
+    for thread in followers:
+        thread.start()
+    time.sleep(0.1)
+    release.set()
+    for thread in [leader, *followers]:
+        thread.join(5)
+
+    assert len(calls) == 1
+    assert [value for value, _ in results] == [{'answer': 42}] * 6
+    served_by = sorted(served for _, served in results)
+    assert served_by.count(ORIGIN) == 1
+    assert set(served_by) <= {ORIGIN, COALESCED, MEMORY}
+
+
+def test_miss_waits_for_the_worker_holding_the_lock():
+    redis = _LockingRedis()
+    cache = TieredCache(MemoryCache(), redis)
+
+    @cache.loader('shared', ttl=60)
+    def shared():
+        raise AssertionError('computed by the other worker')
+
+    key = shared.key()
+    redis.acquire_lock(LOCK_PREFIX + key, 30)
+
+    def other_worker():
+        time.sleep(0.1)
+        redis.set(key, _dump({'from': 'other'}, time.time() + 60))
+        redis.release_lock(LOCK_PREFIX + key, 'token')
+
+    threading.Thread(target=other_worker).start()
+    assert shared.load() == ({'from': 'other'}, REDIS)
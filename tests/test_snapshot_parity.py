@@ -0,0 +1,43 @@
+import pytest
+from histogram import DEFAULT_BINS, UNITS
+from snapshot import TileSource
+
+# The snapshot must answer every query exactly like the database it was read from
+QUERIES = {
+    'place': lambda reader: reader.search_by_place('hawaii'),
+    'place_short': lambda reader: reader.search_by_place('pe'),
+    'place_none': lambda reader: reader.search_by_place('atlantis'),
+    'location': lambda reader: reader.search_by_location(10.0, 20.0, 3000),
+    'nearest': lambda reader: reader.search_nearest(-10.0, 100.0, 5),
+    'time_range': lambda reader: reader.search_by_time_range('2025-01-03', '2025-01-10T12:00:00Z'),
+    'magnitude': lambda reader: reader.search_by_magnitude(3, 5.5),
+    'map': lambda reader: reader.get_earthquakes_past_30_days(),
+    'map_min_magnitude': lambda reader: reader.get_earthquakes_past_30_days(6),
+    'magnitude_distribution': lambda reader: reader.get_magnitude_distribution(),
+    'magnitude_distribution_custom': lambda reader: reader.get_magnitude_distribution([0, 2.5, 5, float('inf')]),
+    'depth_distribution': lambda reader: reader.get_depth_distribution(),
+    'depth_distribution_custom': lambda reader: reader.get_depth_distribution([0, 70, 300, float('inf')]),
+    'hour_histogram': lambda reader: reader.get_histogram('hour_of_day', DEFAULT_BINS['hour_of_day'],
+                                                           UNITS['hour_of_day']),
+    'recent': lambda reader: reader.get_recent_magnitude_depth(50),
+    'hourly': lambda reader: reader.get_hourly_distribution(),
+    'hourly_filtered': lambda reader: reader.get_hourly_distribution_filtered(4),
+}
+
+
+@pytest.mark.parametrize('query', QUERIES.values(), ids=QUERIES.keys())
+def test_snapshot_matches_database(db, snapshot, query):
+    assert query(snapshot) == query(db)
+
+
+def test_top_locations_match(db, snapshot):
+    # Equal counts may come in either order
+    def by_count(locations):
+        return sorted(locations, key=lambda row: (-row['count'], row['location']))
+    assert by_count(snapshot.get_top_locations(20)) == by_count(db.get_top_locations(20))
+
+
+def test_map_tiles_match(db, snapshot):
+    tiles = TileSource.build(db)
+    for tile in [(0, 0, 0, None), (2, 1, 1, None), (3, 4, 3, 5.0)]:
+        assert tiles.get_tile(*tile) == snapshot.get_tile(*tile)
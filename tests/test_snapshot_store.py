@@ -0,0 +1,39 @@
+import time
+from snapshot import SnapshotStore, TileSource
+
+
+def _wait_for(condition, timeout=10):
+    deadline = time.time() + timeout
+    while not condition() and time.time() < deadline:
+        time.sleep(0.01)
+    return condition()
+
+
+def test_tile_source_loads_in_the_background(db):
+    store = SnapshotStore(db, enabled=False, version=db.get_dataset_version)
+    # The first request finds nothing to cut tiles from and starts the load
+    assert store.tile_source() is None
+    assert _wait_for(lambda: store.tile_source() is not None)
+    source = store.tile_source()
+    assert isinstance(source, TileSource)
+    assert len(source) == len(db.fetch_all_columns(['id'])['id'])
+
+
+def test_rebuild_loads_again_when_an_upload_lands_during_the_load(db):
+    versions = iter([1, 2])
+    current = {'version': 1}
+
+    class _Uploading:
+        """db that reports an upload while the first snapshot is read"""
+
+        def get_dataset_version(self):
+            return next(versions)
+
+        def fetch_all_columns(self, columns=None):
+            current['version'] = 2
+            return db.fetch_all_columns()
+
+    store = SnapshotStore(_Uploading(), enabled=True, version=lambda: current['version'])
+    assert store.rebuild()
+    assert store.current() is not None
+    assert store.get_stats()['version'] == 2
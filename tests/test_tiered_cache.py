@@ -0,0 +1,111 @@
+from memory_cache import MemoryCache
+from tiered_cache import MEMORY, ORIGIN, REDIS, TieredCache
+
+
+class _DictRedis:
+    """Redis tier backed by a dict; locks are always granted"""
+
+    def __init__(self):
+        self.values = {}
+
+    def get(self, key):
+        return self.values.get(key)
+
+    def set(self, key, value, expire_time=300, only_if_missing=False):
+        self.values[key] = value
+        return True
+
+    def get_many(self, keys):
+        return [self.values.get(key) for key in keys]
+
+    def set_many(self, items, expire_time=300):
+        self.values.update(items)
+        return True
+
+    def acquire_lock(self, name, timeout):
+        return True, None
+
+    def release_lock(self, name, token):
+        return True
+
+    def get_stats(self):
+        return {'keys': len(self.values)}
+
+
+class _Recorder:
+    """run/remote callable that records which functions went through it"""
+
+    def __init__(self):
+        self.calls = []
+
+    def __call__(self, fn, *args):
+        self.calls.append(fn.__name__)
+        return fn(*args)
+
+
+def test_only_origin_queries_and_redis_round_trips_leave_the_caller():
+    run, remote = _Recorder(), _Recorder()
+    cache = TieredCache(MemoryCache(), _DictRedis(), run=run, remote=remote)
+
+    @cache.loader('squares', ttl=60)
+    def squares(n):
+        return [i * i for i in range(n)]
+
+    assert squares.load(4) == ([0, 1, 4, 9], ORIGIN)
+    assert run.calls == ['squares']
+    assert remote.calls == ['get', 'acquire_lock', 'set', 'release_lock']
+
+    run.calls.clear()
+    remote.calls.clear()
+    assert squares.load(4).served_by == MEMORY
+    assert run.calls == remote.calls == []
+
+    cache.clear_memory()
+    assert squares.load(4) == ([0, 1, 4, 9], REDIS)
+    assert run.calls == []
+    assert remote.calls == ['get']
+
+
+def test_get_many_skips_redis_when_memory_has_every_key():
+    remote = _Recorder()
+    cache = TieredCache(MemoryCache(), _DictRedis(), remote=remote)
+    cache.set_many([('a', 1), ('b', 2)], ttl=60)
+    remote.calls.clear()
+    assert [result.served_by for result in cache.get_many(['a', 'b'])] == [MEMORY, MEMORY]
+    assert remote.calls == []
+
+
+def test_workers_share_results_through_redis():
+    redis = _DictRedis()
+    first, second = TieredCache(MemoryCache(), redis), TieredCache(MemoryCache(), redis)
+    computed = []
+
+    def register(cache):
+        @cache.loader('count_places', ttl=60)
+        def count_places(place):
+            computed.append(place)
+            return {'place': place, 'count': 3}
+        return count_places
+
+    on_first, on_second = register(first), register(second)
+    assert on_first.load('hawaii') == ({'place': 'hawaii', 'count': 3}, ORIGIN)
+    assert on_second.load('hawaii').served_by == REDIS
+    assert on_second.load('hawaii').served_by == MEMORY
+    assert computed == ['hawaii']
+
+    # Skipping the cache always computes and stores nothing
+    assert on_second.load('alaska', use_cache=False).served_by == ORIGIN
+    assert on_first.load('alaska').served_by == ORIGIN
+    assert computed == ['hawaii', 'alaska', 'alaska']
+    assert second.get_stats()['loaders']['count_places'][MEMORY] == 1
+
+
+def test_empty_results_are_not_cached():
+    cache = TieredCache(MemoryCache(), _DictRedis())
+
+    @cache.loader('nothing', ttl=60)
+    def nothing():
+        return []
+
+    assert nothing.load().served_by == ORIGIN
+    assert nothing.load().served_by == ORIGIN
@@ -0,0 +1,56 @@
+from types import SimpleNamespace
+import numpy as np
+import pandas as pd
+from conftest import make_events
+from database import DatabaseManager
+from timezone_enrichment import TimezoneEnricher
+
+
+class _PatchyFinder:
+    """TimezoneFinder that knows no timezone east of the prime meridian"""
+
+    def timezone_at(self, lng, lat):
+        return 'America/Los_Angeles' if lng < 0 else None
+
+
+def _plain(value):
+    """NaT and <NA> as None, timestamps and numpy scalars as Python values"""
+    if value is None or pd.isna(value):
+        return None
+    return value.to_pydatetime() if isinstance(value, pd.Timestamp) else int(value)
+
+
+def test_enrich_matches_per_row_calculation(db):
+    frame = make_events(150, seed=7)
+    edge_cases = pd.DataFrame({
+        'id': [f'edge{i}' for i in range(7)],
+        'time': ['2025-03-30T01:30:00.000Z', '2025-07-01T23:59:59.000Z', '2025-01-05T12:00:00.000Z',
+                 'not a time', '', '2025-02-28T10:00:00.000Z', '2025-10-26T00:30:00.000Z'],
+        # Open ocean, out of range, missing and unparseable coordinates
+        'latitude': [0.0, -45.0, 95.0, 35.0, 10.0, np.nan, 'n/a'],
+        'longitude': [-140.0, -120.0, 10.0, 139.0, 20.0, 20.0, 15.0],
+        'depth': 10.0,
+        'mag': 4.0,
+        'place': 'edge',
+    })
+    frame = pd.concat([frame, edge_cases], ignore_index=True)
+
+    enriched = db.tz_enricher.enrich(frame)
+    for row, (_, out) in zip(frame.itertuples(), enriched.iterrows()):
+        expected = db.calculate_local_time_fields(row.time, row.latitude, row.longitude)
+        actual = (out['local_time'], out['hour_of_day'], out['day_of_week'])
+        assert tuple(map(_plain, actual)) == tuple(map(_plain, expected)), row
+
+
+def test_enrich_keeps_utc_where_the_timezone_is_unknown():
+    frame = make_events(60, seed=3)
+    finder = _PatchyFinder()
+    enriched = TimezoneEnricher(finder).enrich(frame)
+    manager = SimpleNamespace(tf=finder)
+    for row, (_, out) in zip(frame.itertuples(), enriched.iterrows()):
+        expected = DatabaseManager.calculate_local_time_fields(manager, row.time, row.latitude, row.longitude)
+        actual = (out['local_time'], out['hour_of_day'], out['day_of_week'])
+        assert tuple(map(_plain, actual)) == tuple(map(_plain, expected)), row
+    east = enriched['longitude'] >= 0
+    assert (enriched.loc[east, 'local_time'] == enriched.loc[east, 'time']).all()
+    assert (enriched.loc[~east, 'local_time'] != enriched.loc[~east, 'time']).all()
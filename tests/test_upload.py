@@ -0,0 +1,137 @@
+import pandas as pd
+import pytest
+from conftest import csv_stream, make_events
+
+LEFTOVER_TABLES = ('earthquakes_511610_load', 'earthquakes_511610_staging', 'earthquake_summary_cube_delta')
+
+
+def _state(db):
+    """Everything an upload may change, as comparable values"""
+    conn = db.get_connection()
+    cursor = conn.cursor()
+    cursor.execute("SELECT id, time, latitude, longitude, depth, mag, place, hour_of_day "
+                   "FROM earthquakes_511610 ORDER BY id")
+    rows = [tuple(row) for row in cursor.fetchall()]
+    cursor.execute("SELECT hour_of_day, mag_bin, depth_bin, region, event_count "
+                   "FROM earthquake_summary_cube ORDER BY 1, 2, 3, 4")
+    cube = [tuple(row) for row in cursor.fetchall()]
+    cursor.execute("SELECT p.place, t.trigram FROM earthquake_places p "
+                   "JOIN earthquake_place_trigrams t ON t.place_id = p.place_id ORDER BY 1, 2")
+    trigrams = [tuple(row) for row in cursor.fetchall()]
+    cursor.execute("SELECT name FROM sqlite_master WHERE type = 'index' AND name LIKE 'IX_%' ORDER BY name")
+    indexes = [row[0] for row in cursor.fetchall()]
+    cursor.execute("SELECT name FROM sqlite_master WHERE type = 'table'")
+    tables = {row[0] for row in cursor.fetchall()}
+    conn.close()
+    return {'rows': rows, 'cube': cube, 'trigrams': trigrams, 'indexes': indexes, 'tables': tables,
+            'version': db.get_dataset_version()}
+
+
+def _rebuilt(db):
+    """What the derived tables hold when rebuilt from scratch"""
+    conn = db.get_connection()
+    cursor = conn.cursor()
+    db._rebuild_place_index(conn, cursor)
+    db._rebuild_summary_cube(conn, cursor)
+    conn.commit()
+    conn.close()
+    return _state(db)
+
+
+@pytest.fixture
+def loaded_db(empty_db):
+    ok, message = empty_db.create_table_and_upload_data(csv_stream(make_events(200)))
+    assert ok, message
+    return empty_db
+
+
+class _FailingStream:
+    """Yields one good chunk, then fails like a dropped connection"""
+
+    def __init__(self, chunk):
+        self.chunk = chunk
+
+    def __iter__(self):
+        yield self.chunk
+        raise IOError("connection reset mid upload")
+
+
+@pytest.mark.parametrize('upload', [
+    lambda: _FailingStream(make_events(50, seed=1, first_id=1000)),
+    lambda: csv_stream(make_events(0)),
+    lambda: csv_stream(make_events(50, seed=1).rename(columns={'mag': 'magnitude'})),
+], ids=['interrupted', 'empty', 'missing_column'])
+def test_failed_upload_keeps_the_live_data(loaded_db, upload):
+    before = _state(loaded_db)
+    ok, message = loaded_db.create_table_and_upload_data(upload())
+    assert not ok
+    after = _state(loaded_db)
+    assert after == before
+    assert not after['tables'] & set(LEFTOVER_TABLES)
+
+
+def test_failure_while_swapping_rolls_back(loaded_db, monkeypatch):
+    before = _state(loaded_db)
+
+    def fail(conn, cursor):
+        raise RuntimeError("cube build failed")
+    monkeypatch.setattr(loaded_db, '_rebuild_summary_cube', fail)
+    ok, _ = loaded_db.create_table_and_upload_data(csv_stream(make_events(80, seed=2)))
+    assert not ok
+    assert _state(loaded_db) == before
+
+
+def test_upload_replaces_the_data(loaded_db):
+    version = loaded_db.get_dataset_version()
+    ok, _ = loaded_db.create_table_and_upload_data(csv_stream(make_events(80, seed=2)))
+    assert ok
+    state = _state(loaded_db)
+    assert len(state['rows']) == 80
+    assert state['version'] == version + 1
+    assert len(state['indexes']) == 6
+    assert {key: state[key] for key in ('cube', 'trigrams')} == \
+        {key: _rebuilt(loaded_db)[key] for key in ('cube', 'trigrams')}
+
+
+def test_upsert_keeps_derived_tables_in_step(loaded_db):
+    version = loaded_db.get_dataset_version()
+    existing = make_events(200)
+    changed = existing.iloc[:60].copy()
+    changed.loc[changed.index[:20], 'mag'] += 1.5
+    changed.loc[changed.index[20:40], 'place'] = 'Somewhere entirely new, Atlantis'
+    changed.loc[changed.index[40:], 'latitude'] *= -1
+    new = make_events(40, seed=3, first_id=5000)
+    ok, message = loaded_db.upsert_data(pd.concat([changed, existing.iloc[60:80], new]))
+    assert ok, message
+    assert '40 new, 60 updated, 20 unchanged' in message
+
+    state = _state(loaded_db)
+    assert len(state['rows']) == 240
+    assert state['version'] == version + 1
+    assert not state['tables'] & set(LEFTOVER_TABLES)
+    # The cube and trigram deltas must add up to a full rebuild
+    assert {key: state[key] for key in ('cube', 'trigrams')} == \
+        {key: _rebuilt(loaded_db)[key] for key in ('cube', 'trigrams')}
+
+
+def test_failed_upsert_changes_nothing(loaded_db, monkeypatch):
+    before = _state(loaded_db)
+
+    def fail(cursor, staging):
+        raise RuntimeError("merge failed")
+    monkeypatch.setattr(loaded_db, '_merge_staging', fail)
+    ok, _ = loaded_db.upsert_data(make_events(30, seed=4, first_id=7000))
+    assert not ok
+    after = _state(loaded_db)
+    assert {key: after[key] for key in ('rows', 'cube', 'trigrams', 'version')} == \
+        {key: before[key] for key in ('rows', 'cube', 'trigrams', 'version')}
+
+
+def test_place_index_is_rechecked_after_an_upload(empty_db):
+    assert empty_db.search_by_place('hawaii') == []
+    assert empty_db._has_place_index is False
+    ok, message = empty_db.create_table_and_upload_data(csv_stream(make_events(50)))
+    assert ok, message
+    assert empty_db._has_place_index is None
+    assert empty_db.search_by_place('hawaii')
+    assert empty_db._has_place_index is True
@@ -0,0 +1,318 @@
+import functools
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import namedtuple
+from pagination import Page
+from dataset_version import key_namespace
+from range_cache import RangeIndex
+
+# Longest a value stays in the per-process tier, so a worker picks up what
+# other workers wrote to Redis soon after
+MEMORY_CACHE_TTL = int(os.getenv('MEMORY_CACHE_TTL', 60))
+# Keys longer than this are hashed
+MAX_KEY_LENGTH = 200
+# Seconds an expired entry may still be served while it is recomputed
+# (stale-while-revalidate); 0 turns it off unless a loader asks for it
+CACHE_STALE_TTL = int(os.getenv('CACHE_STALE_TTL', 0))
+# Longest one computation holds its key, and others wait for it
+CACHE_LOCK_TIMEOUT = float(os.getenv('CACHE_LOCK_TIMEOUT', 30))
+# How often a worker waiting on another worker's computation checks Redis
+LOCK_POLL_INTERVAL = 0.05
+LOCK_PREFIX = 'lock:'
+
+MEMORY = 'memory'
+REDIS = 'redis'
+# Filtered from a cached result covering a wider range
+SUBSUMED = 'subsumed'
+# An expired entry, served while a refresh runs
+STALE = 'stale'
+# Waited for a computation another request in this process was running
+COALESCED = 'coalesced'
+# Computed by the loader itself
+ORIGIN = 'origin'
+TIERS = (MEMORY, REDIS, SUBSUMED, STALE, COALESCED, ORIGIN)
+
+CacheResult = namedtuple('CacheResult', ['value', 'served_by'])
+
+
+def _normalize(value):
+    if isinstance(value, float) and value.is_integer():
+        return int(value)
+    if isinstance(value, str):
+        return value.strip()
+    if isinstance(value, (list, tuple)):
+        return [_normalize(item) for item in value]
+    return value
+
+
+def canonical_key(name, args):
+    """Cache key for a loader name and its arguments.
+
+    Equal requests map to one key however they were spelled: 5 and 5.0 agree
+    and strings are trimmed. Arguments are JSON encoded so separators inside
+    strings can't make two argument lists collide.
+    """
+    encoded = json.dumps([_normalize(arg) for arg in args], separators=(',', ':'))
+    if len(encoded) > MAX_KEY_LENGTH:
+        encoded = hashlib.sha1(encoded.encode()).hexdigest()
+    return f"{name}:{encoded}"
+
+
+def _dump(value, fresh_until):
+    """JSON-safe form of a value; Pages keep their pagination fields"""
+    if isinstance(value, Page):
+        return {'page': list(value), 'next_after': value.next_after, 'total': value.total,
+                'fresh_until': fresh_until}
+    return {'value': value, 'fresh_until': fresh_until}
+
+
+def _load(stored):
+    if 'page' in stored:
+        return Page(stored['page'], stored['next_after'], stored['total'])
+    return stored['value']
+
+
+class _Flight:
+    """One computation in progress, shared by every request for its key"""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.failed = False
+
+
+class CachedLoader:
+    """A function whose results are cached under keys built from its arguments.
+
+    Calling it runs the function uncached; load goes through the cache and
+    also says which tier answered.
+
+    Given a range kind from range_cache, a request whose range lies inside
+    that of a complete cached result is answered by filtering that result.
+    """
+
+    def __init__(self, cache, name, fn, ttl, stale_ttl=0, ranges=None):
+        functools.update_wrapper(self, fn)
+        self.cache = cache
+        self.name = name
+        self.fn = fn
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.ranges = RangeIndex(ranges) if ranges is not None else None
+
+    def __call__(self, *args):
+        return self.fn(*args)
+
+    def key(self, *args):
+        return self.cache.key(self.name, args)
+
+    def load(self, *args, use_cache=True):
+        if not use_cache:
+            return CacheResult(self.cache.run(self.fn, *args), ORIGIN)
+        key = self.key(*args)
+        result = self._subsumed(key, args) if self.ranges is not None else None
+        if result is None:
+            result = self.cache.load(key, lambda: self.cache.run(self.fn, *args), self.ttl, self.stale_ttl)
+            if self.ranges is not None:
+                self.ranges.remember(key, args, result.value)
+        self.cache.record(self.name, result.served_by)
+        return result
+
+    def _subsumed(self, key, args):
+        """Result filtered from a cached one covering a wider range, None without one"""
+        for outer_key in self.ranges.covering(key, args, self.cache.namespace()):
+            outer = self.cache.get(outer_key)
+            if outer.served_by is None:
+                self.ranges.forget(outer_key)
+                continue
+            return CacheResult(self.ranges.kind.select(outer.value, args), SUBSUMED)
+        return None
+
+
+class TieredCache:
+    """In-process MemoryCache (L1) in front of the shared RedisCache (L2).
+
+    Reads try L1, then L2, copying L2 hits into L1; writes go to both. An L1
+    hit needs no network round trip. Cached functions are registered with
+    the loader decorator and can be looked up by name in loaders.
+
+    With a version callable, keys are namespaced by the dataset version, so
+    entries computed from replaced data can no longer be reached.
+
+    Misses are single-flight: concurrent requests for a key in one process
+    wait for a single computation, and a Redis lock makes workers in other
+    processes wait for its result too. With a stale_ttl an expired entry is
+    served at once while one request recomputes it in the background.
+
+    Loaders' functions are called through run(fn, *args) and Redis round
+    trips through remote(fn, *args), e.g. bounded pools from concurrency.py;
+    by default both run on the calling thread. Everything else, L1 hits and
+    waiting on another request's computation included, stays on the caller.
+    """
+
+    def __init__(self, memory, redis, memory_ttl=None, version=None, run=None, remote=None):
+        self.memory = memory
+        self.redis = redis
+        self.memory_ttl = memory_ttl or MEMORY_CACHE_TTL
+        self.version = version
+        self.run = run or (lambda fn, *args: fn(*args))
+        self.remote = remote or (lambda fn, *args: fn(*args))
+        self.loaders = {}
+        self._counts = {}
+        self._flights = {}
+        self._lock = threading.Lock()
+
+    def loader(self, name, ttl, stale_ttl=None, ranges=None):
+        """Decorator caching a function's results for ttl seconds under name.
+
+        stale_ttl defaults to CACHE_STALE_TTL. ranges is a range kind from
+        range_cache describing how the function's range arguments nest.
+        """
+        def decorate(fn):
+            loader = CachedLoader(self, name, fn, ttl, CACHE_STALE_TTL if stale_ttl is None else stale_ttl,
+                                  ranges)
+            self.loaders[name] = loader
+            return loader
+        return decorate
+
+    def namespace(self):
+        """Prefix of every key in the current dataset version"""
+        return '' if self.version is None else key_namespace(self.version())
+
+    def key(self, name, args):
+        """Cache key for a loader name and arguments in the current dataset version"""
+        return self.namespace() + canonical_key(name, args)
+
+    def get(self, key, allow_stale=False):
+        """Cached value and the tier holding it; served_by is None on a miss"""
+        value = self.memory.get(key)
+        if value is not None:
+            return CacheResult(value, MEMORY)
+        return self._from_redis(key, self.remote(self.redis.get, key), allow_stale)
+
+    def get_many(self, keys):
+        """Results for several keys; L1 misses are read from Redis in one round trip"""
+        results = [CacheResult(self.memory.get(key), MEMORY) for key in keys]
+        missing = [i for i, result in enumerate(results) if result.value is None]
+        stored_values = self.remote(self.redis.get_many, [keys[i] for i in missing]) if missing else []
+        for i, stored in zip(missing, stored_values):
+            results[i] = self._from_redis(keys[i], stored)
+        return results
+
+    def _from_redis(self, key, stored, allow_stale=False):
+        if stored is None:
+            return CacheResult(None, None)
+        if stored.get('fresh_until', float('inf')) > time.time():
+            value = _load(stored)
+            self.memory.set(key, value, self.memory_ttl)
+            return CacheResult(value, REDIS)
+        return CacheResult(_load(stored), STALE) if allow_stale else CacheResult(None, None)
+
+    def set(self, key, value, ttl, stale_ttl=0):
+        self.memory.set(key, value, min(ttl, self.memory_ttl))
+        self.remote(self.redis.set, key, _dump(value, time.time() + ttl), ttl + stale_ttl)
+
+    def set_many(self, items, ttl, stale_ttl=0):
+        """Store (key, value) pairs, in Redis with one pipelined round trip"""
+        fresh_until = time.time() + ttl
+        for key, value in items:
+            self.memory.set(key, value, min(ttl, self.memory_ttl))
+        self.remote(self.redis.set_many, [(key, _dump(value, fresh_until)) for key, value in items],
+                    ttl + stale_ttl)
+
+    def load(self, key, compute, ttl, stale_ttl=0):
+        """Cached value of key, running compute at most once across callers on a miss"""
+        result = self.get(key, allow_stale=stale_ttl > 0)
+        if result.served_by == STALE:
+            threading.Thread(target=self._refresh, args=(key, compute, ttl, stale_ttl), daemon=True).start()
+        if result.served_by is not None:
+            return result
+        return self._single_flight(key, compute, ttl, stale_ttl)
+
+    def _refresh(self, key, compute, ttl, stale_ttl):
+        with self._lock:
+            if key in self._flights:
+                return
+        try:
+            self._single_flight(key, compute, ttl, stale_ttl)
+        except Exception as e:
+            print(f"❌ Cache refresh of {key} failed: {e}")
+
+    def _single_flight(self, key, compute, ttl, stale_ttl):
+        with self._lock:
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight()
+
+        if not leader:
+            if flight.done.wait(CACHE_LOCK_TIMEOUT) and not flight.failed:
+                return CacheResult(flight.value, COALESCED)
+            # The leader failed or is stuck; don't fail along with it
+            return CacheResult(compute(), ORIGIN)
+
+        try:
+            result = self._compute_locked(key, compute, ttl, stale_ttl)
+            flight.value = result.value
+            return result
+        except Exception:
+            flight.failed = True
+            raise
+        finally:
+            with self._lock:
+                self._flights.pop(key, None)
+            flight.done.set()
+
+    def _compute_locked(self, key, compute, ttl, stale_ttl):
+        """Compute and store key, unless another worker holding its lock does it first"""
+        lock_key = LOCK_PREFIX + key
+        acquired, token = self.remote(self.redis.acquire_lock, lock_key, CACHE_LOCK_TIMEOUT)
+        if not acquired:
+            deadline = time.time() + CACHE_LOCK_TIMEOUT
+            while time.time() < deadline:
+                time.sleep(LOCK_POLL_INTERVAL)
+                result = self.get(key)
+                if result.served_by is not None:
+                    return result
+                if not self.remote(self.redis.lock_held, lock_key):
+                    break
+        try:
+            value = compute()
+            # Empty results aren't kept, so data uploaded later shows up at once
+            if value:
+                self.set(key, value, ttl, stale_ttl)
+            return CacheResult(value, ORIGIN)
+        finally:
+            if acquired:
+                self.remote(self.redis.release_lock, lock_key, token)
+
+    def clear_memory(self):
+        """Drop this process's L1 entries and range indexes, e.g. after an upload"""
+        self.memory.clear_all()
+        for loader in self.loaders.values():
+            if loader.ranges is not None:
+                loader.ranges.clear()
+
+    def record(self, name, served_by):
+        with self._lock:
+            counts = self._counts.setdefault(name, dict.fromkeys(TIERS, 0))
+            counts[served_by] += 1
+
+    def get_stats(self):
+        with self._lock:
+            loaders = {name: dict(counts) for name, counts in self._counts.items()}
+        totals = {tier: sum(counts[tier] for counts in loaders.values()) for tier in TIERS}
+        return {
+            'served_by': totals,
+            'loaders': loaders,
+            'memory': self.memory.get_stats(),
+            'redis': self.redis.get_stats(),
+            'memory_ttl': self.memory_ttl,
+            'ranges': {name: len(loader.ranges) for name, loader in self.loaders.items()
+                       if loader.ranges is not None},
+            'dataset_version': self.version() if self.version is not None else None,
+            'in_flight': len(self._flights),
+        }
@@ -0,0 +1,147 @@
+import math
+import os
+import numpy as np
+
+TILE_SIZE = 256
+# Deepest zoom tiles can be requested for; points are indexed at this level
+MAX_TILE_ZOOM = 20
+# Above this zoom tiles list individual events instead of clusters
+CLUSTER_MAX_ZOOM = int(os.getenv('TILE_CLUSTER_MAX_ZOOM', 10))
+CLUSTER_RADIUS_PX = int(os.getenv('TILE_CLUSTER_RADIUS_PX', 60))
+# Events returned by one point tile, strongest first
+MAX_TILE_POINTS = int(os.getenv('TILE_MAX_POINTS', 2000))
+# Distinct min_magnitude filters a snapshot keeps cluster indexes for
+MAX_TILE_INDEXES = 8
+
+# Web Mercator stops short of the poles
+MAX_MERCATOR_LAT = 85.05112878
+
+
+def mercator(latitudes, longitudes):
+    """Normalized Web Mercator coordinates in [0, 1), x east and y south"""
+    lat = np.radians(np.clip(latitudes, -MAX_MERCATOR_LAT, MAX_MERCATOR_LAT))
+    x = (np.asarray(longitudes, dtype=np.float64) + 180) / 360
+    y = (1 - np.log(np.tan(lat) + 1 / np.cos(lat)) / math.pi) / 2
+    edge = np.nextafter(1.0, 0)
+    return np.clip(x, 0, edge), np.clip(y, 0, edge)
+
+
+def unmercator(x, y):
+    """Latitude and longitude of normalized Web Mercator coordinates"""
+    longitudes = x * 360 - 180
+    latitudes = np.degrees(np.arctan(np.sinh(math.pi * (1 - 2 * y))))
+    return latitudes, longitudes
+
+
+def _spread_bits(values):
+    values = np.asarray(values, dtype=np.uint64) & np.uint64(0xFFFFFFFF)
+    for shift, mask in ((16, 0x0000FFFF0000FFFF), (8, 0x00FF00FF00FF00FF), (4, 0x0F0F0F0F0F0F0F0F),
+                        (2, 0x3333333333333333), (1, 0x5555555555555555)):
+        values = (values | (values << np.uint64(shift))) & np.uint64(mask)
+    return values
+
+
+def morton(tile_x, tile_y):
+    """Z-order code of tile coordinates; a tile's descendants share its code as a prefix"""
+    return _spread_bits(tile_x) | (_spread_bits(tile_y) << np.uint64(1))
+
+
+def _tile_codes(x, y, zoom):
+    scale = 2 ** zoom
+    return morton(np.floor(x * scale).astype(np.uint64), np.floor(y * scale).astype(np.uint64))
+
+
+class _Level:
+    """Clusters of one zoom level, sorted by the code of the tile holding their centroid"""
+
+    def __init__(self, zoom, count, sum_x, sum_y, max_mag):
+        x, y = sum_x / count, sum_y / count
+        codes = _tile_codes(x, y, zoom)
+        order = np.argsort(codes, kind='stable')
+        self.codes = codes[order]
+        self.count = count[order]
+        self.latitude, self.longitude = unmercator(x[order], y[order])
+        self.max_mag = max_mag[order]
+
+
+class ClusterIndex:
+    """Precomputed map clusters for every zoom level.
+
+    At zoom z a cluster gathers the events in one grid cell CLUSTER_RADIUS_PX
+    screen pixels wide. Because cells at z are exactly two by two cells at
+    z + 1, each level is built from the one below by summing counts and
+    coordinates, so the whole hierarchy costs one sort per level. Clusters
+    and events are kept in Z-order, which makes every tile a contiguous range
+    found by binary search.
+    """
+
+    def __init__(self, latitudes, longitudes, mags, radius_px=None, cluster_max_zoom=None):
+        self.radius_px = radius_px or CLUSTER_RADIUS_PX
+        self.cluster_max_zoom = cluster_max_zoom if cluster_max_zoom is not None else CLUSTER_MAX_ZOOM
+        mags = np.asarray(mags, dtype=np.float64)
+        x, y = mercator(latitudes, longitudes)
+
+        # Events, for the zooms that show them one by one
+        point_codes = _tile_codes(x, y, MAX_TILE_ZOOM)
+        self.point_order = np.argsort(point_codes, kind='stable')
+        self.point_codes = point_codes[self.point_order]
+
+        # Finest cluster level straight from the events
+        cells_per_unit = 2 ** self.cluster_max_zoom * TILE_SIZE / self.radius_px
+        cell_x = np.floor(x * cells_per_unit).astype(np.int64)
+        cell_y = np.floor(y * cells_per_unit).astype(np.int64)
+        count, sum_x, sum_y = np.ones(len(x), dtype=np.int64), x, y
+        max_mag = mags
+
+        self.levels = {}
+        for zoom in range(self.cluster_max_zoom, -1, -1):
+            if zoom < self.cluster_max_zoom:
+                cell_x, cell_y = cell_x >> 1, cell_y >> 1
+            keys = cell_x * (int(cells_per_unit) + 1) + cell_y
+            order = np.argsort(keys, kind='stable')
+            keys = keys[order]
+            starts = np.flatnonzero(np.diff(keys, prepend=keys[:1] - 1))
+            count = np.add.reduceat(count[order], starts)
+            sum_x = np.add.reduceat(sum_x[order], starts)
+            sum_y = np.add.reduceat(sum_y[order], starts)
+            max_mag = np.maximum.reduceat(max_mag[order], starts)
+            cell_x, cell_y = cell_x[order][starts], cell_y[order][starts]
+            self.levels[zoom] = _Level(zoom, count, sum_x, sum_y, max_mag)
+            cells_per_unit /= 2
+
+    def __len__(self):
+        return len(self.point_codes)
+
+    @staticmethod
+    def validate_tile(zoom, tile_x, tile_y):
+        if not 0 <= zoom <= MAX_TILE_ZOOM:
+            raise ValueError(f"Zoom must be between 0 and {MAX_TILE_ZOOM}")
+        if not (0 <= tile_x < 2 ** zoom and 0 <= tile_y < 2 ** zoom):
+            raise ValueError(f"Tile {tile_x}/{tile_y} is outside zoom level {zoom}")
+
+    def clusters(self, zoom, tile_x, tile_y):
+        """Clusters whose centroid lies in the tile, or None above the cluster zooms"""
+        self.validate_tile(zoom, tile_x, tile_y)
+        if zoom > self.cluster_max_zoom:
+            return None
+        level = self.levels[zoom]
+        code = morton(tile_x, tile_y)
+        start, end = np.searchsorted(level.codes, [code, code + np.uint64(1)])
+        return [
+            {
+                'latitude': round(float(lat), 5),
+                'longitude': round(float(lon), 5),
+                'count': int(count),
+                'max_magnitude': float(max_mag),
+            }
+            for lat, lon, count, max_mag in zip(level.latitude[start:end], level.longitude[start:end],
+                                                 level.count[start:end], level.max_mag[start:end])
+        ]
+
+    def points(self, zoom, tile_x, tile_y):
+        """Positions of the events inside the tile"""
+        self.validate_tile(zoom, tile_x, tile_y)
+        shift = np.uint64(2 * (MAX_TILE_ZOOM - zoom))
+        code = morton(tile_x, tile_y)
+        start, end = np.searchsorted(self.point_codes, [code << shift, (code + np.uint64(1)) << shift])
+        return self.point_order[start:end]
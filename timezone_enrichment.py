@@ -0,0 +1,148 @@
+import os
+import multiprocessing
+import threading
+from contextlib import contextmanager
+from concurrent.futures import ProcessPoolExecutor
+import pandas as pd
+import pytz
+from timezonefinder import TimezoneFinder
+
+# Per-process finder used by pool workers
+_worker_tf = None
+
+
+def _init_worker():
+    global _worker_tf
+    _worker_tf = TimezoneFinder()
+
+
+def _resolve_shard(shard):
+    """Resolve a list of (lat, lon) pairs inside a pool worker"""
+    names = []
+    for lat, lon in shard:
+        try:
+            names.append(_worker_tf.timezone_at(lng=float(lon), lat=float(lat)))
+        except Exception:
+            names.append(None)
+    return names
+
+
+class TimezoneEnricher:
+    """Batch version of DatabaseManager.calculate_local_time_fields.
+
+    The time column is parsed once, timezones are looked up once per distinct
+    (rounded) coordinate and every timezone group is converted with a single
+    vectorized tz_convert.
+
+    Uploads enrich inside worker_pool(), so every chunk of one upload shares
+    a single process pool and its workers load TimezoneFinder only once.
+    """
+
+    def __init__(self, tf=None, coord_precision=None, workers=None, parallel_threshold=None):
+        self.tf = tf or TimezoneFinder()
+        # USGS catalogs publish coordinates with 4 decimals, so rounding there
+        # only merges duplicate epicentres and keeps results identical
+        if coord_precision is None:
+            coord_precision = int(os.getenv('TZ_COORD_PRECISION', 4))
+        self.coord_precision = coord_precision
+        # Process pool is opt-in: TZ_WORKERS=0 keeps everything in-process
+        if workers is None:
+            workers = int(os.getenv('TZ_WORKERS', 0))
+        if parallel_threshold is None:
+            parallel_threshold = int(os.getenv('TZ_PARALLEL_THRESHOLD', 20000))
+        self.workers = workers
+        self.parallel_threshold = parallel_threshold
+        # Pool shared by the uploads currently inside worker_pool()
+        self._executor = None
+        self._executor_users = 0
+        self._executor_lock = threading.Lock()
+
+    @contextmanager
+    def worker_pool(self):
+        """Keep one process pool open for every enrich() call in the block.
+
+        Workers are only spawned once a chunk is large enough to use them, and
+        the pool is shut down when the last upload using it leaves the block.
+        """
+        if self.workers <= 1:
+            yield
+            return
+        with self._executor_lock:
+            if self._executor is None:
+                # spawn avoids forking a threaded web worker
+                self._executor = ProcessPoolExecutor(max_workers=self.workers,
+                                                     mp_context=multiprocessing.get_context('spawn'),
+                                                     initializer=_init_worker)
+            self._executor_users += 1
+        try:
+            yield
+        finally:
+            with self._executor_lock:
+                self._executor_users -= 1
+                executor = self._executor if self._executor_users == 0 else None
+                if executor is not None:
+                    self._executor = None
+            if executor is not None:
+                executor.shutdown()
+
+    def timezone_at(self, latitude, longitude):
+        """Timezone name for one coordinate, None if it can't be determined"""
+        try:
+            return self.tf.timezone_at(lng=float(longitude), lat=float(latitude))
+        except Exception as e:
+            print(f"Error finding timezone for ({latitude}, {longitude}): {e}")
+            return None
+
+    def resolve_timezones(self, coords, total_rows=None):
+        """Resolve a DataFrame of distinct (lat, lon) pairs to timezone names"""
+        total_rows = len(coords) if total_rows is None else total_rows
+        if self.workers > 1 and total_rows >= self.parallel_threshold and len(coords) > self.workers:
+            try:
+                return self._resolve_parallel(coords)
+            except Exception as e:
+                print(f"⚠️ Parallel timezone resolution failed, falling back to serial: {e}")
+        return [self.timezone_at(lat, lon) for lat, lon in zip(coords['lat'], coords['lon'])]
+
+    def _resolve_parallel(self, coords):
+        """Shard the coordinate set across a process pool"""
+        pairs = list(zip(coords['lat'].tolist(), coords['lon'].tolist()))
+        # A few shards per worker evens out dense and sparse regions
+        shard_count = self.workers * 4
+        shard_size = max(1, -(-len(pairs) // shard_count))
+        shards = [pairs[i:i + shard_size] for i in range(0, len(pairs), shard_size)]
+
+        print(f"⚙️ Resolving {len(pairs)} coordinates with {self.workers} worker processes...")
+        with self.worker_pool():
+            names = []
+            for shard_names in self._executor.map(_resolve_shard, shards):
+                names.extend(shard_names)
+        return names
+
+    def enrich(self, df):
+        """Return a copy of df with parsed UTC time and local_time, hour_of_day, day_of_week columns"""
+        result = df.copy()
+        utc_times = pd.to_datetime(result['time'], utc=True, errors='coerce')
+
+        # One timezone lookup per distinct rounded coordinate
+        coords = pd.DataFrame({
+            'lat': pd.to_numeric(result['latitude'], errors='coerce').round(self.coord_precision),
+            'lon': pd.to_numeric(result['longitude'], errors='coerce').round(self.coord_precision),
+        }, index=result.index)
+        distinct = coords.dropna().drop_duplicates().reset_index(drop=True)
+        distinct['tz_name'] = self.resolve_timezones(distinct, len(result)) if len(distinct) else []
+        print(f"🌐 Resolved {len(distinct)} distinct coordinates for {len(result)} records")
+
+        tz_names = coords.merge(distinct, on=['lat', 'lon'], how='left')['tz_name']
+        tz_names.index = result.index
+
+        # Rows without a timezone keep UTC, like the per-row fallback
+        local_times = utc_times.dt.tz_localize(None)
+        for tz_name, index in tz_names.dropna().groupby(tz_names.dropna()).groups.items():
+            converted = utc_times.loc[index].dt.tz_convert(pytz.timezone(tz_name))
+            local_times.loc[index] = converted.dt.tz_localize(None)
+
+        result['time'] = utc_times.dt.tz_localize(None)
+        result['local_time'] = local_times
+        result['hour_of_day'] = local_times.dt.hour.astype('Int64')
+        result['day_of_week'] = (local_times.dt.dayofweek + 1).astype('Int64')  # Monday=0 -> Monday=1
+        return result